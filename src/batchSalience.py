@@ -0,0 +1,81 @@
+import numpy as np
+
+class BatchSalience:
+    '''Salience of the next frames for a batch of sessions, computed with NumPy arrays instead of one frame and one session at a time'''
+    def __init__(self, scenario):
+        '''Initialize batch salience
+        :param scenario: loaded scenario (ReadFile or CompiledScenario)
+        :var knowledgeIds: dictionary with the column of each knowledge tag - only tags that can be added to the knowledge base and that belong to a frame affect salience
+        :var incidence: boolean matrix (frames x knowledge tags) with the knowledge tags of each frame
+        :var nextPtr, nextFrame, nextFreq: transition frequencies in compressed sparse rows - the next frames of frame i and their frequency are at nextPtr[i]:nextPtr[i + 1]
+        :var version: version of the scenario when the tables were built (they are built again after a reload)
+        '''
+        self.scenario = scenario
+        self.build()
+
+    def build(self):
+        '''Build the tables from the frames and tree nodes of the scenario'''
+        scenario = self.scenario
+        self.version = scenario.version
+        self.frames = scenario.frames
+        frameTags = set(t for f in self.frames for t in f.tags)
+        #distinct knowledge tags in the order of the tree nodes
+        knowledge = list(dict.fromkeys(n.addKnowledge for n in scenario.treeNodes if n.addKnowledge in frameTags))
+        self.knowledgeIds = {k: j for j, k in enumerate(knowledge)}
+        self.incidence = np.zeros((len(self.frames), len(knowledge)), dtype = bool)
+        nextPtr = [0]
+        nextFrame = []
+        nextFreq = []
+        for f in self.frames:
+            for t in f.tags:
+                j = self.knowledgeIds.get(t)
+                if j is not None:
+                    self.incidence[f.index, j] = True
+            for nf, freq in f.nextFrames.items():
+                nextFrame.append(nf.index)
+                nextFreq.append(freq)
+            nextPtr.append(len(nextFrame))
+        self.nextPtr = np.array(nextPtr, dtype = np.int64)
+        self.nextFrame = np.array(nextFrame, dtype = np.int64)
+        self.nextFreq = np.array(nextFreq, dtype = np.int64)
+
+    def knowledgeMatrix(self, knowledgeBases):
+        '''Boolean matrix (sessions x knowledge tags) with the knowledge base of each session'''
+        kb = np.zeros((len(knowledgeBases), len(self.knowledgeIds)), dtype = bool)
+        for s, knowledgeBase in enumerate(knowledgeBases):
+            for k in knowledgeBase:
+                j = self.knowledgeIds.get(k)
+                if j is not None:
+                    kb[s, j] = True
+        return kb
+
+    def salienceFrames(self, knowledgeBases, currFrames):
+        '''Compute the most salient frames of each session - the same frames, in the same order, as DialogueEngine.salienceFrames
+        :param knowledgeBases: list with the knowledge base of each session
+        :param currFrames: list with the current frame object of each session (frames of the current version of the scenario)
+        '''
+        numSessions = len(currFrames)
+        if numSessions == 0:
+            return []
+        if self.version != self.scenario.version:
+            #the scenario was reloaded - its frames, links and knowledge may have changed
+            self.build()
+        curr = np.array([f.index for f in currFrames], dtype = np.int64)
+        starts = self.nextPtr[curr]
+        counts = self.nextPtr[curr + 1] - starts
+        #one entry per (session, next frame) pair
+        rows = np.repeat(np.arange(numSessions), counts)
+        firstEntry = np.cumsum(counts) - counts
+        entries = np.arange(len(rows)) - np.repeat(firstEntry, counts) + np.repeat(starts, counts)
+        cols = self.nextFrame[entries]
+        kb = self.knowledgeMatrix(knowledgeBases)
+        #frequency plus knowledge base match equals the salience
+        salience = self.nextFreq[entries] + (self.incidence[cols] & kb[rows]).sum(axis = 1)
+        maxSalience = np.zeros(numSessions, dtype = np.int64)
+        np.maximum.at(maxSalience, rows, salience)
+        ties = salience == maxSalience[rows]
+        tieRows = rows[ties]
+        tieCols = cols[ties]
+        bounds = np.searchsorted(tieRows, np.arange(numSessions + 1))
+        frames = self.frames
+        return [[frames[c] for c in tieCols[bounds[s]:bounds[s + 1]].tolist()] for s in range(numSessions)]
@@ -0,0 +1,74 @@
+import os
+import random
+import sys
+import tempfile
+import time
+import readFile
+import scenarioGenerator
+
+def scanCurrentFrame(frames, currCtx):
+    '''Reference implementation - scan every frame and keep the last one that has every context tag'''
+    currentFrame = None
+    if len(currCtx) > 0:
+        for f in frames:
+            ctxMatch = True
+            for c in currCtx:
+                if c not in f.tags:
+                    ctxMatch = False
+            if ctxMatch:
+                currentFrame = f
+    return currentFrame
+
+def contexts(scenario, rand, numRandom = 200):
+    '''Contexts to look up: the tags of every node and frame, every single tag, random tag combinations and error contexts'''
+    ctxs = [n.tags for n in scenario.treeNodes] + [f.tags for f in scenario.frames]
+    allTags = sorted(set(t for ctx in ctxs for t in ctx))
+    ctxs += [[t] for t in allTags]
+    for r in range(numRandom):
+        ctxs.append(rand.sample(allTags, min(len(allTags), rand.randint(1, 3))))
+    ctxs += [[], ["timeout"], ["unknownTag"]]
+    return ctxs
+
+def checkEquivalence(scenario, ctxs):
+    '''Number of contexts for which the frame index and the scan disagree'''
+    return sum(1 for ctx in ctxs if scenario.frameIndex.currentFrame(ctx) is not scanCurrentFrame(scenario.frames, ctx))
+
+def timeLookups(lookup, ctxs, repeat = 3):
+    '''Mean time, in microseconds, of one lookup'''
+    best = None
+    for r in range(repeat):
+        start = time.perf_counter()
+        for ctx in ctxs:
+            lookup(ctx)
+        elapsed = (time.perf_counter() - start) / len(ctxs) * 1e6
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def runBenchmark(frameCounts):
+    '''Check the frame index against the scan and compare their latency for scenarios of increasing size
+    :param frameCounts: list with the number of frames of each generated scenario
+    '''
+    ok = True
+    rand = random.Random(0)
+    scenarioDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scenarios", "JSON")
+    scenarios = [os.path.join(scenarioDir, f) for f in sorted(os.listdir(scenarioDir)) if f.endswith(".json")]
+    with tempfile.TemporaryDirectory() as tmp:
+        for numFrames in frameCounts:
+            filename = os.path.join(tmp, "scenario_%d.json" % numFrames)
+            scenarioGenerator.ScenarioGenerator(numFrames).write(filename)
+            scenarios.append(filename)
+        print("%8s %12s %12s %10s %14s" % ("frames", "index (us)", "scan (us)", "mismatch", "postings (KB)"))
+        for filename in scenarios:
+            scenario = readFile.ReadFile(filename)
+            ctxs = contexts(scenario, rand)
+            mismatches = checkEquivalence(scenario, ctxs)
+            ok = ok and mismatches == 0
+            indexTime = timeLookups(scenario.frameIndex.currentFrame, ctxs)
+            scanCtxs = ctxs[:200] #the scan is too slow to run every context on large scenarios
+            scanTime = timeLookups(lambda ctx: scanCurrentFrame(scenario.frames, ctx), scanCtxs, 1)
+            print("%8d %12.2f %12.2f %10d %14.1f" % (len(scenario.frames), indexTime, scanTime, mismatches, scenario.frameIndex.postingsBytes() / 1024))
+    return ok
+
+if __name__ == '__main__':
+    frameCounts = [int(a) for a in sys.argv[1:]] or [100, 1000, 5000]
+    sys.exit(0 if runBenchmark(frameCounts) else 1)
@@ -0,0 +1,55 @@
+import math
+import os
+import sys
+import tempfile
+import time
+import readFile
+import scenarioGenerator
+
+def timeLoad(filename, repeat = 3):
+    '''Best time, in seconds, of loading a scenario file with ReadFile
+    :param filename: name of the scenario file
+    :param repeat: number of loads - the fastest is kept to reduce noise
+    '''
+    best = None
+    for r in range(repeat):
+        start = time.perf_counter()
+        readFile.ReadFile(filename)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def scalingExponent(sizes, times):
+    '''Slope of the least squares fit of log(time) against log(size) - 1 means linear, 2 means quadratic'''
+    xs = [math.log(s) for s in sizes]
+    ys = [math.log(t) for t in times]
+    meanX = sum(xs) / len(xs)
+    meanY = sum(ys) / len(ys)
+    num = sum((x - meanX) * (y - meanY) for x, y in zip(xs, ys))
+    den = sum((x - meanX) ** 2 for x in xs)
+    return num / den
+
+def runBenchmark(frameCounts, maxExponent = 1.3):
+    '''Load synthetic scenarios of increasing size and check that load time grows linearly
+    :param frameCounts: list with the number of frames of each generated scenario
+    :param maxExponent: largest scaling exponent accepted as linear
+    '''
+    sizes = []
+    times = []
+    with tempfile.TemporaryDirectory() as tmp:
+        print("%10s %10s %12s" % ("passages", "load (s)", "us/passage"))
+        for numFrames in frameCounts:
+            filename = os.path.join(tmp, "scenario_%d.json" % numFrames)
+            numPassages = scenarioGenerator.ScenarioGenerator(numFrames).write(filename)
+            elapsed = timeLoad(filename)
+            sizes.append(numPassages)
+            times.append(elapsed)
+            print("%10d %10.3f %12.2f" % (numPassages, elapsed, elapsed / numPassages * 1e6))
+    exponent = scalingExponent(sizes, times)
+    print("scaling exponent: %.2f (1 = linear, 2 = quadratic)" % exponent)
+    return exponent <= maxExponent
+
+if __name__ == '__main__':
+    frameCounts = [int(a) for a in sys.argv[1:]] or [250, 500, 1000, 2000, 4000, 8000]
+    sys.exit(0 if runBenchmark(frameCounts) else 1)
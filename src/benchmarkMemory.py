@@ -0,0 +1,39 @@
+import os
+import sys
+import tempfile
+import tracemalloc
+import readFile
+import scenarioGenerator
+
+def measureLoad(filename, streaming):
+    '''Peak and retained memory, in bytes, of loading a scenario file with ReadFile
+    :param filename: name of the scenario file
+    :param streaming: bool that indicates if the streaming ingestion mode is used
+    '''
+    tracemalloc.start()
+    try:
+        scenario = readFile.ReadFile(filename, streaming)
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del scenario
+    return peak, retained
+
+def runBenchmark(frameCounts):
+    '''Compare the peak memory of the full JSON load and the streaming ingestion mode for scenarios of increasing size
+    :param frameCounts: list with the number of frames of each generated scenario
+    '''
+    MB = 1024.0 * 1024.0
+    with tempfile.TemporaryDirectory() as tmp:
+        print("%10s %10s %12s %12s %14s %12s" % ("passages", "file (MB)", "graph (MB)", "peak (MB)", "streamed (MB)", "peak/graph"))
+        for numFrames in frameCounts:
+            filename = os.path.join(tmp, "scenario_%d.json" % numFrames)
+            numPassages = scenarioGenerator.ScenarioGenerator(numFrames).write(filename)
+            peak, retained = measureLoad(filename, False)
+            streamedPeak, streamedRetained = measureLoad(filename, True)
+            print("%10d %10.1f %12.1f %12.1f %14.1f %6.2f/%.2f" % (numPassages, os.path.getsize(filename) / MB, streamedRetained / MB,
+                                                             peak / MB, streamedPeak / MB, peak / retained, streamedPeak / streamedRetained))
+
+if __name__ == '__main__':
+    frameCounts = [int(a) for a in sys.argv[1:]] or [500, 2000, 8000]
+    runBenchmark(frameCounts)
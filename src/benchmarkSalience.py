@@ -0,0 +1,68 @@
+import os
+import random
+import sys
+import tempfile
+import time
+import batchSalience
+import dialogueEngine
+import readFile
+import scenarioGenerator
+
+def sessionStates(engine, numSessions, rand, maxTurns = 30):
+    '''Sessions advanced by a random number of random user inputs, each with its current frame'''
+    sessions = []
+    currFrames = []
+    while len(sessions) < numSessions:
+        session = engine.start_session(seed = rand.random())
+        for t in range(rand.randint(1, maxTurns)):
+            options = engine.user_options(session)
+            if len(options) == 0:
+                break
+            try:
+                engine.respond(session, rand.choice(options).passageId)
+            except dialogueEngine.DeadEndError:
+                break
+        currFrame = engine.getCurrentFrame(session.currSocialCtx)
+        if currFrame is not None:
+            sessions.append(session)
+            currFrames.append(currFrame)
+    return sessions, currFrames
+
+def runBenchmark(numFrames, frameCopies, batchSizes):
+    '''Check that the batched salience gives the same tie sets as the scalar method and find the batch size from which it is faster
+    :param numFrames: number of frames of the generated scenario
+    :param frameCopies: number of passages of each frame - more copies give frames more next frames
+    :param batchSizes: list with the batch sizes to time
+    '''
+    rand = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "scenario.json")
+        scenarioGenerator.ScenarioGenerator(numFrames, knowledgeTags = 8, frameCopies = frameCopies).write(filename)
+        engine = dialogueEngine.DialogueEngine(readFile.ReadFile(filename))
+    batch = batchSalience.BatchSalience(engine.scenario)
+    sessions, currFrames = sessionStates(engine, max(batchSizes), rand)
+    scalar = [engine.salienceFrames(s, f) for s, f in zip(sessions, currFrames)]
+    batched = batch.salienceFrames([s.knowledgeBase for s in sessions], currFrames)
+    mismatches = sum(1 for a, b in zip(scalar, batched) if a != b)
+    print("frames %d, frame copies %d, sessions %d, tie set mismatches %d" % (numFrames, frameCopies, len(sessions), mismatches))
+    print("%8s %14s %14s" % ("batch", "scalar (us/s)", "batched (us/s)"))
+    crossover = None
+    for size in batchSizes:
+        kbs = [s.knowledgeBase for s in sessions[:size]]
+        start = time.perf_counter()
+        for s, f in zip(sessions[:size], currFrames[:size]):
+            engine.salienceFrames(s, f)
+        scalarTime = (time.perf_counter() - start) / size * 1e6
+        start = time.perf_counter()
+        batch.salienceFrames(kbs, currFrames[:size])
+        batchedTime = (time.perf_counter() - start) / size * 1e6
+        if crossover is None and batchedTime < scalarTime:
+            crossover = size
+        print("%8d %14.2f %14.2f" % (size, scalarTime, batchedTime))
+    print("crossover: %s" % ("batch of %d sessions" % crossover if crossover is not None else "not reached"))
+    return mismatches == 0
+
+if __name__ == '__main__':
+    numFrames = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    frameCopies = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    sys.exit(0 if runBenchmark(numFrames, frameCopies, [1, 4, 16, 64, 256, 1024, 4096]) else 1)
@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import dialogueEngine
+import metrics
+import readFile
+import scenarioGenerator
+
+RESULTS_VERSION = 1
+#metrics where a larger value is a slowdown, and where a smaller value is
+LOWER_IS_BETTER = ["loadSeconds", "retainedMB", "peakMB"]
+HIGHER_IS_BETTER = ["dialoguesPerSecond"]
+#latency percentiles compared with the baseline - the tail is too noisy to compare
+COMPARED_PERCENTILES = ["p50", "p90"]
+
+def measureLoad(filename, repeat = 3):
+    '''Best load time of a scenario file, and the retained and peak memory of one load'''
+    best = None
+    for r in range(repeat):
+        start = time.perf_counter()
+        readFile.ReadFile(filename)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    tracemalloc.start()
+    try:
+        scenario = readFile.ReadFile(filename)
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return scenario, best, retained, peak
+
+def userTurn(engine, session, options, rand, timeoutRate):
+    '''Play one user turn: a timeout, or a random user option - returns False when the agent cannot respond'''
+    try:
+        if engine.scenario.timeoutCondition > 0 and session.currNode is not None and not session.timeoutActive and rand.random() < timeoutRate:
+            engine.timeout_expired(session)
+        else:
+            engine.respond(session, rand.choice(options).passageId)
+    except dialogueEngine.DeadEndError: #no frame or no node for the agent to respond
+        return False
+    return True
+
+def measureLatency(engine, numTurns, maxTurns, rand):
+    '''Latency samples, in nanoseconds, of the engine calls made during random dialogues
+    :param numTurns: number of user turns to time - fewer are timed if the dialogues end before (at most numTurns dialogues are played)
+    :param maxTurns: maximum number of user turns of each dialogue
+    DeadEndError is raised if no dialogue gets a response from the agent
+    '''
+    timer = time.perf_counter_ns
+    samples = {"getCurrentFrame": [], "salienceFrames": [], "user_options": [], "respond": []}
+    turns = 0
+    for d in range(numTurns):
+        if turns >= numTurns:
+            break
+        session = engine.start_session(seed = rand.getrandbits(64))
+        for t in range(maxTurns):
+            start = timer()
+            options = engine.user_options(session)
+            samples["user_options"].append(timer() - start)
+            if len(options) == 0:
+                break
+            start = timer()
+            currFrame = engine.getCurrentFrame(session.currSocialCtx)
+            samples["getCurrentFrame"].append(timer() - start)
+            if currFrame is not None:
+                start = timer()
+                engine.salienceFrames(session, currFrame)
+                samples["salienceFrames"].append(timer() - start)
+            node = rand.choice(options)
+            start = timer()
+            try:
+                engine.respond(session, node.passageId)
+            except dialogueEngine.DeadEndError: #no frame or no node for the agent to respond
+                break
+            samples["respond"].append(timer() - start)
+            turns += 1
+            if turns >= numTurns:
+                break
+    if turns == 0 and numTurns > 0:
+        raise dialogueEngine.DeadEndError("no dialogue of the scenario gets a response from the agent")
+    return {name: metrics.percentiles(s) for name, s in samples.items()}
+
+def measureThroughput(engine, numDialogues, maxTurns, rand, timeoutRate):
+    '''Dialogues per second and user turns per second of complete random dialogues, including timeouts'''
+    turns = 0
+    start = time.perf_counter()
+    for d in range(numDialogues):
+        session = engine.start_session(seed = rand.getrandbits(64))
+        for t in range(maxTurns):
+            options = engine.user_options(session)
+            if len(options) == 0 or not userTurn(engine, session, options, rand, timeoutRate):
+                break
+            turns += 1
+    elapsed = time.perf_counter() - start
+    return numDialogues / elapsed, turns / elapsed
+
+def runSize(filename, numTurns, numDialogues, maxTurns, timeoutRate, seed):
+    '''All the measurements of one generated scenario'''
+    MB = 1024.0 * 1024.0
+    scenario, loadSeconds, retained, peak = measureLoad(filename)
+    engine = dialogueEngine.DialogueEngine(scenario)
+    latency = measureLatency(engine, numTurns, maxTurns, random.Random(seed))
+    dialoguesPerSecond, turnsPerSecond = measureThroughput(engine, numDialogues, maxTurns, random.Random(seed), timeoutRate)
+    return {
+        "passages": len(scenario.frames) + len(scenario.treeNodes),
+        "fileMB": os.path.getsize(filename) / MB,
+        "loadSeconds": loadSeconds,
+        "retainedMB": retained / MB,
+        "peakMB": peak / MB,
+        "latencyUs": latency,
+        "dialoguesPerSecond": dialoguesPerSecond,
+        "turnsPerSecond": turnsPerSecond,
+    }
+
+def runSuite(frameCounts, generatorOptions, numTurns = 20000, numDialogues = 2000, maxTurns = 50, timeoutRate = 0.05, seed = 0):
+    '''Generate a scenario of each size and measure it
+    :param frameCounts: list with the number of frames of each generated scenario
+    :param generatorOptions: dictionary with the ScenarioGenerator options other than the number of frames
+    :return: dictionary with the configuration and the results of each size
+    '''
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for numFrames in frameCounts:
+            filename = os.path.join(tmp, "scenario_%d.json" % numFrames)
+            scenarioGenerator.ScenarioGenerator(numFrames, seed = seed, **generatorOptions).write(filename)
+            result = runSize(filename, numTurns, numDialogues, maxTurns, timeoutRate, seed)
+            result["frames"] = numFrames
+            results.append(result)
+            printResult(result)
+    return {
+        "version": RESULTS_VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": dict(generatorOptions, turns = numTurns, dialogues = numDialogues, maxTurns = maxTurns, timeoutRate = timeoutRate, seed = seed),
+        "results": results,
+    }
+
+def printResult(result):
+    '''Print the measurements of one size'''
+    print("frames %d (%d passages, %.1f MB): load %.3fs, retained %.1f MB, peak %.1f MB, %.0f dialogues/s, %.0f turns/s" %
+          (result["frames"], result["passages"], result["fileMB"], result["loadSeconds"], result["retainedMB"], result["peakMB"],
+           result["dialoguesPerSecond"], result["turnsPerSecond"]))
+    for name, p in result["latencyUs"].items():
+        if p:
+            print("  %-16s p50 %8.2fus  p90 %8.2fus  p99 %8.2fus  max %9.2fus" % (name, p["p50"], p["p90"], p["p99"], p["max"]))
+
+def compareResults(baseline, current, tolerance):
+    '''Find the measurements that got worse than the baseline by more than the tolerance
+    :param baseline, current: dictionaries written by runSuite
+    :param tolerance: accepted relative change (0.25 accepts 25% slower)
+    :return: list with a description of each regression
+    '''
+    regressions = []
+    baseBySize = {r["frames"]: r for r in baseline["results"]}
+    for result in current["results"]:
+        base = baseBySize.get(result["frames"])
+        if base is None:
+            continue
+        compared = [(m, base[m], result[m], False) for m in LOWER_IS_BETTER]
+        compared += [(m, base[m], result[m], True) for m in HIGHER_IS_BETTER]
+        for name, p in result["latencyUs"].items():
+            for q in COMPARED_PERCENTILES:
+                if q in p and q in base["latencyUs"].get(name, {}):
+                    compared.append((name + " " + q, base["latencyUs"][name][q], p[q], False))
+        for metric, old, new, higherIsBetter in compared:
+            if old <= 0:
+                continue
+            change = (old - new) / old if higherIsBetter else (new - old) / old
+            if change > tolerance:
+                regressions.append("frames %d: %s %.4g -> %.4g (%+.0f%%)" % (result["frames"], metric, old, new, change * 100))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Measure loading and dialogue performance on generated scenarios of increasing size")
+    parser.add_argument("frames", type = int, nargs = "*", default = [100, 1000, 10000], help = "number of frames of each generated scenario")
+    parser.add_argument("--trees", type = int, default = 2, help = "dialogue trees per frame")
+    parser.add_argument("--depth", type = int, default = 3)
+    parser.add_argument("--branching", type = int, default = 2)
+    parser.add_argument("--tags-per-frame", type = int, default = 1)
+    parser.add_argument("--role-mix", type = float, default = 0.5, help = "probability of the user saying the head node of extra trees")
+    parser.add_argument("--no-timeout", action = "store_true", help = "generate scenarios without timeout frame")
+    parser.add_argument("--turns", type = int, default = 20000, help = "number of timed user turns per size")
+    parser.add_argument("--dialogues", type = int, default = 2000, help = "number of dialogues of the throughput measurement")
+    parser.add_argument("--output", default = "benchmark.json", help = "file with the results")
+    parser.add_argument("--baseline", help = "results file of a previous version to compare with")
+    parser.add_argument("--tolerance", type = float, default = 0.25, help = "accepted relative slowdown against the baseline")
+    args = parser.parse_args()
+    options = {"treesPerFrame": args.trees, "depth": args.depth, "branching": args.branching, "tagsPerFrame": args.tags_per_frame,
+               "roleMix": args.role_mix, "timeoutFrame": not args.no_timeout}
+    current = runSuite(args.frames, options, args.turns, args.dialogues)
+    with open(args.output, "w") as f:
+        json.dump(current, f, indent = 2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compareResults(json.load(f), current, args.tolerance)
+        for r in regressions:
+            print("regression: " + r)
+        sys.exit(1 if regressions else 0)
+    sys.exit(0)
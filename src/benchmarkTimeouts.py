@@ -0,0 +1,58 @@
+import os
+import random
+import sys
+import time
+import dialogueEngine
+import readFile
+import timeoutScheduler
+
+class FakeClock:
+    '''Clock moved by the benchmark, so that deadlines expire without waiting'''
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def runBenchmark(numSessions, seconds = 120):
+    '''Simulate sessions that reply after a random delay (some of them too late) and measure the scheduler's cost
+    :param numSessions: number of concurrent sessions
+    :param seconds: simulated time
+    '''
+    scenarioDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scenarios", "JSON")
+    engine = dialogueEngine.DialogueEngine(readFile.ReadFile(os.path.join(scenarioDir, "anamnesis_agentDoctor.json")))
+    clock = FakeClock()
+    scheduler = timeoutScheduler.TimeoutScheduler(engine, clock = clock)
+    rand = random.Random(0)
+    sessions = [engine.start_session(seed = i) for i in range(numSessions)]
+    #time at which each session replies - a little over the timeout condition for 10% of the replies
+    #(deadlines are armed after the first user turn, as in the application)
+    replyAt = {}
+    for s in sessions:
+        replyAt[s.sessionId] = rand.uniform(0, 1)
+    schedulerTime = 0.0
+    replies = timeouts = 0
+    maxPending = 0
+    while clock.now < seconds:
+        clock.now += scheduler.tick
+        start = time.perf_counter()
+        timeouts += len(scheduler.advance())
+        schedulerTime += time.perf_counter() - start
+        maxPending = max(maxPending, len(scheduler))
+        for s in sessions:
+            if replyAt[s.sessionId] <= clock.now:
+                options = engine.user_options(s)
+                start = time.perf_counter()
+                scheduler.cancel(s)
+                engine.respond(s, rand.choice(options).passageId)
+                scheduler.arm(s)
+                schedulerTime += time.perf_counter() - start
+                replies += 1
+                replyAt[s.sessionId] = clock.now + rand.uniform(1, scheduler.timeoutCondition * 1.1)
+    ticks = int(seconds / scheduler.tick)
+    print("sessions %d, max pending %d, replies %d, timeouts %d" % (numSessions, maxPending, replies, timeouts))
+    print("scheduler + deliberation time per tick: %.3f ms (tick %.0f ms)" % (schedulerTime / ticks * 1e3, scheduler.tick * 1e3))
+    return len(scheduler) <= numSessions
+
+if __name__ == '__main__':
+    sys.exit(0 if runBenchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10000) else 1)
@@ -0,0 +1,267 @@
+import argparse
+import json
+import os
+import sys
+import time
+import dialogueEngine
+import readFile
+import scenarioCache
+
+def frameName(f):
+    '''Readable name of a frame - its first passage identifier and its tags'''
+    return "frame %s (%s)" % (f.passageId[0], " ".join(f.tags))
+
+def validateScenario(scenario):
+    '''Find problems of a scenario that break or limit its conversations
+    :return: list with the errors (the engine fails on them) and list with the warnings
+    '''
+    errors = []
+    warnings = []
+    if scenario.userRole == "" or scenario.agentRole == "":
+        #role tables are optional - without roles every resource can be said by both speakers
+        warnings.append("no roles passage with the user and agent roles - every resource can be said by the user and by the agent")
+    userStarts = [f for f in scenario.frames if f.startFrame and f.canStart(scenario.userRole)]
+    if len(userStarts) == 0:
+        errors.append("no start frame with a dialogue tree the user can open - the conversation cannot start")
+    for f in scenario.frames:
+        if "timeout" in f.tags:
+            if not f.canStart(scenario.agentRole):
+                errors.append("%s has no dialogue tree the agent can open - a timeout cannot be acknowledged" % frameName(f))
+            continue
+        if not f.canStart(scenario.userRole) and not f.canStart(scenario.agentRole):
+            warnings.append("%s has no dialogue trees" % frameName(f))
+        for pid in f.nextPassageId:
+            if pid not in scenario.framesByPid:
+                warnings.append("%s links to %s, which is not a frame" % (frameName(f), pid))
+    for n in scenario.treeNodes:
+        for pid in n.nextPassageId:
+            if pid not in scenario.nodesByPid:
+                warnings.append("resource %s (%s) links to %s, which is not a resource" % (n.passageId, n.sentence, pid))
+        if n.headNode and n.tagSetId not in scenario.framesByTags:
+            warnings.append("resource %s (%s) has tags of no frame (%s) - it is never said" % (n.passageId, n.sentence, " ".join(n.tags)))
+    return errors, warnings
+
+def compileCommand(args):
+    '''Compile scenario files into their binary caches'''
+    for filename in args.scenarios:
+        if args.force and os.path.exists(scenarioCache.cachePath(filename)):
+            os.remove(scenarioCache.cachePath(filename))
+        start = time.perf_counter()
+        scenario = scenarioCache.CompiledScenario(filename)
+        print("%s: %d frames, %d resources, %s in %.3fs" % (filename, len(scenario.frames), len(scenario.treeNodes),
+                                                           "loaded from cache" if scenario.fromCache else "compiled", time.perf_counter() - start))
+    return 0
+
+def convertCommand(args):
+    '''Convert the Twine stories of a directory to scenario JSON files and compile them'''
+    import twineHtml
+    results = twineHtml.compileDirectory(args.directory, args.output, args.workers, args.force)
+    status = 0
+    for name, result in sorted(results.items()):
+        if result == "skipped":
+            print("%s: unchanged" % name)
+        elif "error" in result:
+            print("%s: error: %s" % (name, result["error"]))
+            status = 1
+        else:
+            print("%s: %d passages, %d frames, %d resources in %.3fs" % (name, result["passages"], result["frames"], result["resources"], result["seconds"]))
+    return status
+
+def validateCommand(args):
+    '''Check scenario files - the exit status is 1 if any has errors'''
+    status = 0
+    for filename in args.scenarios:
+        try:
+            scenario = readFile.ReadFile(filename)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print("%s: error: cannot read the scenario (%s: %s)" % (filename, type(e).__name__, e))
+            status = 1
+            continue
+        errors, warnings = validateScenario(scenario)
+        for e in errors:
+            print("%s: error: %s" % (filename, e))
+        for w in warnings:
+            print("%s: warning: %s" % (filename, w))
+        print("%s: %d errors, %d warnings" % (filename, len(errors), len(warnings)))
+        if errors:
+            status = 1
+    return status
+
+def exploreCommand(args):
+    '''Explore every reachable dialogue state of a scenario - the exit status is 1 if the agent cannot respond in some state'''
+    import stateExplorer
+    scenario = readFile.ReadFile(args.scenario)
+    explorer = stateExplorer.StateExplorer(scenario, not args.no_timeouts, args.knowledge_capacity, args.max_states).explore()
+    print("%d states, %d transitions in %.2fs%s" % (len(explorer.states), explorer.transitions, explorer.seconds,
+                                                    " (stopped at the maximum number of states)" if explorer.truncated else ""))
+    print("timeouts: %d activated, %d acknowledgements, %d repetitions after the user replied" % (explorer.timeouts, explorer.timeoutAcks, explorer.recoveries))
+    print("dead ends (the agent cannot respond): %d" % len(explorer.deadEnds))
+    for state, userNode in explorer.deadEnds[:args.examples]:
+        print("  " + " / ".join(explorer.path(state) + [userNode.sentence + " <<<" if userNode is not None else "(timeout)"]))
+    print("end states (no user options): %d" % len(explorer.endStates))
+    for state in explorer.endStates[:args.examples]:
+        print("  " + " / ".join(explorer.path(state)))
+    unreachable = explorer.unreachableFrames()
+    print("unreachable frames: %d" % len(unreachable))
+    for f in unreachable:
+        print("  " + frameName(f))
+    unreachable = explorer.unreachableNodes()
+    print("resources never said: %d" % len(unreachable))
+    for n in unreachable[:args.examples]:
+        print("  resource %s (%s)" % (n.passageId, n.sentence))
+    if args.frames:
+        print("states and user inputs by frame:")
+        for f, count in sorted(zip(scenario.frames, explorer.frameReach), key = lambda fc: -fc[1]):
+            print("  %8d  %s" % (count, frameName(f)))
+    return 1 if explorer.deadEnds else 0
+
+def benchCommand(args):
+    '''Measure loading and dialogue performance of a scenario file (see benchmarkSuite)'''
+    import benchmarkSuite
+    try:
+        result = benchmarkSuite.runSize(args.scenario, args.turns, args.dialogues, args.max_turns, args.timeout_rate, args.seed)
+    except dialogueEngine.DeadEndError as e:
+        print("%s: error: %s" % (args.scenario, e))
+        return 1
+    result["frames"] = len(readFile.ReadFile(args.scenario).frames)
+    benchmarkSuite.printResult(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent = 2)
+    return 0
+
+def simulateCommand(args):
+    '''Simulate dialogues of a scenario with random or scripted users (see simulator)'''
+    import simulator
+    policy = None
+    if args.script:
+        with open(args.script) as f:
+            policy = simulator.ScriptedPolicy(json.load(f))
+    stats, elapsed = simulator.runSimulation(args.scenario, args.dialogues, args.max_turns, args.workers, args.seed, policy, args.timeout_rate)
+    result = simulator.report(args.scenario, stats, elapsed)
+    simulator.printReport(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent = 2)
+    return 0
+
+def playCommand(args):
+    '''Play a conversation in the terminal - the user chooses options by number or types them as free text'''
+    scenario = scenarioCache.CompiledScenario(args.scenario)
+    engine = dialogueEngine.DialogueEngine(scenario)
+    #the text matcher (which needs NumPy) is created when the user first types free text
+    matcher = None
+    session = engine.start_session(seed = args.seed)
+    print("session seed %d - choose an option by its number or type it%s, q to quit" % (session.seed, ", t to let the timeout expire" if scenario.timeoutCondition > 0 else ""))
+    while True:
+        options = engine.user_options(session)
+        if len(options) == 0:
+            print("(end of the conversation)")
+            return 0
+        for i, option in enumerate(options):
+            print("  %d) %s" % (i + 1, option.sentence))
+        try:
+            choice = input("> ").strip()
+        except EOFError:
+            return 0
+        if choice == "q":
+            return 0
+        try:
+            if choice == "t" and scenario.timeoutCondition > 0:
+                #as the engine and the server, there is no timeout before the agent speaks
+                if session.currNode is None:
+                    print("(the agent did not speak yet - choose an option)")
+                    continue
+                response = engine.timeout_expired(session)
+                if response is None: #the timeout error is already active
+                    continue
+            elif choice.isdigit():
+                if not 1 <= int(choice) <= len(options):
+                    print("choose a number between 1 and %d" % len(options))
+                    continue
+                print(options[int(choice) - 1].sentence + " <<<")
+                response = engine.respond(session, options[int(choice) - 1].passageId)
+            else:
+                if matcher is None:
+                    try:
+                        import textMatcher
+                    except ImportError:
+                        print("(free text needs NumPy - choose a number between 1 and %d)" % len(options))
+                        continue
+                    matcher = textMatcher.TextMatcher(scenario, threshold = args.threshold)
+                node, response = engine.respond_text(session, choice, matcher)
+                if node is not None:
+                    print("(understood as: %s)" % node.sentence)
+                elif response is None:
+                    print("(not understood - choose a number between 1 and %d)" % len(options))
+                    continue
+        except dialogueEngine.DeadEndError: #no frame or no node for the agent to respond
+            print("(the agent has no response - end of the conversation)")
+            return 0
+        print(">>> " + response)
+
+def guiCommand(args):
+    '''Open the graphical application - the only command that needs Qt'''
+    import main
+    main.App()
+    return 0
+
+def parser():
+    parser = argparse.ArgumentParser(description = "Socially aware dialogue system - scenario tools and terminal conversations")
+    commands = parser.add_subparsers(dest = "command", required = True)
+    p = commands.add_parser("compile", help = "compile scenario files into their binary caches")
+    p.add_argument("scenarios", nargs = "+")
+    p.add_argument("-f", "--force", action = "store_true", help = "compile even if the cache is up to date")
+    p.set_defaults(run = compileCommand)
+    p = commands.add_parser("convert", help = "convert the Twine stories (HTML) of a directory to scenario JSON files")
+    p.add_argument("directory")
+    p.add_argument("-o", "--output", help = "directory of the scenario JSON files (the story directory by default)")
+    p.add_argument("-w", "--workers", type = int, default = None, help = "number of processes (one per CPU by default)")
+    p.add_argument("-f", "--force", action = "store_true", help = "convert the stories that did not change too")
+    p.set_defaults(run = convertCommand)
+    p = commands.add_parser("validate", help = "check scenario files for errors and unused passages")
+    p.add_argument("scenarios", nargs = "+")
+    p.set_defaults(run = validateCommand)
+    p = commands.add_parser("explore", help = "explore every reachable dialogue state: dead ends, unreachable frames and timeout recovery")
+    p.add_argument("scenario")
+    p.add_argument("--no-timeouts", action = "store_true", help = "do not let the timeout expire")
+    p.add_argument("--knowledge-capacity", type = int, default = None, help = "capacity of the knowledge base (no limit by default)")
+    p.add_argument("--max-states", type = int, default = None, help = "stop after this number of states")
+    p.add_argument("--examples", type = int, default = 10, help = "number of example conversations and resources listed")
+    p.add_argument("--frames", action = "store_true", help = "list the number of states of each frame")
+    p.set_defaults(run = exploreCommand)
+    p = commands.add_parser("bench", help = "measure the load time, memory, latency and throughput of a scenario")
+    p.add_argument("scenario")
+    p.add_argument("--turns", type = int, default = 20000, help = "number of timed user turns")
+    p.add_argument("--dialogues", type = int, default = 2000, help = "number of dialogues of the throughput measurement")
+    p.add_argument("--max-turns", type = int, default = 50)
+    p.add_argument("--timeout-rate", type = float, default = 0.05)
+    p.add_argument("--seed", type = int, default = 0)
+    p.add_argument("--json", help = "write the results to this file")
+    p.set_defaults(run = benchCommand)
+    p = commands.add_parser("simulate", help = "simulate dialogues with random or scripted users: visited frames, dead ends and unreachable passages")
+    p.add_argument("scenario")
+    p.add_argument("-n", "--dialogues", type = int, default = 10000)
+    p.add_argument("-t", "--max-turns", type = int, default = 50)
+    p.add_argument("-w", "--workers", type = int, default = None, help = "number of processes (one per CPU by default)")
+    p.add_argument("-s", "--seed", type = int, default = 0)
+    p.add_argument("--timeout-rate", type = float, default = 0.0, help = "probability of the user not replying in time at each turn")
+    p.add_argument("--script", help = "JSON file with the list of sentences or passage ids chosen by the user")
+    p.add_argument("--json", help = "write the full results to this file")
+    p.set_defaults(run = simulateCommand)
+    p = commands.add_parser("play", help = "play a conversation in the terminal")
+    p.add_argument("scenario")
+    p.add_argument("-s", "--seed", type = int, default = None, help = "seed of the agent's choices (random by default)")
+    p.add_argument("--threshold", type = float, default = 0.4, help = "minimum similarity (0 to 1) of typed text and the option it is matched to")
+    p.set_defaults(run = playCommand)
+    p = commands.add_parser("gui", help = "open the graphical application (requires PyQt5)")
+    p.set_defaults(run = guiCommand)
+    return parser
+
+def main(argv = None):
+    '''Run the command given by the arguments (the command line arguments by default) - returns the exit status'''
+    args = parser().parse_args(argv)
+    return args.run(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
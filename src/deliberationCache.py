@@ -0,0 +1,63 @@
+import collections
+
+class DeliberationCache:
+    '''Deliberation results shared by the sessions of a dialogue engine - set it as the engine's cache to use it
+    The user options only depend on the current node and context, and the frames the agent can choose from only depend on the context and
+    the knowledge base tags that some frame has, so sessions that follow the same path reuse them instead of computing them again.
+    The random choices between frames and resources are still made by each session, in the same order, so conversations do not change.
+    '''
+    def __init__(self, capacity = 4096):
+        '''Initialize deliberation cache
+        :param capacity: maximum number of cached results - the least recently used result is evicted when it is exceeded
+        :var entries: ordered dictionary with the cached results by state key, from the least to the most recently used - the keys of the agent's
+        frames include the knowledge base key (KnowledgeBase.key), so without a small capacity the memory grows with the number of distinct knowledge states
+        :var hits, misses, evictions: number of lookups that found a result, that had to compute it and of results evicted
+        :var version: version of the scenario of the cached results (they are discarded when the scenario is reloaded)
+        '''
+        self.capacity = capacity
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.version = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        '''Discard the cached results (the statistics are kept)'''
+        self.entries.clear()
+
+    def lookup(self, engine, key, compute):
+        '''Cached result of a state key, computed and stored if missing'''
+        if self.version != engine.scenario.version:
+            self.entries.clear()
+            self.version = engine.scenario.version
+        entries = self.entries
+        result = entries.get(key)
+        if result is not None:
+            entries.move_to_end(key)
+            self.hits += 1
+            return result
+        self.misses += 1
+        result = entries[key] = compute()
+        if len(entries) > self.capacity:
+            entries.popitem(last = False)
+            self.evictions += 1
+        return result
+
+    def userOptions(self, engine, session):
+        '''User options of a session (see DialogueEngine.user_options)'''
+        return self.lookup(engine, (0, session.currNode, tuple(session.currSocialCtx)),
+                           lambda: tuple(engine.possibleUserNodes(session)))
+
+    def agentFrames(self, engine, session):
+        '''Current frame of a session and the salient frames the agent can respond with (see DialogueEngine.respondNode)'''
+        return self.lookup(engine, (1, tuple(session.currSocialCtx), session.knowledgeBase.key()),
+                           lambda: engine.agentFrames(session))
+
+    def stats(self):
+        '''Dictionary with the size, the lookups and the hit rate of the cache'''
+        lookups = self.hits + self.misses
+        return {"size": len(self.entries), "capacity": self.capacity, "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hitRate": self.hits / lookups if lookups > 0 else 0.0}
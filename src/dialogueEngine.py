@@ -0,0 +1,340 @@
+import itertools
+import random
+import knowledgeBase
+
+class DeadEndError(Exception):
+    '''The agent has no frame or no resource to respond with - the conversation cannot continue'''
+
+class Session:
+    '''State of one conversation - everything else is read from the scenario shared by the engine'''
+    __slots__ = ('sessionId', 'currSocialCtx', 'currNode', 'prevSocialCtx', 'prevNode', 'knowledgeBase', 'timeoutActive', 'rand', 'seed')
+
+    def __init__(self, sessionId, rand, knowledge, seed = None):
+        '''Initialize session
+        :param sessionId: identifier of the session
+        :param rand: random generator of the session - used to randomize choices between frames and resources
+        :param knowledge: empty KnowledgeBase of the session
+        :param seed: seed of the random generator (None if the generator was not seeded) - the session can be replayed from it
+        :var currSocialCtx and prevSocialCtx: list of current and previous social context tags
+        :var currNode and prevNode: current and previous tree node objects
+        :var knowledgeBase: KnowledgeBase with the tags acquired during conversation
+        :var timeoutActive: bool that indicates if the timeout error was activated or not
+        '''
+        self.sessionId = sessionId
+        self.currSocialCtx = []
+        self.currNode = None
+        self.prevSocialCtx = None
+        self.prevNode = None
+        self.knowledgeBase = knowledge
+        self.timeoutActive = False
+        self.rand = rand
+        self.seed = seed
+
+    def timeoutRecoveryRepetition(self, inputNode):
+        '''After entering timeout frame'''
+        if inputNode is not None and self.timeoutActive:
+            self.timeoutActive = False
+            return True
+        return False
+
+    def timeoutRecoveryAcknowledge(self, inputNode):
+        '''Before entering timeout frame'''
+        if inputNode is None and self.timeoutActive:
+            return True
+        return False
+
+class DialogueEngine:
+    '''Deliberation mechanism without user interface - one read-only scenario shared by any number of sessions'''
+    def __init__(self, scenario, knowledgeCapacity = None):
+        '''Initialize dialogue engine
+        :param scenario: loaded scenario (ReadFile or CompiledScenario) - it is never modified by the engine
+        :param knowledgeCapacity: maximum number of tags of the knowledge base of each session (None for no limit)
+        :var user role, agent role, frames: relevant variables from the scenario file
+        :var trace: TraceWriter that records the sessions and turns (None to not record them)
+        :var cache: DeliberationCache shared by the sessions (None to deliberate on every turn)
+        '''
+        self.scenario = scenario
+        self.userRole = scenario.userRole
+        self.agentRole = scenario.agentRole
+        self.frames = scenario.frames
+        self.knowledgeCapacity = knowledgeCapacity
+        self.sessionIds = itertools.count()
+        self.trace = None
+        self.cache = None
+
+    def refresh(self):
+        '''Read the roles and frames of the scenario again after it was reloaded'''
+        self.userRole = self.scenario.userRole
+        self.agentRole = self.scenario.agentRole
+        self.frames = self.scenario.frames
+
+    def start_session(self, sessionId = None, seed = None, rand = None):
+        '''Create a new conversation
+        :param sessionId: identifier of the session (a sequential number by default)
+        :param seed: integer seed of the session's random generator - the same seed and user inputs give the same conversation (a random seed by default)
+        :param rand: random generator to use instead of a seeded one - such sessions cannot be recorded
+        '''
+        if sessionId is None:
+            sessionId = next(self.sessionIds)
+        if rand is None:
+            if seed is None:
+                #one read from the operating system per session, the choices of the session are seeded from it
+                seed = random.SystemRandom().getrandbits(64)
+            rand = random.Random(seed)
+        session = Session(sessionId, rand, knowledgeBase.KnowledgeBase(self.scenario, self.knowledgeCapacity), seed)
+        if self.trace is not None:
+            self.trace.startSession(session)
+        return session
+
+    def user_options(self, session):
+        '''Obtain user options according to the current context of the session'''
+        if self.cache is not None:
+            return self.cache.userOptions(self, session)
+        return self.possibleUserNodes(session)
+
+    def possibleUserNodes(self, session):
+        '''Compute the user options of the session - the nodes that follow the current node or the head nodes of the next frames'''
+        #check if we are still within dialogue tree - if tree is not finished dont change the context suddenly
+        possibleNodes = self.getPossibleNodes(session)
+        if len(possibleNodes) == 0:
+            #find current frames, given ctx+kb
+            currFrame = self.getCurrentFrame(session.currSocialCtx)
+            #next frames are options
+            nextFrames = self.checkStartApp(currFrame)
+            #check if start nodes from those frames can be said by user role
+            possibleFrames = self.checkRoleFrames(nextFrames, self.userRole)
+            #no frames found - use current frame (no options if the context matches no frame: the conversation ended)
+            if len(possibleFrames) == 0:
+                if currFrame is None:
+                    return []
+                possibleFrames.append(currFrame)
+            #get possible nodes given possible frames and checking if those nodes can be used by user role
+            possibleNodes = []
+            for pf in possibleFrames:
+                possibleNodes += self.checkRoleResource(pf, self.userRole)
+        return possibleNodes
+
+    def respond(self, session, node_id):
+        '''Agent's response to a user input - DeadEndError is raised if the agent cannot respond (the conversation ended)
+        :param node_id: passage identifier of the tree node chosen by the user - ValueError is raised if it is not one of the user options
+        '''
+        return self.respondNode(session, self.userOption(session, node_id))
+
+    def userOption(self, session, node_id):
+        '''Tree node of the user option with a passage identifier - the options are looked up instead of the scenario, so a client cannot
+        jump to any node of the graph, and a session still in a dialogue tree removed by a reload can finish it'''
+        for node in self.user_options(session):
+            if node.passageId == node_id:
+                return node
+        raise ValueError("%s is not a user option of session %s" % (node_id, session.sessionId))
+
+    def timeout_expired(self, session):
+        '''Activate the timeout error of a session that did not reply in time and return the agent's acknowledgement
+        DeadEndError is raised if the agent cannot acknowledge it (e.g. the scenario has no timeout frame)
+        '''
+        if session.timeoutActive:
+            return None
+        session.timeoutActive = True
+        return self.respondNode(session, None)
+
+    def respond_text(self, session, text, matcher, timeoutFallback = True):
+        '''Agent's response to free text typed by the user - the text is matched to the most similar user option
+        Note: by default a text that matches no option (no similarity reaches the matcher's threshold) expires the timeout, the only
+        error frame of the scenario format - the agent acknowledges it with the timeout frame and repeats its previous sentence after
+        the user's next input, and a trace records the turn as a timeout
+        :param matcher: TextMatcher of the engine's scenario
+        :param timeoutFallback: bool that indicates if the timeout error frame is entered when the text matches no option (otherwise the session is not changed)
+        :return: tuple with the matched option (None if there was none) and the agent's response (None if the text matched no option and
+        the error frame was not entered - no fallback, no timeout frame in the scenario, or the agent did not speak yet)
+        '''
+        node, similarity = matcher.match(self.user_options(session), text)
+        if node is not None:
+            return node, self.respondNode(session, node)
+        if not timeoutFallback or self.scenario.timeoutCondition <= 0 or session.currNode is None:
+            return None, None
+        return None, self.timeout_expired(session)
+
+    def respondNode(self, session, userInputNode):
+        '''Agent's deliberation according to user input
+        :param userInputNode: tree node of user input (None when the timeout error is acknowledged)
+        '''
+        #frame chosen for the response (None if the agent continues a dialogue tree or repeats its sentence)
+        salientFrame = None
+        #Timeout - check if user replied after timeout error activation to repeat sentence
+        if session.timeoutRecoveryRepetition(userInputNode):
+            sentence = self.repetitionSentence(session)
+        else:
+            self.updateContext(session, userInputNode)
+            #check if we are still within dialogue tree - if tree is not finished dont change the context suddenly
+            possibleNodes = self.getPossibleNodes(session)
+            if len(possibleNodes) == 0:
+                #find the frame that matches the current ctx+kb and its salient frames
+                if self.cache is not None:
+                    currFrame, salientFrames = self.cache.agentFrames(self, session)
+                else:
+                    currFrame, salientFrames = self.agentFrames(session)
+                #choose the frame of the response and its resources that can be said by agent role
+                salientFrame = self.chooseSalientFrame(session, currFrame, salientFrames)
+                possibleNodes = self.checkRoleResource(salientFrame, self.agentRole)
+            sentence = self.chooseNode(session, possibleNodes)
+        if self.trace is not None:
+            self.trace.recordTurn(self, session, userInputNode, salientFrame)
+        return sentence
+
+    def respond_batch(self, sessions, node_ids, batchSalience):
+        '''Agent's responses to the user inputs of many sessions - the salience of the sessions that change frame is computed in one batch
+        :param sessions: list with the sessions
+        :param node_ids: list with the passage identifier of the tree node chosen by the user of each session (ValueError is raised if one is not a user option)
+        :param batchSalience: BatchSalience object of the engine's scenario
+        :return: list with the response of each session (None for the sessions that reached a dead end, see respond - their turn is not traced)
+        '''
+        responses = [None] * len(sessions)
+        chosenFrames = [None] * len(sessions)
+        deadEnds = set()
+        changeFrame = []
+        currFrames = []
+        userInputNodes = [self.userOption(session, node_id) for session, node_id in zip(sessions, node_ids)]
+        for i, (session, userInputNode) in enumerate(zip(sessions, userInputNodes)):
+            try:
+                if session.timeoutRecoveryRepetition(userInputNode):
+                    responses[i] = self.repetitionSentence(session)
+                    continue
+                self.updateContext(session, userInputNode)
+                possibleNodes = self.getPossibleNodes(session)
+                if len(possibleNodes) != 0:
+                    responses[i] = self.chooseNode(session, possibleNodes)
+                    continue
+            except DeadEndError:
+                deadEnds.add(i)
+                continue
+            currFrame = self.getCurrentFrame(session.currSocialCtx)
+            if currFrame is None: #no frame matches the context (see agentFrames)
+                deadEnds.add(i)
+                continue
+            changeFrame.append(i)
+            currFrames.append(currFrame)
+        salientFrames = batchSalience.salienceFrames([sessions[i].knowledgeBase for i in changeFrame], currFrames)
+        for i, currFrame, salient in zip(changeFrame, currFrames, salientFrames):
+            try:
+                chosenFrames[i] = self.chooseSalientFrame(sessions[i], currFrame, salient)
+                possibleNodes = self.checkRoleResource(chosenFrames[i], self.agentRole)
+                responses[i] = self.chooseNode(sessions[i], possibleNodes)
+            except DeadEndError:
+                deadEnds.add(i)
+        if self.trace is not None:
+            #as in respondNode, the turns that reached a dead end are not recorded
+            for i, (session, userInputNode, salientFrame) in enumerate(zip(sessions, userInputNodes, chosenFrames)):
+                if i not in deadEnds:
+                    self.trace.recordTurn(self, session, userInputNode, salientFrame)
+        return responses
+
+    def updateContext(self, session, userInputNode):
+        '''Update the session with the user input, or enter the timeout error frame if the user is not replying'''
+        #Timeout - check if user is not replying to activate error frame
+        if session.timeoutRecoveryAcknowledge(userInputNode):
+            self.activateErrorContext(session, "timeout")
+        else:
+            #update context with tags
+            session.currSocialCtx = userInputNode.tags
+            #update knowledge base with add knowledge
+            if userInputNode.addKnowledge != "":
+                session.knowledgeBase.add(userInputNode.addKnowledge)
+            #update current tree node
+            session.currNode = userInputNode
+
+    def agentFrames(self, session):
+        '''Return the current frame of the session and the salient frames whose head resources can be said by the agent
+        DeadEndError is raised if the context matches no frame
+        '''
+        currFrame = self.getCurrentFrame(session.currSocialCtx)
+        if currFrame is None:
+            raise DeadEndError("no frame matches the context %s" % " ".join(session.currSocialCtx))
+        return currFrame, self.checkRoleFrames(self.salienceFrames(session, currFrame), self.agentRole)
+
+    def chooseSalientFrame(self, session, currFrame, salientFrames):
+        '''Choose the frame of the agent's response among the salient frames, enter its context and return it'''
+        #check if start nodes from those frames can be said by agent role
+        possibleFrames = self.checkRoleFrames(salientFrames, self.agentRole)
+        #no frames found - use current frame
+        if len(possibleFrames) == 0:
+            possibleFrames.append(currFrame)
+        #random choice between salient frames
+        salientFrame = session.rand.choice(possibleFrames)
+        #update ctx with salient frame
+        session.currSocialCtx = salientFrame.tags
+        return salientFrame
+
+    def chooseNode(self, session, possibleNodes):
+        '''Choose the node of the agent's response and return its sentence - DeadEndError is raised if there is no node to choose'''
+        if len(possibleNodes) == 0:
+            raise DeadEndError("the agent has no resource to respond with in the context %s" % " ".join(session.currSocialCtx))
+        #update current node
+        session.currNode = session.rand.choice(possibleNodes)
+        #update knowledge base if its the case
+        if session.currNode.addKnowledge != "":
+            session.knowledgeBase.add(session.currNode.addKnowledge)
+        #return the agent response
+        return session.currNode.sentence
+
+    ''' Error Recovery Funtions'''
+    def repetitionSentence(self, session):
+        '''Repeat previous sentence returning to previous social context - DeadEndError is raised if the agent did not say any'''
+        if session.prevNode is None:
+            raise DeadEndError("the agent has no previous sentence to repeat")
+        session.currSocialCtx = session.prevSocialCtx
+        session.currNode = session.prevNode
+        return session.currNode.sentence
+
+    def activateErrorContext(self, session, error):
+        '''Activate specific error frame'''
+        session.prevSocialCtx = session.currSocialCtx
+        session.prevNode = session.currNode
+        session.currSocialCtx = [error]
+        session.currNode = None
+
+    ''' AUX Functions'''
+    def salienceFrames(self, session, currFrame):
+        ''' Compute most salient frames
+        :param currFrame: current frame object to find nextFrames
+        '''
+        salientFrames = []
+        maxSalience = 0
+        matches = session.knowledgeBase.frameMatches()
+        for nf, freq in currFrame.nextFrames.items():
+            res = freq + matches.get(nf, 0) #frequency plus knowledge base match equals the salience
+            if res > maxSalience:
+                maxSalience = res
+                salientFrames = [nf]
+            elif res == maxSalience:
+                salientFrames.append(nf)
+        return salientFrames
+
+    def checkStartApp(self, currFrame):
+        '''Use start frames to show user options if we are starting the dialogue'''
+        if currFrame is not None: #not starting app
+            return currFrame.nextFrames.keys()
+        else: #starting app
+            auxNextFrames = []
+            for f in self.frames:
+                if f.startFrame:
+                    auxNextFrames.append(f)
+            return auxNextFrames
+
+    def getPossibleNodes(self, session):
+        '''Verify if current node is linked to other nodes to check if we are in the middle of a dialogue tree'''
+        if session.currNode is not None and len(session.currNode.nextNodes) != 0:
+            return session.currNode.nextNodes
+        else:
+            return []
+
+    def getCurrentFrame(self, currCtx):
+        '''Obtain current frame object given its tags'''
+        return self.scenario.frameIndex.currentFrame(currCtx)
+
+    def checkRoleFrames(self, frames, role):
+        '''Return the frames that have head nodes that can be said by a specific role'''
+        return [sf for sf in frames if sf.canStart(role)]
+
+    def checkRoleResource(self, frame, role):
+        '''Return the head resources of a specific frame that can be said by a specific role'''
+        return frame.headResources(role)
@@ -0,0 +1,577 @@
+import argparse
+import asyncio
+import collections
+import hashlib
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import sys
+import time
+import urllib.parse
+import deliberationCache
+import dialogueEngine
+import metrics
+import scenarioCache
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict",
+           500: "Internal Server Error", 502: "Bad Gateway", 503: "Service Unavailable"}
+
+def shard(sessionId, numWorkers):
+    '''Worker of a session - a stable hash of its identifier, so clients and restarted servers agree on it'''
+    digest = hashlib.blake2b(sessionId.encode("utf-8"), digest_size = 8).digest()
+    return int.from_bytes(digest, "little") % numWorkers
+
+def sessionOf(target):
+    '''Session identifier of a request target (/sessions/<id>[/action][?query]) - None for other targets'''
+    parts = urllib.parse.urlsplit(target).path.split("/")
+    if len(parts) < 3 or parts[1] != "sessions" or parts[2] == "":
+        return None
+    return urllib.parse.unquote(parts[2])
+
+def response(status, payload, close = False, contentType = "application/json"):
+    '''HTTP/1.1 response with a JSON body (or a text body of another content type)'''
+    body = json.dumps(payload).encode("utf-8") if contentType == "application/json" else payload.encode("utf-8")
+    head = "HTTP/1.1 %d %s\r\nContent-Type: %s\r\nContent-Length: %d\r\n%s\r\n" % (
+        status, REASONS.get(status, ""), contentType, len(body), "Connection: close\r\n" if close else "")
+    return head.encode("ascii") + body
+
+def memoryKb(pid):
+    '''Resident and proportional set size, in kB, of a process (Linux only) - shared pages count once in the sum of the proportional sizes'''
+    sizes = {}
+    try:
+        with open("/proc/%d/smaps_rollup" % pid) as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("Rss", "Pss"):
+                    sizes[name.lower() + "Kb"] = int(value.split()[0])
+    except OSError:
+        pass
+    return sizes
+
+def cpuSeconds(pid):
+    '''User and system CPU time, in seconds, used so far by a process (Linux only, None elsewhere)'''
+    try:
+        with open("/proc/%d/stat" % pid) as f:
+            fields = f.read().rpartition(")")[2].split()
+    except OSError:
+        return None
+    #utime and stime are the 14th and 15th fields, the first two (pid and command) are before the ")"
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+class DialogueWorker:
+    '''Sessions of one shard - runs in a forked worker process and answers the requests routed to it, one at a time'''
+    def __init__(self, engine, maxSessions, turnMetrics = None):
+        '''Initialize dialogue worker
+        :param engine: dialogue engine of the worker's scenario (see CompiledScenario.remap)
+        :param maxSessions: maximum number of open sessions - new sessions are refused with 503 when it is reached
+        :param turnMetrics: Metrics that instrument the engine in this worker (None to not record them)
+        :var sessions: dictionary with the session and the current user options of each session identifier
+        '''
+        self.engine = engine
+        self.maxSessions = maxSessions
+        self.metrics = turnMetrics
+        self.sessions = {}
+        if turnMetrics is not None:
+            turnMetrics.instrument(engine)
+
+    def options(self, sessionId, session):
+        '''Store and describe the user options of a session'''
+        options = self.engine.user_options(session)
+        self.sessions[sessionId] = (session, options)
+        return [{"id": n.passageId, "sentence": n.sentence} for n in options]
+
+    def handle(self, method, target, body):
+        '''Answer a request
+        :return: HTTP status and JSON payload
+        '''
+        url = urllib.parse.urlsplit(target)
+        if url.path == "/metrics":
+            if self.metrics is None:
+                return 404, {"error": "metrics are not recorded"}
+            return 200, self.metrics.state()
+        parts = url.path.split("/")
+        query = urllib.parse.parse_qs(url.query)
+        sessionId = urllib.parse.unquote(parts[2])
+        action = parts[3] if len(parts) > 3 else ""
+        entry = self.sessions.get(sessionId)
+        if action == "":
+            if method == "POST":
+                if entry is not None:
+                    return 409, {"error": "session %s already exists" % sessionId}
+                if len(self.sessions) >= self.maxSessions:
+                    return 503, {"error": "too many sessions"}
+                seed = int(query["seed"][0]) if "seed" in query else None
+                session = self.engine.start_session(sessionId, seed)
+                return 201, {"sessionId": sessionId, "seed": session.seed, "timeout": self.engine.scenario.timeoutCondition,
+                             "options": self.options(sessionId, session)}
+            if entry is None:
+                return 404, {"error": "no session %s" % sessionId}
+            if method == "GET":
+                return 200, {"sessionId": sessionId, "options": self.options(sessionId, entry[0])}
+            if method == "DELETE":
+                del self.sessions[sessionId]
+                return 200, {"sessionId": sessionId}
+            return 405, {"error": "method not allowed"}
+        if entry is None:
+            return 404, {"error": "no session %s" % sessionId}
+        if method != "POST":
+            return 405, {"error": "method not allowed"}
+        session, options = entry
+        if action == "respond":
+            optionId = query.get("option", [None])[0]
+            #the node is taken from the options sent to the client, which are not built again
+            node = next((n for n in options if n.passageId == optionId), None)
+            if node is None:
+                return 400, {"error": "%s is not a user option" % optionId}
+            turn = lambda: self.engine.respondNode(session, node)
+        elif action == "timeout":
+            if self.engine.scenario.timeoutCondition <= 0 or session.currNode is None:
+                return 409, {"error": "the scenario has no timeout, or the agent did not speak yet"}
+            turn = lambda: self.engine.timeout_expired(session)
+        else:
+            return 404, {"error": "unknown action %s" % action}
+        try:
+            sentence = turn()
+        except dialogueEngine.DeadEndError: #no frame or no node for the agent to respond - the conversation ended
+            self.sessions[sessionId] = (session, [])
+            return 200, {"sessionId": sessionId, "response": None, "options": []}
+        return 200, {"sessionId": sessionId, "response": sentence, "options": self.options(sessionId, session)}
+
+    def serve(self, sock):
+        '''Answer the requests of the router's connection until it is closed - responses are sent in the order of the requests'''
+        rfile = sock.makefile("rb", 65536)
+        while True:
+            line = rfile.readline()
+            if not line:
+                break
+            method, target, version = line.decode("latin-1").split()
+            length = 0
+            while True:
+                header = rfile.readline()
+                if header in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = header.partition(b":")
+                if name.strip().lower() == b"content-length":
+                    length = int(value)
+            body = rfile.read(length) if length > 0 else b""
+            try:
+                status, payload = self.handle(method, target, body)
+            except (ValueError, KeyError) as e:
+                status, payload = 400, {"error": str(e)}
+            except Exception as e: #a failed request must not stop the worker and the other sessions of its shard
+                status, payload = 500, {"error": "%s: %s" % (type(e).__name__, e)}
+            sock.sendall(response(status, payload))
+
+class WorkerLink:
+    '''Router's connection to a worker process - requests are pipelined and their responses arrive in the same order'''
+    def __init__(self, pid, sock):
+        '''Initialize worker link
+        :param pid: process identifier of the worker
+        :param sock: router's end of the socket pair connected to the worker
+        :var pending: queue with the future of each request waiting for its response
+        :var forwarded, rejected: number of requests forwarded to the worker and refused because it had too many in flight
+        :var restarts: number of workers of the shard that stopped and were replaced before this one
+        :var replacement: task that forks the worker that replaces this one once it stopped (see DialogueServer.respawn)
+        '''
+        self.pid = pid
+        self.sock = sock
+        self.pending = collections.deque()
+        self.forwarded = 0
+        self.rejected = 0
+        self.alive = True
+        self.restarts = 0
+        self.replacement = None
+        self.reader = None
+        self.writer = None
+        self.task = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_unix_connection(sock = self.sock)
+        self.task = asyncio.get_running_loop().create_task(self.readResponses())
+
+    async def readResponses(self):
+        '''Resolve the pending requests with the worker's responses'''
+        try:
+            while True:
+                head = await self.reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for header in head.split(b"\r\n")[1:]:
+                    name, _, value = header.partition(b":")
+                    if name.lower() == b"content-length":
+                        length = int(value)
+                body = await self.reader.readexactly(length)
+                self.pending.popleft().set_result(head + body)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        #the worker died - its pending and future requests fail
+        self.alive = False
+        while self.pending:
+            self.pending.popleft().set_result(response(502, {"error": "worker %d stopped" % self.pid}))
+
+    def forward(self, method, target, body):
+        '''Send a request to the worker
+        :return: future with the raw response
+        '''
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append(future)
+        self.writer.write(("%s %s HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % (method, target, len(body))).encode("latin-1") + body)
+        self.forwarded += 1
+        return future
+
+class DialogueServer:
+    '''Local dialogue server - the sessions are sharded between forked worker processes by a hash of their identifier
+    The scenario is compiled once, before the fork, and its cache file stays mapped read-only: the workers read the arrays of the graph
+    from the same pages instead of each holding a copy, and each worker only creates the frames and the tree nodes its sessions use.
+    Python objects shared by fork would be copied by the first write to their reference counts.
+    '''
+    def __init__(self, filename, numWorkers = None, maxInFlight = 64, maxSessions = 100000, cacheSize = 4096, recordMetrics = True, cacheFile = None):
+        '''Initialize dialogue server
+        :param filename: name of the scenario file (its compiled cache is used, see scenarioCache)
+        :param numWorkers: number of worker processes (one per CPU by default)
+        :param maxInFlight: maximum number of requests waiting for each worker - further requests are refused with 503 (backpressure)
+        :param maxSessions: maximum number of open sessions of each worker
+        :param cacheSize: number of deliberation results cached by each worker (0 to not cache them, see deliberationCache)
+        :param recordMetrics: bool that indicates if the workers record the metrics of their turns, served at /metrics (see metrics)
+        :param cacheFile: name of the compiled cache file (next to the scenario file by default) - it must be writable if the cache is stale
+        '''
+        self.filename = filename
+        self.cacheFile = cacheFile
+        self.numWorkers = numWorkers if numWorkers is not None else os.cpu_count() or 1
+        self.maxInFlight = maxInFlight
+        self.maxSessions = maxSessions
+        self.cacheSize = cacheSize
+        self.recordMetrics = recordMetrics
+        self.scenario = None
+        self.links = []
+        self.server = None
+
+    def start(self):
+        '''Compile and map the scenario and fork the workers'''
+        scenario = scenarioCache.CompiledScenario(self.filename, self.cacheFile)
+        if not scenario.fromCache: #just compiled - the graph is in Python objects, the workers map the cache file that was written
+            scenario = scenarioCache.CompiledScenario(self.filename, self.cacheFile)
+            if not scenario.fromCache:
+                raise OSError("the compiled cache of %s cannot be written - choose another cache file" % self.filename)
+        self.scenario = scenario
+        for i in range(self.numWorkers):
+            self.links.append(self.spawn())
+
+    def workerEngine(self):
+        '''Dialogue engine of a forked worker, on its own frames and tree nodes read from the shared map'''
+        engine = dialogueEngine.DialogueEngine(self.scenario.remap())
+        if self.cacheSize > 0:
+            engine.cache = deliberationCache.DeliberationCache(self.cacheSize)
+        return engine
+
+    def spawn(self):
+        '''Fork a worker process
+        :return: WorkerLink connected to the worker (not yet to the event loop, see WorkerLink.connect)
+        '''
+        parentSock, workerSock = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                signal.signal(signal.SIGINT, signal.SIG_IGN) #the parent stops the workers by closing their sockets
+                #keep only the standard streams and the worker's socket - the sockets of the other workers, the listening socket
+                #and the client connections inherited from the router must be closed when the router closes them
+                fd = workerSock.fileno()
+                os.closerange(3, fd)
+                os.closerange(fd + 1, os.sysconf("SC_OPEN_MAX"))
+                DialogueWorker(self.workerEngine(), self.maxSessions, metrics.Metrics() if self.recordMetrics else None).serve(workerSock)
+            except BaseException:
+                status = 1
+            finally:
+                os._exit(status)
+        workerSock.close()
+        return WorkerLink(pid, parentSock)
+
+    async def respawn(self, i):
+        '''Replace the stopped worker of shard i with a new worker - the sessions of the shard are lost
+        :return: link of the new worker (requests that find the worker stopped at the same time wait for the same replacement)
+        '''
+        link = self.links[i]
+        if link.replacement is None:
+            link.replacement = asyncio.get_running_loop().create_task(self.replace(i, link))
+        return await asyncio.shield(link.replacement)
+
+    async def replace(self, i, link):
+        '''Reap a stopped worker and fork the worker that replaces it'''
+        try:
+            os.kill(link.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        try:
+            os.waitpid(link.pid, 0)
+        except ChildProcessError:
+            pass
+        if link.writer is not None:
+            link.writer.close()
+        newLink = self.spawn()
+        newLink.restarts = link.restarts + 1
+        await newLink.connect()
+        self.links[i] = newLink
+        return newLink
+
+    async def handleClient(self, reader, writer):
+        '''Route the requests of a client connection'''
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    method, target, version = line.decode("latin-1").split()
+                    length = 0
+                    close = version == "HTTP/1.0"
+                    while True:
+                        header = await reader.readline()
+                        if header in (b"\r\n", b"\n", b""):
+                            break
+                        name, _, value = header.partition(b":")
+                        name = name.strip().lower()
+                        if name == b"content-length":
+                            length = int(value)
+                        elif name == b"connection":
+                            close = value.strip().lower() == b"close"
+                    body = await reader.readexactly(length) if length > 0 else b""
+                except (ValueError, asyncio.IncompleteReadError):
+                    writer.write(response(400, {"error": "malformed request"}, close = True))
+                    break
+                writer.write(await self.route(method, target, body))
+                if close:
+                    break
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, target, body):
+        '''Raw response to a request - forwarded to the worker of its session'''
+        sessionId = sessionOf(target)
+        if sessionId is None:
+            path = urllib.parse.urlsplit(target).path
+            if method == "GET" and path == "/stats":
+                return response(200, self.stats())
+            if method == "GET" and path == "/metrics" and self.recordMetrics:
+                return response(200, (await self.collectMetrics()).exposition(), contentType = "text/plain; version=0.0.4; charset=utf-8")
+            return response(404, {"error": "unknown target %s" % target})
+        i = shard(sessionId, len(self.links))
+        link = self.links[i]
+        if not link.alive:
+            link = await self.respawn(i)
+        if len(link.pending) >= self.maxInFlight:
+            link.rejected += 1
+            return response(503, {"error": "worker busy, retry later"})
+        return await link.forward(method, target, body)
+
+    async def collectMetrics(self):
+        '''Metrics of the turns of every running worker, added up, with the load phases of the scenario'''
+        total = metrics.Metrics()
+        total.recordLoad(self.scenario)
+        links = [link for link in self.links if link.alive]
+        for raw in await asyncio.gather(*[link.forward("GET", "/metrics", b"") for link in links]):
+            head, _, body = raw.partition(b"\r\n\r\n")
+            if head.startswith(b"HTTP/1.1 200"):
+                total.merge(json.loads(body))
+        return total
+
+    def stats(self):
+        '''Requests and memory of each worker'''
+        workers = []
+        for link in self.links:
+            worker = {"pid": link.pid, "alive": link.alive, "inFlight": len(link.pending), "forwarded": link.forwarded, "rejected": link.rejected,
+                      "restarts": link.restarts}
+            worker.update(memoryKb(link.pid))
+            workers.append(worker)
+        return {"scenario": self.filename, "workers": workers}
+
+    async def serve(self, host = "127.0.0.1", port = 8080, ready = None):
+        '''Route client connections until the server is stopped
+        :param ready: function called with the listening address once the server accepts connections
+        '''
+        for link in self.links:
+            await link.connect()
+        self.server = await asyncio.start_server(self.handleClient, host, port)
+        if ready is not None:
+            ready(self.server.sockets[0].getsockname())
+        async with self.server:
+            await self.server.serve_forever()
+
+    def stop(self):
+        '''Close the workers' sockets and wait for them to exit'''
+        for link in self.links:
+            link.sock.close()
+        for link in self.links:
+            try:
+                os.waitpid(link.pid, 0)
+            except ChildProcessError:
+                pass
+        self.links = []
+
+def playDialogues(host, port, sessionIds, maxTurns, timeoutRate, seed):
+    '''Play random dialogues through the server over one connection (one process of the load test)
+    :return: list with the latency of each request in nanoseconds, and the number of turns, refused requests and errors
+    '''
+    rand = random.Random(seed)
+    conn = http.client.HTTPConnection(host, port)
+    latencies = []
+    counts = {"turns": 0, "rejected": 0, "errors": 0}
+    def request(method, target):
+        while True:
+            start = time.perf_counter_ns()
+            conn.request(method, target)
+            reply = conn.getresponse()
+            payload = json.loads(reply.read())
+            latencies.append(time.perf_counter_ns() - start)
+            if reply.status != 503:
+                break
+            counts["rejected"] += 1
+            time.sleep(0.001)
+        if reply.status >= 400:
+            counts["errors"] += 1
+            return None
+        return payload
+    for sessionId in sessionIds:
+        path = "/sessions/" + urllib.parse.quote(sessionId, safe = "")
+        state = request("POST", path + "?seed=%d" % rand.getrandbits(63))
+        timeout = state is not None and state["timeout"] > 0
+        timeoutActive = False
+        for t in range(maxTurns):
+            if state is None or len(state["options"]) == 0:
+                break
+            if timeout and not timeoutActive and t > 0 and rand.random() < timeoutRate:
+                state = request("POST", path + "/timeout")
+                timeoutActive = True
+            else:
+                option = rand.choice(state["options"])["id"]
+                state = request("POST", path + "/respond?option=" + urllib.parse.quote(option, safe = ""))
+                timeoutActive = False
+            counts["turns"] += 1
+        request("DELETE", path)
+    conn.close()
+    return latencies, counts
+
+def loadTest(host, port, numSessions = 2000, concurrency = 4, maxTurns = 50, timeoutRate = 0.05, seed = 0):
+    '''Play random dialogues from several client processes at the same time
+    :param concurrency: number of client processes, each with one connection
+    :return: dictionary with the requests and turns per second, the latency percentiles (microseconds), refused requests and errors
+    '''
+    sessionIds = ["load-%d-%d" % (seed, i) for i in range(numSessions)]
+    jobs = [(host, port, sessionIds[c::concurrency], maxTurns, timeoutRate, seed * 1000003 + c) for c in range(concurrency)]
+    start = time.perf_counter()
+    with multiprocessing.Pool(concurrency) as pool:
+        results = pool.starmap(playDialogues, jobs)
+    elapsed = time.perf_counter() - start
+    latencies = [l for result in results for l in result[0]]
+    totals = {name: sum(result[1][name] for result in results) for name in ("turns", "rejected", "errors")}
+    return {
+        "sessions": numSessions,
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "requestsPerSecond": len(latencies) / elapsed,
+        "turnsPerSecond": totals["turns"] / elapsed,
+        "latencyUs": metrics.percentiles(latencies),
+        "rejected": totals["rejected"],
+        "errors": totals["errors"],
+    }
+
+def runServer(filename, numWorkers, cacheSize, conn):
+    '''Serve a scenario on a free port and send the port to conn (process of the scaling test)'''
+    server = DialogueServer(filename, numWorkers, cacheSize = cacheSize)
+    server.start()
+    try:
+        asyncio.run(server.serve("127.0.0.1", 0, lambda address: conn.send(address[1])))
+    finally:
+        server.stop()
+
+def scalingTest(filename, workerCounts, numSessions = 2000, concurrency = 8, maxTurns = 50, timeoutRate = 0.05, seed = 0, cacheSize = 4096):
+    '''Load test a server of the scenario with each number of workers, to check if the throughput grows with the workers
+    The router is one process that parses every request: once its CPU time reaches the duration of the test, more workers do not
+    serve more requests
+    :param workerCounts: list with the numbers of workers to test
+    :return: list with the load test result of each number of workers, with the router's CPU use (fraction of one CPU) and the
+    memory of the workers (stats)
+    '''
+    context = multiprocessing.get_context("fork")
+    results = []
+    for numWorkers in workerCounts:
+        parentConn, childConn = context.Pipe()
+        router = context.Process(target = runServer, args = (filename, numWorkers, cacheSize, childConn))
+        router.start()
+        try:
+            port = parentConn.recv()
+            cpuBefore = cpuSeconds(router.pid)
+            result = loadTest("127.0.0.1", port, numSessions, concurrency, maxTurns, timeoutRate, seed)
+            cpuAfter = cpuSeconds(router.pid)
+            result["workers"] = numWorkers
+            result["routerCpu"] = (cpuAfter - cpuBefore) / result["seconds"] if cpuBefore is not None else None
+            conn = http.client.HTTPConnection("127.0.0.1", port)
+            conn.request("GET", "/stats")
+            result["stats"] = json.loads(conn.getresponse().read())["workers"]
+            conn.close()
+        finally:
+            router.terminate()
+            router.join()
+        results.append(result)
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Local dialogue server with the sessions sharded between worker processes, and its load test")
+    commands = parser.add_subparsers(dest = "command", required = True)
+    p = commands.add_parser("serve", help = "serve a scenario over HTTP")
+    p.add_argument("scenario")
+    p.add_argument("-w", "--workers", type = int, default = None, help = "number of worker processes (one per CPU by default)")
+    p.add_argument("--host", default = "127.0.0.1")
+    p.add_argument("-p", "--port", type = int, default = 8080)
+    p.add_argument("--max-in-flight", type = int, default = 64, help = "requests waiting for a worker before new ones are refused with 503")
+    p.add_argument("--max-sessions", type = int, default = 100000, help = "open sessions of each worker")
+    p.add_argument("--cache-size", type = int, default = 4096, help = "deliberation results cached by each worker (0 to disable)")
+    p.add_argument("--no-metrics", action = "store_true", help = "do not record the metrics of the turns served at /metrics")
+    p.add_argument("--cache-file", help = "compiled cache file of the scenario (next to the scenario file by default)")
+    p = commands.add_parser("load", help = "play random dialogues against a running server")
+    p.add_argument("--host", default = "127.0.0.1")
+    p.add_argument("-p", "--port", type = int, default = 8080)
+    p.add_argument("-n", "--sessions", type = int, default = 2000)
+    p.add_argument("-c", "--concurrency", type = int, default = 4, help = "number of client processes")
+    p.add_argument("--max-turns", type = int, default = 50)
+    p.add_argument("--timeout-rate", type = float, default = 0.05)
+    p.add_argument("--seed", type = int, default = 0)
+    p = commands.add_parser("scale", help = "load test a server of a scenario with an increasing number of workers")
+    p.add_argument("scenario")
+    p.add_argument("-w", "--workers", type = int, nargs = "+", default = [1, 2, 4], help = "numbers of workers to test")
+    p.add_argument("-n", "--sessions", type = int, default = 2000)
+    p.add_argument("-c", "--concurrency", type = int, default = 8, help = "number of client processes")
+    p.add_argument("--max-turns", type = int, default = 50)
+    p.add_argument("--cache-size", type = int, default = 4096, help = "deliberation results cached by each worker (0 to disable)")
+    args = parser.parse_args()
+    if args.command == "scale":
+        for result in scalingTest(args.scenario, args.workers, args.sessions, args.concurrency, args.max_turns, cacheSize = args.cache_size):
+            pss = [w["pssKb"] for w in result["stats"] if "pssKb" in w]
+            print("%2d workers: %6.0f requests/s, %6.0f turns/s, p50 %5.0fus, p99 %6.0fus, router CPU %s, worker PSS %s, errors %d" % (
+                result["workers"], result["requestsPerSecond"], result["turnsPerSecond"], result["latencyUs"]["p50"], result["latencyUs"]["p99"],
+                "%.0f%%" % (result["routerCpu"] * 100) if result["routerCpu"] is not None else "n/a",
+                "%.1f MB" % (sum(pss) / len(pss) / 1024.0) if pss else "n/a", result["errors"]))
+    elif args.command == "serve":
+        server = DialogueServer(args.scenario, args.workers, args.max_in_flight, args.max_sessions, args.cache_size, not args.no_metrics, args.cache_file)
+        server.start()
+        try:
+            asyncio.run(server.serve(args.host, args.port, lambda address: print("serving %s on %s:%d with %d workers" % ((args.scenario,) + address[:2] + (server.numWorkers,)), flush = True)))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
+    else:
+        result = loadTest(args.host, args.port, args.sessions, args.concurrency, args.max_turns, args.timeout_rate, args.seed)
+        latency = result["latencyUs"]
+        print("%d sessions, %d requests in %.2fs: %.0f requests/s, %.0f turns/s" % (result["sessions"], result["requests"], result["seconds"],
+                                                                               result["requestsPerSecond"], result["turnsPerSecond"]))
+        if latency:
+            print("latency p50 %.0fus p90 %.0fus p99 %.0fus max %.0fus" % (latency["p50"], latency["p90"], latency["p99"], latency["max"]))
+        print("refused (503): %d, errors: %d" % (result["rejected"], result["errors"]))
+        sys.exit(0 if result["errors"] == 0 else 1)
@@ -1,16 +1,48 @@
 class Frame:
-    def __init__(self, passageId, nextPassageId, tags, nextFrames = {}, cognitiveResources = [], startFrame = True):
+    __slots__ = ('passageId', 'nextPassageId', 'tags', 'tagSetId', 'nextFrames', 'cognitiveResources', 'startFrame', 'index', 'roleResources')
+
+    def __init__(self, passageId, nextPassageId, tags, tagTable, nextFrames = None, cognitiveResources = (), startFrame = True):
         '''Initialize frame
         :param passageId: frame identifier (aux)
         :param nextPassageId: list containing the identifiers of the frames that follow the current frame (aux)
-        :param tags: list with the context and knowledge base tags of the frame
+        :param tags: list with the context and knowledge base tags of the frame (stored as a tuple of interned tags)
+        :param tagTable: tag table of the scenario (see tagTable)
         :param nextFrames: dictionary with the frame objects that follow the current frame and their respective frequency
         :param cognitive resources: list with the cognitive resources objects that are head nodes of a dialogue tree and that belong to the frame
         :param startFrame: bool that indicates if the frame is the initial frame of a practice - used only for starting the conversation if context is empty
+        :var tagSetId: id of the set of tags in the scenario's tag table - frames with the same tags have the same id
+        :var index: position of the frame in the scenario's list of frames
+        :var roleResources: dictionary with the head resources that each role can say (see buildRoleTables)
         '''
-        self.tags = tags
-        self.nextFrames = nextFrames
-        self.cognitiveResources = cognitiveResources
+        self.setTags(tags, tagTable)
+        self.nextFrames = nextFrames if nextFrames is not None else {}
+        self.cognitiveResources = tuple(cognitiveResources)
         self.passageId = passageId
         self.nextPassageId = nextPassageId
-        self.startFrame = startFrame
\ No newline at end of file
+        self.startFrame = startFrame
+        self.index = -1
+        self.roleResources = {}
+
+    def setTags(self, tags, tagTable):
+        '''Set the tags of the frame and the id of their set'''
+        self.tags, self.tagSetId = tagTable.intern(tags)
+
+
+    def buildRoleTables(self, roles):
+        '''Precompute the head resources that each role can say - resources without role can be said by any role
+        :param roles: roles of the scenario (user role, agent role and "" for role-less lookups)
+        '''
+        self.roleResources = {}
+        for role in roles:
+            self.roleResources[role] = tuple(cr for cr in self.cognitiveResources if cr.role == role or cr.role == "")
+
+    def headResources(self, role):
+        '''Head resources of the frame that can be said by a specific role'''
+        resources = self.roleResources.get(role)
+        if resources is None: #role not given in the scenario
+            resources = tuple(cr for cr in self.cognitiveResources if cr.role == role or cr.role == "")
+        return resources
+
+    def canStart(self, role):
+        '''Check if the frame has head resources that can be said by a specific role'''
+        return len(self.headResources(role)) > 0
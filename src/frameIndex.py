@@ -0,0 +1,90 @@
+import array
+import bisect
+import sys
+
+class FrameIndex:
+    '''Inverted index of the frames of a scenario by tag, used to find the frame that matches the current context'''
+    def __init__(self, frames):
+        '''Initialize frame index
+        :param frames: list with the frame objects of the scenario
+        :var postings: dictionary with the positions of the frames that have each tag - a bitset (bit i is set if frame i has the tag) for
+        common tags, and a sorted array of positions for rare tags, which would otherwise take as many bits as the position of their last frame
+        :var cache: dictionary with the frame already resolved for each context
+        :var tagFrames: dictionary with the frames that have each tag, listed when first needed
+        '''
+        self.frames = list(frames)
+        positions = {}
+        for i, f in enumerate(self.frames):
+            for t in set(f.tags):
+                positions.setdefault(t, []).append(i)
+        self.postings = {}
+        for t, ps in positions.items():
+            if len(ps) * 32 < ps[-1]: #4 bytes per position instead of one bit per frame up to the last one
+                self.postings[t] = array.array("I", ps)
+            else:
+                bits = bytearray((ps[-1] >> 3) + 1)
+                for i in ps:
+                    bits[i >> 3] |= 1 << (i & 7)
+                self.postings[t] = int.from_bytes(bits, "little")
+        self.cache = {}
+        self.tagFrames = {}
+
+    def framesWithTag(self, tag):
+        '''Tuple with the frames that have a tag'''
+        frames = self.tagFrames.get(tag)
+        if frames is None:
+            frames = []
+            positions = self.postings.get(tag, 0)
+            if isinstance(positions, int):
+                while positions:
+                    low = positions & -positions
+                    frames.append(self.frames[low.bit_length() - 1])
+                    positions ^= low
+            else:
+                frames = [self.frames[i] for i in positions]
+            frames = self.tagFrames[tag] = tuple(frames)
+        return frames
+
+    def currentFrame(self, currCtx):
+        '''Obtain the frame that has every tag of the context - the last matching frame of the scenario wins, as in a scan of the frames
+        :param currCtx: list with the context tags
+        '''
+        if len(currCtx) == 0:
+            return None
+        key = tuple(currCtx)
+        try:
+            return self.cache[key]
+        except KeyError:
+            pass
+        currentFrame = self.cache[key] = self.lastMatch(key)
+        return currentFrame
+
+    def lastMatch(self, ctx):
+        '''Last frame that has every tag of a context - the bitsets are intersected, then the positions of the rarest tag are checked from the end'''
+        matches = -1
+        arrays = []
+        for c in ctx:
+            positions = self.postings.get(c, 0)
+            if isinstance(positions, int):
+                matches &= positions
+                if matches == 0:
+                    return None
+            else:
+                arrays.append(positions)
+        if not arrays:
+            return self.frames[matches.bit_length() - 1]
+        arrays.sort(key = len)
+        others = arrays[1:]
+        for i in reversed(arrays[0]):
+            if matches >> i & 1 and all(hasPosition(positions, i) for positions in others):
+                return self.frames[i]
+        return None
+
+    def postingsBytes(self):
+        '''Memory used by the postings, in bytes'''
+        return sum(sys.getsizeof(positions) for positions in self.postings.values())
+
+def hasPosition(positions, i):
+    '''Check if a sorted array of positions has position i'''
+    j = bisect.bisect_left(positions, i)
+    return j < len(positions) and positions[j] == i
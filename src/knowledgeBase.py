@@ -0,0 +1,81 @@
+import collections
+
+class KnowledgeBase:
+    '''Knowledge acquired during a conversation - a set of tags, optionally bounded, with the number of its tags in each frame
+    When the capacity is reached the least recently added tag is evicted (adding a known tag again makes it the most recent)
+    '''
+    def __init__(self, scenario, capacity = None):
+        '''Initialize knowledge base
+        :param scenario: loaded scenario - its frame index gives the frames that have each tag
+        :param capacity: maximum number of tags (None for no limit)
+        :var tags: ordered dictionary with the tags, from the least to the most recently added
+        :var matches: dictionary with the number of tags of the knowledge base that each frame has - frames without any are not in it
+        :var version: version of the scenario when the match counts were computed (they are computed again after a reload)
+        :var frameTags: frozenset with the tags that some frame has (None until key is called after a change)
+        '''
+        self.scenario = scenario
+        self.capacity = capacity
+        self.tags = collections.OrderedDict()
+        self.matches = {}
+        self.version = scenario.version
+        self.frameTags = None
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __iter__(self):
+        return iter(self.tags)
+
+    def __contains__(self, tag):
+        return tag in self.tags
+
+    def __repr__(self):
+        return "KnowledgeBase(%r)" % list(self.tags)
+
+    def add(self, tag):
+        '''Add a tag, evicting the least recently added tag if the capacity is exceeded'''
+        if tag in self.tags:
+            self.tags.move_to_end(tag)
+            return
+        self.tags[tag] = None
+        self.frameTags = None
+        self.count(tag, 1)
+        if self.capacity is not None and len(self.tags) > self.capacity:
+            evicted, unused = self.tags.popitem(last = False)
+            self.count(evicted, -1)
+
+    def discard(self, tag):
+        '''Remove a tag, if the knowledge base has it'''
+        if tag in self.tags:
+            del self.tags[tag]
+            self.frameTags = None
+            self.count(tag, -1)
+
+    def count(self, tag, sign):
+        '''Update the match counts of the frames that have a tag'''
+        matches = self.matches
+        for f in self.scenario.frameIndex.framesWithTag(tag):
+            n = matches.get(f, 0) + sign
+            if n:
+                matches[f] = n
+            else:
+                del matches[f]
+
+    def frameMatches(self):
+        '''Dictionary with the number of knowledge base tags of each frame (see matches)'''
+        if self.version != self.scenario.version:
+            #the frames of the scenario may have been replaced by a reload
+            self.version = self.scenario.version
+            self.matches = {}
+            self.frameTags = None
+            for tag in self.tags:
+                self.count(tag, 1)
+        return self.matches
+
+    def key(self):
+        '''Frozenset with the tags that some frame has - knowledge bases with the same key give the same frame matches'''
+        if self.frameTags is None or self.version != self.scenario.version:
+            self.frameMatches()
+            postings = self.scenario.frameIndex.postings
+            self.frameTags = frozenset(tag for tag in self.tags if tag in postings)
+        return self.frameTags
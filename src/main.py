@@ -1,10 +1,23 @@
-import readFile
+import scenarioCache
 import deliberationMechanism
 import timeoutError
+import scenarioWatcher
+import transcriptModel
 import sys
-import math
-from PyQt5.QtWidgets import QWidget, QPushButton, QFileDialog, QGridLayout, QApplication, QScrollArea, QVBoxLayout, QLabel,  QLineEdit
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QWidget, QPushButton, QFileDialog, QGridLayout, QApplication, QListView, QVBoxLayout, QLabel,  QLineEdit
+from PyQt5.QtCore import Qt, QTimer
+
+#number of user option buttons per row
+OPTION_COLUMNS = 4
+#style of the whole interface - set once on the main widget, widgets are selected by type and object name
+STYLE_SHEET = '''
+QLabel#scenarioLabel { height: 30px; font-size: 13px; color:#666666; }
+QLineEdit { background-color:#ffffff; border-radius:0px; border:1px solid #dcdcdc; color:#666666; height: 30px; font-size: 13px; }
+QPushButton#upload { background-color:#dddddd; border-radius:15px; border:1px solid #dcdcdc; color:#666666; height: 30px; font-size: 13px; }
+QPushButton#start { background-color:#608041; color: #ffffff; border-radius:15px; border:1px solid #dcdcdc; height: 30px; font-size: 13px; }
+QPushButton#option { background-color:#ffffff; border-radius:15px; border:1px solid #dcdcdc; color:#666666; height: 30px; font-size: 13px; padding: 4px; }
+QListView#transcript { border: 1px solid #dcdcdc; border-radius: 15px; font-size: 13px; }
+'''
 
 
 class App():
@@ -26,10 +39,7 @@ class App():
         '''Print user input
         :param sentence: sentence associated with user input node
         '''
-        label = QLabel(sentence + " <<<")
-        label.setAlignment(Qt.AlignRight)
-        self.scrollLayout.addWidget(label)
-        label.setStyleSheet("border: none")
+        self.transcript.append(transcriptModel.USER, sentence)
     
     def printAgentResponse(self, userNode):
         '''Print agent response
@@ -37,9 +47,7 @@ class App():
         '''
         #Call agent's deliberation mechanism
         response = self.deliberation.respondAgentOutput(userNode)
-        label = QLabel(">>> " + response)
-        label.setStyleSheet("border: none")
-        self.scrollLayout.addWidget(label)
+        self.transcript.append(transcriptModel.AGENT, response)
         
         #Update user options according to user response
         self.updateUserOptions()
@@ -47,27 +55,29 @@ class App():
                       
     def updateUserOptions(self):
         '''Update user options according to the current context of the conversation'''
-        #Clear grid of user options
-        for i in reversed(range(self.grid.count())): 
-            self.grid.itemAt(i).widget().setParent(None)
         #Call deliberation mechanism to obtain appropriate user options
-        inputs = self.deliberation.listUserOptions()
-        
-        #Position and show user options buttons
-        positions = [(i, j) for i in range(math.ceil(len(inputs)/4)) for j in range(4)]   
-        for position, userIn in zip(positions, inputs):
-            #Create button with sentence
-            button = QPushButton(userIn.sentence)
-            #style
-            button.setStyleSheet("background-color:#ffffff; border-radius:15px; border:1px solid #dcdcdc;color:#666666; height: 30px; font-size: 13px; padding: 4px")
+        self.userOptions = self.deliberation.listUserOptions()
+        #Buttons are created only when there are more options than ever before, and reused on the next turns
+        while len(self.optionButtons) < len(self.userOptions):
+            i = len(self.optionButtons)
+            button = QPushButton()
+            button.setObjectName("option")
             #position
-            self.grid.addWidget(button, *position)
-            #function - When clicked the user input is printed and sent to the agent
-            button.clicked.connect(lambda checked, i = userIn: self.sendUserInput(i))
+            self.grid.addWidget(button, i // OPTION_COLUMNS, i % OPTION_COLUMNS)
+            #function - When clicked the user input of its position is printed and sent to the agent
+            button.clicked.connect(lambda checked, i = i: self.sendUserInput(self.userOptions[i]))
+            self.optionButtons.append(button)
+        #Show the buttons of the options with their sentences and hide the rest
+        for i, button in enumerate(self.optionButtons):
+            if i < len(self.userOptions):
+                button.setText(self.userOptions[i].sentence)
+                button.show()
+            else:
+                button.hide()
         
     def openScenarioFile(self):
-        '''Select scenario JSON file which will be read by the system'''
-        fileName = QFileDialog.getOpenFileName(self.widget, 'Scenario JSON File', "", "JSON (*.json)")
+        '''Select scenario file (JSON, or a story published by Twine) which will be read by the system'''
+        fileName = QFileDialog.getOpenFileName(self.widget, 'Scenario File', "", "Scenarios (*.json *.html *.htm);;JSON (*.json);;Twine stories (*.html *.htm)")
         self.textScenarioFile.setText(fileName[0])
     
     def startSystem(self):
@@ -75,24 +85,32 @@ class App():
         file = self.textScenarioFile.text()
         if len(file) > 0:
             #Clear conversation history
-            self.clearLayout(self.scrollLayout)
-            #Read the input file       
-            self.inputFile = readFile.ReadFile(file)
+            self.transcript.clear()
+            #Read the input file - from its compiled cache if the file did not change since the last start       
+            self.inputFile = scenarioCache.CompiledScenario(file)
             #Initialize the timeout error event
             self.timeout = timeoutError.TimeoutErrorApp(self)
             #Initialize the deliberation mechanism
             self.deliberation = deliberationMechanism.DeliberationMechanism(self)
-
+            #Watch the scenario file - edits are applied to the running conversation
+            self.watchScenario()
             
             self.updateUserOptions()           
     
-    def clearLayout(self, layout):
-        '''Clear layout widget'''
-        while layout.count():
-            child = layout.takeAt(0)
-            if child.widget():
-                child.widget().deleteLater()
-        layout.addStretch(1)
+    def watchScenario(self):
+        '''Check the scenario file every second and apply its changes without restarting the conversation'''
+        self.watcher = scenarioWatcher.ScenarioWatcher(self.inputFile, interval = 0)
+        self.watcher.attach(self.deliberation.engine)
+        if getattr(self, "watchTimer", None) is None:
+            self.watchTimer = QTimer()
+            self.watchTimer.timeout.connect(self.reloadScenario)
+            self.watchTimer.start(1000)
+
+    def reloadScenario(self):
+        '''Apply the changes of the scenario file, if it changed'''
+        if self.watcher.poll():
+            self.timeout.timeoutCondition = self.inputFile.timeoutCondition
+            self.updateUserOptions()
 
                 
     def runApp(self):
@@ -102,6 +120,7 @@ class App():
         #Main widget for all interface elements    
         app = QApplication([])
         self.widget = QWidget()
+        self.widget.setStyleSheet(STYLE_SHEET)
         vBox = QVBoxLayout()
         self.widget.setLayout(vBox)
         self.widget.setWindowTitle('Chat')
@@ -116,9 +135,8 @@ class App():
         self.textScenarioFile = QLineEdit()
         self.uploadScenario = QPushButton('...')
         #styles and configurations
-        self.labelScenario.setStyleSheet("height: 30px; font-size: 13px; color:#666666;")
-        self.textScenarioFile.setStyleSheet("background-color:#ffffff; border-radius:0px; border:1px solid #dcdcdc;color:#666666; height: 30px; font-size: 13px;")
-        self.uploadScenario.setStyleSheet("background-color:#dddddd; border-radius:15px; border:1px solid #dcdcdc;color:#666666; height: 30px; font-size: 13px;")
+        self.labelScenario.setObjectName("scenarioLabel")
+        self.uploadScenario.setObjectName("upload")
         self.labelScenario.setFixedWidth(60)
         #positions
         buttons.addWidget(self.labelScenario, 0, 0, 1, 1)                             
@@ -130,43 +148,41 @@ class App():
         #1.2: Start
         self.startApp = QPushButton('Start')
         #style
-        self.startApp.setStyleSheet("background-color:#608041; color: #ffffff; border-radius:15px; border:1px solid #dcdcdc; height: 30px; font-size: 13px;")
+        self.startApp.setObjectName("start")
         #position
         buttons.addWidget(self.startApp, 1, 5, 1, 1)
         #function
         self.startApp.clicked.connect(self.startSystem)
         
-        #2. Widgets for Scrollable Conversation history
-        widgetScroll = QWidget()
-        vBoxScroll = QVBoxLayout()
-        widgetScroll.setLayout(vBoxScroll)        
-        scroll = QScrollArea(widgetScroll)
-        vBoxScroll.addWidget(scroll)
+        #2. Conversation history - a list view over the transcript model only draws the visible utterances
+        self.transcript = transcriptModel.TranscriptModel()
+        transcriptView = QListView()
+        transcriptView.setObjectName("transcript")
+        transcriptView.setModel(self.transcript)
         #style and configurations
-        scroll.setStyleSheet("border: 1px solid #dcdcdc; border-radius: 15px; font-size: 13px")
-        scroll.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
-        scroll.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        scroll.setWidgetResizable(True)
-        scroll.setMinimumHeight(300)
-        scroll.setMinimumWidth(800)
-        #change scroll of bar automatically - always at the bottom showing the most recent utterances
-        bar = scroll.verticalScrollBar()
-        bar.rangeChanged.connect(lambda x,y: bar.setValue(y))
-        #content
-        scrollContent = QWidget(scroll)       
-        self.scrollLayout = QVBoxLayout(scrollContent)
-        self.scrollLayout.addStretch(1)
-        scrollContent.setLayout(self.scrollLayout)      
-        scroll.setWidget(scrollContent)
+        transcriptView.setWordWrap(True)
+        transcriptView.setLayoutMode(QListView.Batched)
+        transcriptView.setBatchSize(100)
+        transcriptView.setSelectionMode(QListView.NoSelection)
+        transcriptView.setFocusPolicy(Qt.NoFocus)
+        transcriptView.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
+        transcriptView.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        transcriptView.setMinimumHeight(300)
+        transcriptView.setMinimumWidth(800)
+        #scroll automatically - always at the bottom showing the most recent utterances
+        self.transcript.rowsInserted.connect(lambda parent, first, last: transcriptView.scrollToBottom())
         
         #3. Widget for user input
         self.grid = QGridLayout()
         widgetGrid = QWidget()
         widgetGrid.setLayout(self.grid)
+        #pool of option buttons, reused on every turn
+        self.optionButtons = []
+        self.userOptions = []
                     
         #Add and show all widgets
         vBox.addWidget(widgetButtons)
-        vBox.addWidget(widgetScroll)
+        vBox.addWidget(transcriptView)
         vBox.addWidget(widgetGrid)
         self.widget.show()
     
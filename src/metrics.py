@@ -0,0 +1,250 @@
+import bisect
+import http.server
+import os
+import threading
+import time
+
+#upper bounds, in seconds, of the latency buckets - from 1 microsecond to 1 second
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 1e-2, 0.1, 1.0)
+#upper bounds of the knowledge base size buckets
+SIZE_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+#engine methods timed as stages of a turn
+STAGES = ("updateContext", "getPossibleNodes", "getCurrentFrame", "salienceFrames", "checkRoleFrames", "checkRoleResource",
+          "chooseSalientFrame", "chooseNode")
+
+def labelValue(value):
+    '''Escape a label value for the Prometheus text format'''
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def number(value):
+    '''Prometheus text of a number'''
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def percentiles(samples):
+    '''Percentiles, in microseconds, of latency samples in nanoseconds'''
+    if len(samples) == 0:
+        return {}
+    samples = sorted(samples)
+    last = len(samples) - 1
+    result = {"count": len(samples)}
+    for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+        result[name] = samples[int(round(q * last))] / 1000.0
+    result["max"] = samples[last] / 1000.0
+    return result
+
+class Histogram:
+    '''Counts of observed values by bucket, with their sum'''
+    def __init__(self, buckets):
+        '''Initialize histogram
+        :param buckets: ascending upper bounds of the buckets - values above the last bound are counted in the +Inf bucket
+        '''
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def add(self, counts, total, count):
+        '''Add the bucket counts, sum and count of a histogram with the same buckets'''
+        for i, c in enumerate(counts):
+            self.counts[i] += c
+        self.sum += total
+        self.count += count
+
+    def lines(self, name, labels):
+        '''Prometheus text lines of the histogram (cumulative buckets)'''
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            lines.append('%s_bucket{%sle="%s"} %d' % (name, labels, number(bound), cumulative))
+        labels = "{" + labels.rstrip(",") + "}" if labels else ""
+        lines.append("%s_sum%s %s" % (name, labels, number(self.sum)))
+        lines.append("%s_count%s %d" % (name, labels, self.count))
+        return lines
+
+class Metrics:
+    '''Latency histograms of the stages of the deliberation loop, dialogue counters and scenario load phases, exported as Prometheus text
+    An engine is only slowed down while it is instrumented: the timed stages replace the engine's methods on the instance
+    '''
+    def __init__(self):
+        '''Initialize metrics
+        :var stages: dictionary with the latency histogram of each stage (and "respondNode" for the whole turn)
+        :var frameSwitches: dictionary with the number of times each frame (by its tags) was switched to for the agent's response
+        :var switches: total number of frame switches - the agent's response is in another frame than the current frame
+        :var frameChoices: number of times a frame was chosen for the agent's response, whether it changed or not
+        :var turns, continuations, timeouts, repetitions: number of turns, of turns that continued a dialogue tree, of timeout errors activated and of sentences repeated after a timeout
+        :var knowledgeBaseSize: histogram of the size of the knowledge base after each turn
+        :var loadSeconds: dictionary with the duration of the load phases of the last recorded scenario
+        '''
+        self.stages = {}
+        self.frameSwitches = {}
+        self.switches = 0
+        self.frameChoices = 0
+        self.turns = 0
+        self.continuations = 0
+        self.timeouts = 0
+        self.repetitions = 0
+        self.knowledgeBaseSize = Histogram(SIZE_BUCKETS)
+        self.loadSeconds = {}
+        self.server = None
+
+    def instrument(self, engine):
+        '''Start recording the turns of a dialogue engine'''
+        for name in STAGES:
+            setattr(engine, name, self.timed(name, getattr(type(engine), name).__get__(engine)))
+        engine.chooseSalientFrame = self.countFrameSwitches(engine.chooseSalientFrame)
+        engine.repetitionSentence = self.countRepetitions(type(engine).repetitionSentence.__get__(engine))
+        engine.activateErrorContext = self.countTimeouts(type(engine).activateErrorContext.__get__(engine))
+        engine.respondNode = self.timeTurn(type(engine).respondNode.__get__(engine))
+
+    def uninstrument(self, engine):
+        '''Stop recording the turns of a dialogue engine - it runs without any overhead again'''
+        for name in STAGES + ("repetitionSentence", "activateErrorContext", "respondNode"):
+            engine.__dict__.pop(name, None)
+
+    def recordLoad(self, scenario):
+        '''Record the load phases of a scenario (ReadFile or CompiledScenario)'''
+        self.loadSeconds = dict(scenario.loadSeconds)
+
+    def stage(self, name):
+        '''Latency histogram of a stage'''
+        histogram = self.stages.get(name)
+        if histogram is None:
+            histogram = self.stages[name] = Histogram(LATENCY_BUCKETS)
+        return histogram
+
+    def timed(self, name, method):
+        '''Method that records its latency in the histogram of a stage'''
+        histogram = self.stage(name)
+        clock = time.perf_counter
+        def stage(*args):
+            start = clock()
+            result = method(*args)
+            histogram.observe(clock() - start)
+            return result
+        return stage
+
+    def countFrameSwitches(self, method):
+        '''chooseSalientFrame that counts the frame choices and the switches to another frame'''
+        def chooseSalientFrame(session, currFrame, salientFrames):
+            result = method(session, currFrame, salientFrames)
+            self.frameChoices += 1
+            #the chosen frame's tags are the new context - it is a switch if they are not the current frame's tags
+            if currFrame is None or tuple(session.currSocialCtx) != tuple(currFrame.tags):
+                key = "+".join(session.currSocialCtx)
+                self.frameSwitches[key] = self.frameSwitches.get(key, 0) + 1
+                self.switches += 1
+            return result
+        return chooseSalientFrame
+
+    def countRepetitions(self, method):
+        def repetitionSentence(session):
+            self.repetitions += 1
+            return method(session)
+        return repetitionSentence
+
+    def countTimeouts(self, method):
+        def activateErrorContext(session, error):
+            self.timeouts += 1
+            return method(session, error)
+        return activateErrorContext
+
+    def timeTurn(self, method):
+        '''respondNode that records the latency of the whole turn, whether it continued a dialogue tree and the knowledge base size'''
+        histogram = self.stage("respondNode")
+        clock = time.perf_counter
+        def respondNode(session, userInputNode):
+            changes = self.repetitions + self.timeouts + self.frameChoices
+            start = clock()
+            sentence = method(session, userInputNode)
+            histogram.observe(clock() - start)
+            self.turns += 1
+            if self.repetitions + self.timeouts + self.frameChoices == changes:
+                self.continuations += 1
+            self.knowledgeBaseSize.observe(len(session.knowledgeBase))
+            return sentence
+        return respondNode
+
+    def state(self):
+        '''Dictionary with the recorded values (JSON serializable) - the metrics of other processes are added with merge'''
+        return {"stages": {name: [h.counts, h.sum, h.count] for name, h in list(self.stages.items())},
+                "frameSwitches": dict(self.frameSwitches), "switches": self.switches, "frameChoices": self.frameChoices,
+                "turns": self.turns, "continuations": self.continuations, "timeouts": self.timeouts, "repetitions": self.repetitions,
+                "knowledgeBaseSize": [self.knowledgeBaseSize.counts, self.knowledgeBaseSize.sum, self.knowledgeBaseSize.count]}
+
+    def merge(self, state):
+        '''Add the values recorded by other metrics (see state), e.g. of the worker processes of a server'''
+        for name, (counts, total, count) in state["stages"].items():
+            self.stage(name).add(counts, total, count)
+        for key, value in state["frameSwitches"].items():
+            self.frameSwitches[key] = self.frameSwitches.get(key, 0) + value
+        for name in ("switches", "frameChoices", "turns", "continuations", "timeouts", "repetitions"):
+            setattr(self, name, getattr(self, name) + state[name])
+        self.knowledgeBaseSize.add(*state["knowledgeBaseSize"])
+
+    def exposition(self):
+        '''Metrics in the Prometheus text format'''
+        lines = ["# HELP dialogue_stage_seconds Latency of the stages of the agent's deliberation",
+                 "# TYPE dialogue_stage_seconds histogram"]
+        for name, histogram in list(self.stages.items()):
+            lines += histogram.lines("dialogue_stage_seconds", 'stage="%s",' % labelValue(name))
+        for name, help, value in (("dialogue_turns_total", "User turns answered by the agent", self.turns),
+                                  ("dialogue_tree_continuations_total", "Turns answered within the current dialogue tree", self.continuations),
+                                  ("dialogue_frame_choices_total", "Frames chosen for the agent's response, switched to or not", self.frameChoices),
+                                  ("dialogue_timeout_activations_total", "Timeout errors activated", self.timeouts),
+                                  ("dialogue_repetitions_total", "Sentences repeated after a timeout error", self.repetitions)):
+            lines += ["# HELP %s %s" % (name, help), "# TYPE %s counter" % name, "%s %d" % (name, value)]
+        lines += ["# HELP dialogue_frame_switches_total Frames switched to for the agent's response",
+                  "# TYPE dialogue_frame_switches_total counter"]
+        for key, value in sorted(list(self.frameSwitches.items()), key = lambda kv: -kv[1]):
+            lines.append('dialogue_frame_switches_total{frame="%s"} %d' % (labelValue(key), value))
+        lines += ["# HELP dialogue_knowledge_base_size Size of the knowledge base after each turn",
+                  "# TYPE dialogue_knowledge_base_size histogram"]
+        lines += self.knowledgeBaseSize.lines("dialogue_knowledge_base_size", "")
+        lines += ["# HELP scenario_load_phase_seconds Duration of the phases of the last scenario load",
+                  "# TYPE scenario_load_phase_seconds gauge"]
+        for phase, seconds in list(self.loadSeconds.items()):
+            lines.append('scenario_load_phase_seconds{phase="%s"} %s' % (labelValue(phase), number(seconds)))
+        return "\n".join(lines) + "\n"
+
+    def writeFile(self, filename):
+        '''Write the metrics to a file read by a scrape agent (e.g. the node exporter's textfile collector) - replaced atomically'''
+        tmpName = filename + ".tmp"
+        with open(tmpName, "w") as f:
+            f.write(self.exposition())
+        os.replace(tmpName, filename)
+
+    def serve(self, port = 9464, host = "127.0.0.1"):
+        '''Serve the metrics at http://host:port/metrics from a background thread'''
+        metrics = self
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.exposition().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target = self.server.serve_forever, daemon = True).start()
+        return self.server.server_address
+
+    def stop(self):
+        '''Stop serving the metrics'''
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
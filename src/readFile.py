@@ -1,41 +1,83 @@
+import gc
 import json
+import time
 import frame
+import frameIndex
+import tagTable
 import treeNode
+import twisonStream
 
 class ReadFile:
     '''Class to read scenario JSON file'''
-    def __init__(self, filename):
+    def __init__(self, filename, streaming = False):
         '''Initialize read file class
         :param filename: name of the scenario file
+        :param streaming: bool that indicates if passages are read one at a time instead of loading the whole file (lower peak memory for large scenarios)
         :var userRole: string with the social role of the user given in the scenario
         :var agentRole: string with the social role of the agent given in the scenario
         :var frames: list with the frame objects of the scenario
         :var treeNodes: list with the treeNode objects of the scenario
+        :var nodesByPid, framesByPid: dictionaries with the tree node and frame objects indexed by passage identifier
+        :var tagTable: ids of the tags and of the sets of tags of the scenario (see tagTable)
+        :var framesByTags: dictionary with the frame objects indexed by the id of their set of tags
+        :var frameIndex: index of the frames by tag, used to find the current frame
         :var timeoutCondition: maximum time to wait for user input in seconds given in the scenario
+        :var loadSeconds: dictionary with the duration in seconds of each load phase
+        :var version: number of times the scenario was changed since it was loaded (see scenarioWatcher)
         '''
         self.filename = filename
+        self.streaming = streaming
         self.userRole = ""
         self.agentRole = ""
         self.frames = []
         self.treeNodes = []
+        #Indexes used to link the scenario graph in a single pass
+        self.nodesByPid = {}
+        self.framesByPid = {}
+        self.tagTable = tagTable.TagTable()
+        self.framesByTags = {}
         
         #Unexpected event variables
         #timeout
         self.timeoutCondition = 0
+        self.loadSeconds = {}
+        self.version = 0
         
-        #JSON File to data objects  
-        self.readJsonFile()
-        self.completeResourcesData()
-        self.completeFramesData()
+        #JSON File to data objects - the cyclic garbage collector is paused while the graph is built, 
+        #otherwise its passes over the growing number of objects make loading superlinear
+        gcEnabled = gc.isenabled()
+        gc.disable()
+        try:
+            self.timePhase("readJsonFile", self.readJsonFile)
+            self.timePhase("completeResourcesData", self.completeResourcesData)
+            self.timePhase("completeFramesData", self.completeFramesData)
+            self.timePhase("completeDerivedData", self.completeDerivedData)
+        finally:
+            if gcEnabled:
+                gc.enable()
         
+    def timePhase(self, name, phase):
+        '''Run a load phase and record its duration'''
+        start = time.perf_counter()
+        phase()
+        self.loadSeconds[name] = time.perf_counter() - start
+
     def readJsonFile(self):
         '''Read the scenario file and loop through the passages to create the data objects'''
-        #Open JSON file
-        f = open(self.filename)
-        #Returns JSON object as a dictionary
-        data = json.load(f)
+        if self.filename.lower().endswith((".html", ".htm")):
+            #Story published by Twine - converted with the rules of Twison (imported here, twineHtml compiles scenarios with scenarioCache)
+            import twineHtml
+            passages = twineHtml.readStory(self.filename)['passages']
+        elif self.streaming:
+            #Passages are decoded one at a time and only the fields used below are kept
+            passages = twisonStream.TwisonStream(self.filename).passages()
+        else:
+            #Open JSON file and return JSON object as a dictionary
+            with open(self.filename) as f:
+                data = json.load(f)
+            passages = data['passages']
         #Loop through passages (Frames, roles and cognitive resources)
-        for passage in data['passages']:
+        for passage in passages:
             #passage properties
             name = passage.get('name')
             pid = passage.get('pid')
@@ -63,9 +105,11 @@ class ReadFile:
                             nextPid.append(l['pid'])
                     #append new tree node to list of tree nodes
                     if props is not None:
-                        self.treeNodes.append(treeNode.TreeNode(pid, nextPid, name, tags, props['addKnowledge'])) #resource has knowledge to add
+                        node = treeNode.TreeNode(pid, nextPid, name, tags, self.tagTable, props['addKnowledge']) #resource has knowledge to add
                     else:
-                        self.treeNodes.append(treeNode.TreeNode(pid, nextPid, name, tags))
+                        node = treeNode.TreeNode(pid, nextPid, name, tags, self.tagTable)
+                    self.treeNodes.append(node)
+                    self.nodesByPid[pid] = node
         
     def addFrameOrUpdateId(self, pid, nextPid, tags):
         '''Create frame object or update its ids
@@ -73,64 +117,84 @@ class ReadFile:
         :param nextPid: list with the identifiers of the frames that follow this frame
         :param tags: knowledge and context tags of frame
         '''
-        for f in self.frames:
-            if f.tags == tags: #frame object already created - frames can be the same but every different ids
-                f.passageId.append(pid) #append to its ids
-                if nextPid is not None:
-                    f.nextPassageId.append(nextPid) #append to the ids of the following frames
-                return
+        tagSetId = self.tagTable.setId(tags)
+        f = self.framesByTags.get(tagSetId)
+        if f is not None: #frame object already created - frames can be the same but every different ids
+            f.passageId.append(pid) #append to its ids
+            if nextPid is not None:
+                f.nextPassageId.append(nextPid) #append to the ids of the following frames
+            self.framesByPid[pid] = f
+            return
         #frame object was not yet created
         if nextPid is not None:
-            newFrame = frame.Frame([pid], [nextPid], tags)
+            newFrame = frame.Frame([pid], [nextPid], tags, self.tagTable)
         else:
-            newFrame = frame.Frame([pid], [], tags)
-        #Append new frame to list of frames    
+            newFrame = frame.Frame([pid], [], tags, self.tagTable)
+        #Append new frame to list of frames and index it
         self.frames.append(newFrame)
+        self.framesByTags[tagSetId] = newFrame
+        self.framesByPid[pid] = newFrame
     
     def completeResourcesData(self):
         '''Complete resources data (roles, next nodes, head node)'''
-        for n in self.treeNodes:
+        #position of each node in the file - next nodes keep the order in which they appear in the scenario
+        nodeOrder = {pid: i for i, pid in enumerate(self.nodesByPid)}
+        for i, n in enumerate(self.treeNodes):
+            n.index = i
             #roles
-            tags = n.tags
+            tags = list(n.tags)
             if self.userRole in tags: #extract user role from tags
                 n.role = self.userRole
                 tags.remove(self.userRole)
+                n.setTags(tags, self.tagTable)
             elif self.agentRole in tags: #extract agent role from tags
                 n.role = self.agentRole
                 tags.remove(self.agentRole)
-            #next nodes  
-            nextNodes = n.nextPassageId
-            n.nextNodes = []
-            for nn in self.treeNodes:
-                if nn.passageId in nextNodes:
-                    n.nextNodes.append(nn) #append node objects that follow current node to the nextNodes list of the current tree node
-                    nn.headNode = False #if next node is linked after current node it cannot be a head node
+                n.setTags(tags, self.tagTable)
+            #next nodes
+            nextPids = [pid for pid in set(n.nextPassageId) if pid in self.nodesByPid]
+            nextPids.sort(key = nodeOrder.get)
+            nextNodes = []
+            for pid in nextPids:
+                nn = self.nodesByPid[pid]
+                nextNodes.append(nn) #append node objects that follow current node to the nextNodes of the current tree node
+                nn.headNode = False #if next node is linked after current node it cannot be a head node
+            n.nextNodes = tuple(nextNodes)
                     
     def completeFramesData(self):
         '''Complete frames data (next frames and frequency, start frame, cognitive resources)'''
+        #position of each frame in the file - next frames keep the order in which they appear in the scenario
+        frameOrder = {f: i for i, f in enumerate(self.frames)}
         for f in self.frames:
-            #next frames
-            nextFrames = f.nextPassageId
+            f.index = frameOrder[f]
+            #Error start frame exception
+            if "timeout" in f.tags:
+                f.startFrame = False #even though timeout frame is not linked to any frame it should not be a start frame, this bool should be only true for frames starting a practice (e.g., greeting)
+            #next frames - a frame is counted once for each of its ids that is linked from the current frame
             nextFramesAux = []
-            for nf in self.frames:
-                passageIdAux = nf.passageId
-                tags = nf.tags
-                #Error start frame exception
-                if "timeout" in tags:
-                    nf.startFrame = False #even though timeout frame is not linked to any frame it should not be a start frame, this bool should be only true for frames starting a practice (e.g., greeting)
-                for pI in passageIdAux:
-                    if pI in nextFrames:
-                        nextFramesAux.append(nf) #append frame objects that follow current frame to aux list
-                        nf.startFrame = False 
+            for pid in set(f.nextPassageId):
+                nf = self.framesByPid.get(pid)
+                if nf is not None:
+                    nextFramesAux.append(nf) #append frame objects that follow current frame to aux list
+                    nf.startFrame = False
+            nextFramesAux.sort(key = frameOrder.get)
             f.nextFrames = self.countFrequency(nextFramesAux) #create dictionary with frequency of frames that follow current frame
-        #cognitive resources
+        #cognitive resources - head nodes grouped by tags, in file order
+        headNodes = {}
+        for n in self.treeNodes:
+            if n.headNode:
+                headNodes.setdefault(n.tagSetId, []).append(n)
         for f in self.frames:
-            f.cognitiveResources = []
-            for n in self.treeNodes:
-                if n.tags == f.tags and n.headNode: #obtain tree nodes that are associated with current frame and that are head nodes - the start of the dialogue trees will be useful for the deliberation mechanism
-                    f.cognitiveResources.append(n)   
+            f.cognitiveResources = tuple(headNodes.get(f.tagSetId, ())) #obtain tree nodes that are associated with current frame and that are head nodes - the start of the dialogue trees will be useful for the deliberation mechanism
     
         
+    def completeDerivedData(self):
+        '''Build the lookup tables derived from the linked graph, used by the deliberation mechanism on every turn'''
+        self.frameIndex = frameIndex.FrameIndex(self.frames)
+        #head resources of each frame that can be said by the user, by the agent and by role-less speakers
+        for f in self.frames:
+            f.buildRoleTables((self.userRole, self.agentRole, ""))
+
     def countFrequency(self, lst):
         '''Transform a list to a dictionary with objects and their frequency (number of times they appear on the list)
         :param lst: the list that will be transformed into a dictionary
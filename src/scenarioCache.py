@@ -0,0 +1,403 @@
+import array
+import collections.abc
+import gc
+import hashlib
+import mmap
+import os
+import struct
+import frame
+import frameIndex
+import readFile
+import tagTable
+import treeNode
+
+MAGIC = b"SAIC"
+FORMAT_VERSION = 2
+BYTE_ORDER_MARK = 0x01020304
+#magic, format version, byte order mark, content hash, size, modification time (ns) and inode of the source file, number of sections
+HEADER = struct.Struct("=4sII32sQqQI")
+#offset of the size, modification time and inode of the source file in the header
+SOURCE_STAT = struct.Struct("=QqQ")
+SOURCE_STAT_OFFSET = 44
+#offset and number of items of each section
+SECTION = struct.Struct("=QQ")
+SECTIONS = ["strOffsets", "strData", "meta",
+            "nodePid", "nodeSentence", "nodeRole", "nodeKnowledge", "nodeHead",
+            "nodeTagsPtr", "nodeTags", "nodeNextPidPtr", "nodeNextPid", "nodeNextPtr", "nodeNext",
+            "framePidPtr", "framePid", "frameNextPidPtr", "frameNextPid", "frameTagsPtr", "frameTags",
+            "frameStart", "frameNextPtr", "frameNext", "frameNextFreq", "frameResPtr", "frameRes"]
+
+def cachePath(filename):
+    '''Default compiled cache file of a scenario file'''
+    return filename + ".cache"
+
+def hashText(text):
+    '''Content hash (sha256) of a scenario file from its text'''
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+def hashFile(filename):
+    '''Content hash (sha256) of a scenario file'''
+    h = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.digest()
+
+class StaleCacheError(Exception):
+    '''The compiled cache does not match the scenario file (or this compiler version)'''
+
+class CompiledScenario(readFile.ReadFile):
+    '''Scenario read from a compiled cache file - same data as ReadFile, without parsing and linking the JSON file again
+    The cache file stays memory-mapped: the frames are created when it is loaded, the tree nodes and the cognitive resources of each frame
+    are created from its arrays the first time they are used, so a conversation only creates the nodes of the dialogue trees it goes through.
+    '''
+    def __init__(self, filename, cacheFile = None, streaming = False):
+        '''Load the compiled cache of the scenario file, compiling it first if it is missing or stale
+        :param filename: name of the scenario file
+        :param cacheFile: name of the compiled cache file (next to the scenario file by default)
+        :param streaming: bool that indicates if the scenario file is streamed when it has to be compiled (see ReadFile)
+        :var sourceHash: content hash of the scenario file - None after a hot reload until it is used (see turnTrace.scenarioHash)
+        :var sourceText: text of the scenario file read by a hot reload, hashed when the hash is used (None if it was not read as text)
+        :var fromCache: bool that indicates if the scenario was loaded from the cache instead of compiled
+        :var hashed: bool that indicates if the scenario file was hashed - it is not when its size, modification time and inode match the cache
+        '''
+        self.cacheFile = cacheFile if cacheFile is not None else cachePath(filename)
+        self.sourceStat = sourceStat(filename)
+        self.sourceHash = None
+        self.sourceText = None
+        self.hashed = False
+        self.streaming = streaming
+        self.loadSeconds = {}
+        self.version = 0
+        try:
+            self.readCache(filename)
+            self.fromCache = True
+        except (OSError, ValueError, struct.error, StaleCacheError):
+            if not self.hashed:
+                self.hashSource(filename)
+            readFile.ReadFile.__init__(self, filename, streaming)
+            self.fromCache = False
+            try:
+                self.timePhase("writeCache", self.writeCache)
+            except OSError: #read-only location - the scenario is still usable, it is just compiled again next time
+                pass
+
+    def hashSource(self, filename):
+        '''Hash the scenario file'''
+        self.sourceHash = hashFile(filename)
+        self.hashed = True
+
+    def writeCache(self):
+        '''Serialize the linked graph to the compiled cache file (written atomically, so concurrent readers never see a partial file)'''
+        strings = {None: 0} #index 0 is used for missing strings (e.g. broken links)
+        def s(value):
+            idx = strings.get(value)
+            if idx is None:
+                idx = strings[value] = len(strings)
+            return idx
+        nodeIdx = {n: i for i, n in enumerate(self.treeNodes)}
+        frameIdx = {f: i for i, f in enumerate(self.frames)}
+        data = {name: array.array("I") for name in SECTIONS}
+        def csr(name, values):
+            ptr = data[name + "Ptr"]
+            if len(ptr) == 0:
+                ptr.append(0)
+            data[name].extend(values)
+            ptr.append(len(data[name]))
+        data["meta"].extend([s(self.userRole), s(self.agentRole), self.timeoutCondition])
+        for n in self.treeNodes:
+            data["nodePid"].append(s(n.passageId))
+            data["nodeSentence"].append(s(n.sentence))
+            data["nodeRole"].append(s(n.role))
+            data["nodeKnowledge"].append(s(n.addKnowledge))
+            data["nodeHead"].append(int(n.headNode))
+            csr("nodeTags", [s(t) for t in n.tags])
+            csr("nodeNextPid", [s(p) for p in n.nextPassageId])
+            csr("nodeNext", [nodeIdx[nn] for nn in n.nextNodes])
+        for f in self.frames:
+            csr("framePid", [s(p) for p in f.passageId])
+            csr("frameNextPid", [s(p) for p in f.nextPassageId])
+            csr("frameTags", [s(t) for t in f.tags])
+            data["frameStart"].append(int(f.startFrame))
+            csr("frameNext", [frameIdx[nf] for nf in f.nextFrames])
+            data["frameNextFreq"].extend(f.nextFrames.values())
+            csr("frameRes", [nodeIdx[cr] for cr in f.cognitiveResources])
+        #empty ptr arrays still need their leading zero
+        for name in SECTIONS:
+            if name.endswith("Ptr") and len(data[name]) == 0:
+                data[name].append(0)
+        #string table - offsets are in bytes so each string is decoded from the mapped file when it is used
+        values = [str(v).encode("utf-8") for v in strings if v is not None]
+        offset = 0
+        data["strOffsets"].append(0)
+        for v in values:
+            offset += len(v)
+            data["strOffsets"].append(offset)
+        data["strData"] = array.array("B", b"".join(values))
+
+        #layout: header, section table, sections aligned to 8 bytes
+        pos = HEADER.size + SECTION.size * len(SECTIONS)
+        table = []
+        for name in SECTIONS:
+            pos = (pos + 7) & ~7
+            table.append((pos, len(data[name])))
+            pos += len(data[name]) * data[name].itemsize
+        tmp = "%s.%d.tmp" % (self.cacheFile, os.getpid())
+        with open(tmp, "wb") as out:
+            out.write(HEADER.pack(MAGIC, FORMAT_VERSION, BYTE_ORDER_MARK, self.sourceHash, *self.sourceStat, len(SECTIONS)))
+            for entry in table:
+                out.write(SECTION.pack(*entry))
+            for name, (offset, count) in zip(SECTIONS, table):
+                out.write(b"\0" * (offset - out.tell()))
+                out.write(data[name].tobytes())
+        os.replace(tmp, self.cacheFile)
+
+    def readCache(self, filename):
+        '''Memory-map the compiled cache file and create the frames from its arrays (the tree nodes are created when used, see LazyNodes)
+        :param filename: name of the scenario file
+        '''
+        with open(self.cacheFile, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+            cacheWritten = os.fstat(f.fileno()).st_mtime_ns
+        try:
+            magic, version, bom, sourceHash, size, mtime, inode, numSections = HEADER.unpack_from(mm, 0)
+            if magic != MAGIC or version != FORMAT_VERSION or bom != BYTE_ORDER_MARK or numSections != len(SECTIONS):
+                raise StaleCacheError("incompatible cache file " + self.cacheFile)
+            #the file is only hashed if its size, modification time or inode changed - or if it was modified in the same clock tick
+            #as the cache was written, when a later edit of the same size could keep the same modification time
+            if (size, mtime, inode) != self.sourceStat or mtime >= cacheWritten:
+                self.hashSource(filename)
+                if sourceHash != self.sourceHash:
+                    raise StaleCacheError("cache file " + self.cacheFile + " does not match " + filename)
+                self.updateSourceStat()
+            self.sourceHash = sourceHash
+            self.mapSections(filename, mm)
+        except BaseException:
+            mm.close()
+            raise
+
+    def mapSections(self, filename, mm):
+        '''Read the section table of a mapped cache file and create the frames from its arrays'''
+        view = memoryview(mm)
+        sections = {}
+        try:
+            for i, name in enumerate(SECTIONS):
+                offset, count = SECTION.unpack_from(mm, HEADER.size + i * SECTION.size)
+                size = count if name == "strData" else count * 4
+                if offset + size > len(mm):
+                    raise StaleCacheError("truncated cache file " + self.cacheFile)
+                sections[name] = view[offset:offset + size] if name == "strData" else view[offset:offset + size].cast("I")
+            gcEnabled = gc.isenabled()
+            gc.disable()
+            try:
+                self.timePhase("buildGraph", lambda: self.buildGraph(filename, mm, sections))
+                self.timePhase("completeDerivedData", self.completeCachedData)
+            finally:
+                if gcEnabled:
+                    gc.enable()
+        except BaseException:
+            for v in sections.values():
+                v.release()
+            view.release()
+            raise
+
+    def remap(self):
+        '''New scenario object built from the memory map of this one - used by forked processes: the mapped arrays are in memory once
+        for all of them (the map is shared and read-only), and each process only creates its own frames and the tree nodes it uses
+        (ValueError is raised if this scenario was compiled instead of loaded from its cache, see fromCache)
+        '''
+        if not isinstance(self.treeNodes, LazyNodes):
+            raise ValueError("%s was not loaded from its compiled cache" % self.filename)
+        sc = CompiledScenario.__new__(CompiledScenario)
+        sc.cacheFile = self.cacheFile
+        sc.sourceStat = self.sourceStat
+        sc.sourceHash = self.sourceHash
+        sc.sourceText = self.sourceText
+        sc.hashed = False
+        sc.streaming = self.streaming
+        sc.fromCache = True
+        sc.loadSeconds = {}
+        sc.version = 0
+        sc.mapSections(self.filename, self.treeNodes.mm)
+        return sc
+
+    def updateSourceStat(self):
+        '''Record the current size, modification time and inode of the scenario file in the cache, so it is not hashed again at the next load'''
+        try:
+            with open(self.cacheFile, "r+b") as f:
+                f.seek(SOURCE_STAT_OFFSET)
+                f.write(SOURCE_STAT.pack(*self.sourceStat))
+        except OSError: #read-only location - the file is hashed at every load
+            pass
+
+    def buildGraph(self, filename, mm, sec):
+        '''Create the frames from the cache sections - the tree nodes are read from the sections when used'''
+        meta = sec["meta"].tolist()
+        nodes = LazyNodes(mm, sec)
+        string = nodes.string
+        self.filename = filename
+        self.userRole = string(meta[0])
+        self.agentRole = string(meta[1])
+        self.timeoutCondition = meta[2]
+        self.tagTable = nodes.tagTable
+        nodes.roles = (self.userRole, self.agentRole, "")
+        self.treeNodes = nodes
+        self.nodesByPid = LazyNodesByPid(nodes)
+
+        #frames - each string is decoded once
+        decoded = {}
+        def s(v):
+            value = decoded.get(v, decoded)
+            if value is decoded:
+                value = decoded[v] = string(v)
+            return value
+        def rows(name, convert):
+            ptr = sec[name + "Ptr"].tolist()
+            values = [convert(v) for v in sec[name].tolist()]
+            return [values[a:b] for a, b in zip(ptr, ptr[1:])]
+        frameRows = zip(rows("framePid", s), rows("frameNextPid", s), rows("frameTags", s), sec["frameStart"].tolist())
+        self.frames = [CachedFrame(nodes, framePids, nextPids, frameTags, self.tagTable, start == 1)
+                       for framePids, nextPids, frameTags, start in frameRows]
+        self.framesByTags = {f.tagSetId: f for f in self.frames}
+        self.framesByPid = {pid: f for f in self.frames for pid in f.passageId}
+        freqs = iter(sec["frameNextFreq"].tolist())
+        for i, (f, nextFrames) in enumerate(zip(self.frames, rows("frameNext", self.frames.__getitem__))):
+            f.index = i
+            f.nextFrames = {nf: next(freqs) for nf in nextFrames}
+
+    def completeCachedData(self):
+        '''Build the frame index - the role tables of each frame are built with its cognitive resources (see CachedFrame)'''
+        self.frameIndex = frameIndex.FrameIndex(self.frames)
+
+def sourceStat(filename):
+    '''Size, modification time (ns) and inode of a scenario file'''
+    st = os.stat(filename)
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+class LazyNodes(collections.abc.Sequence):
+    '''Tree nodes of a compiled scenario, created from the mapped cache sections when first used - a node is always the same object
+    The sections stay mapped as long as the nodes are in use (the cache file can be replaced meanwhile, the mapping keeps its contents)
+    '''
+    def __init__(self, mm, sections):
+        '''Initialize lazy nodes
+        :param mm: memory map of the cache file
+        :param sections: dictionary with the memoryview of each section of the cache
+        :var nodes: list with the tree nodes created so far, indexed by position (None if not created)
+        :var tagTable: tag table of the scenario (see tagTable)
+        :var roles: roles of the scenario, used to build the role tables of the frames (see CachedFrame)
+        '''
+        self.mm = mm
+        self.sections = sections
+        self.offsets = sections["strOffsets"]
+        self.strData = sections["strData"]
+        self.nodes = [None] * len(sections["nodePid"])
+        self.tagTable = tagTable.TagTable()
+        self.roles = ("", "", "")
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.node(j) for j in range(*i.indices(len(self.nodes)))]
+        if i < 0:
+            i += len(self.nodes)
+        if not 0 <= i < len(self.nodes):
+            raise IndexError("tree node index out of range")
+        return self.node(i)
+
+    def __iter__(self):
+        for i in range(len(self.nodes)):
+            yield self.node(i)
+
+    def string(self, v):
+        '''String of the string table (None for index 0)'''
+        if v == 0:
+            return None
+        return str(self.strData[self.offsets[v - 1]:self.offsets[v]], "utf-8")
+
+    def strings(self, name, i):
+        '''List with the strings of row i of a CSR section'''
+        ptr = self.sections[name + "Ptr"]
+        return [self.string(v) for v in self.sections[name][ptr[i]:ptr[i + 1]]]
+
+    def node(self, i):
+        '''Tree node at position i, created if it was not used yet'''
+        n = self.nodes[i]
+        if n is None:
+            sec = self.sections
+            n = self.nodes[i] = CachedTreeNode(self, self.string(sec["nodePid"][i]), self.strings("nodeNextPid", i), self.string(sec["nodeSentence"][i]),
+                                               self.strings("nodeTags", i), self.tagTable, self.string(sec["nodeKnowledge"][i]),
+                                               self.string(sec["nodeRole"][i]), sec["nodeHead"][i] == 1)
+            n.index = i
+        return n
+
+    def nextNodes(self, i):
+        '''Tuple with the nodes that follow the node at position i'''
+        ptr = self.sections["nodeNextPtr"]
+        return tuple(self.node(j) for j in self.sections["nodeNext"][ptr[i]:ptr[i + 1]])
+
+    def frameResources(self, i):
+        '''Tuple with the cognitive resources of the frame at position i'''
+        ptr = self.sections["frameResPtr"]
+        return tuple(self.node(j) for j in self.sections["frameRes"][ptr[i]:ptr[i + 1]])
+
+class LazyNodesByPid(collections.abc.Mapping):
+    '''Tree nodes of a compiled scenario indexed by passage identifier - only the pids are decoded when it is first used'''
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.positions = None
+
+    def index(self):
+        '''Dictionary with the position of each pid'''
+        if self.positions is None:
+            string = self.nodes.string
+            self.positions = {string(v): i for i, v in enumerate(self.nodes.sections["nodePid"])}
+        return self.positions
+
+    def __getitem__(self, pid):
+        return self.nodes.node(self.index()[pid])
+
+    def __contains__(self, pid):
+        return pid in self.index()
+
+    def __iter__(self):
+        return iter(self.index())
+
+    def __len__(self):
+        return len(self.index())
+
+class CachedTreeNode(treeNode.TreeNode):
+    '''Tree node of a compiled scenario - its next nodes are created when first used'''
+    __slots__ = ('lazyNodes',)
+
+    def __init__(self, lazyNodes, passageId, nextPassageId, sentence, tags, tagTable, addKnowledge, role, headNode):
+        treeNode.TreeNode.__init__(self, passageId, nextPassageId, sentence, tags, tagTable, addKnowledge, (), role, headNode)
+        del self.nextNodes
+        self.lazyNodes = lazyNodes
+
+    def __getattr__(self, name):
+        #called only while the attribute is not set
+        if name == "nextNodes":
+            self.nextNodes = self.lazyNodes.nextNodes(self.index)
+            return self.nextNodes
+        raise AttributeError(name)
+
+class CachedFrame(frame.Frame):
+    '''Frame of a compiled scenario - its cognitive resources and role tables are created when first used'''
+    __slots__ = ('lazyNodes',)
+
+    def __init__(self, lazyNodes, passageId, nextPassageId, tags, tagTable, startFrame):
+        frame.Frame.__init__(self, passageId, nextPassageId, tags, tagTable, {}, (), startFrame)
+        del self.cognitiveResources, self.roleResources
+        self.lazyNodes = lazyNodes
+
+    def __getattr__(self, name):
+        #called only while the attribute is not set
+        if name == "cognitiveResources":
+            self.cognitiveResources = self.lazyNodes.frameResources(self.index)
+            return self.cognitiveResources
+        if name == "roleResources":
+            self.buildRoleTables(self.lazyNodes.roles)
+            return self.roleResources
+        raise AttributeError(name)
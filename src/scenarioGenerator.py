@@ -0,0 +1,139 @@
+import json
+import random
+
+class ScenarioGenerator:
+    '''Class to generate synthetic scenarios in the Twison JSON format (used by the benchmarks)'''
+    def __init__(self, numFrames, treesPerFrame = 2, depth = 3, branching = 2, knowledgeTags = 4, frameCopies = 1, tagsPerFrame = 1,
+                 roleMix = 0.5, timeoutFrame = False, timer = 30, seed = 0):
+        '''Initialize scenario generator
+        :param numFrames: number of frames of the scenario
+        :param treesPerFrame: number of dialogue trees (cognitive resources) associated with each frame
+        :param depth: number of nodes from the head node to the leaves of each dialogue tree
+        :param branching: number of nodes that follow each node of a dialogue tree
+        :param knowledgeTags: number of distinct knowledge tags that can be added to the knowledge base
+        :param frameCopies: number of passages of each frame - the copies link to different frames, as in "Introduction 1", "Introduction 2"...
+        :param tagsPerFrame: number of context tags of each frame - the frame's own tag plus tags shared with other frames
+        :param roleMix: probability of the user role saying the head node of a dialogue tree (the first two trees of a frame are always one of each role)
+        :param timeoutFrame: bool that indicates if the scenario has a timeout frame with its dialogue trees
+        :param timer: seconds of the timeout condition of the timeout frame
+        :param seed: seed of the random generator - the same parameters always generate the same scenario
+        '''
+        self.numFrames = numFrames
+        self.treesPerFrame = treesPerFrame
+        self.depth = depth
+        self.branching = branching
+        self.knowledgeTags = ["knowledge" + str(k) for k in range(knowledgeTags)]
+        self.frameCopies = frameCopies
+        self.sharedTags = ["topic" + str(k) for k in range(max(4, numFrames // 10))]
+        self.tagsPerFrame = tagsPerFrame
+        self.roleMix = roleMix
+        self.timeoutFrame = timeoutFrame
+        self.timer = timer
+        self.userRole = "user"
+        self.agentRole = "agent"
+        self.rand = random.Random(seed)
+        self.passages = []
+
+    def generate(self):
+        '''Create the scenario passages and return the Twison dictionary'''
+        self.passages = []
+        self.addPassage("Roles", ["roles"], props = {"user": self.userRole, "agent": self.agentRole})
+        framePids = [str(i + 2) for i in range(self.numFrames)]
+        for i in range(self.numFrames):
+            self.addPassage("Frame " + str(i), ["frame"] + self.frameTags(i), self.nextFramePid(i, framePids), pid = framePids[i])
+        for i in range(self.numFrames):
+            for c in range(1, self.frameCopies):
+                self.addPassage("Frame %d %d" % (i, c), list(self.passages[i + 1]["tags"]), self.nextFramePid(i, framePids))
+        for i in range(self.numFrames):
+            for t in range(self.treesPerFrame):
+                self.addTree(i, t)
+        if self.timeoutFrame:
+            self.addTimeoutFrame()
+        return {"passages": self.passages, "name": "Synthetic Scenario", "startnode": "1"}
+
+    def write(self, filename):
+        '''Generate the scenario and write it to a JSON file
+        :param filename: name of the scenario file
+        '''
+        with open(filename, "w") as f:
+            json.dump(self.generate(), f)
+        return len(self.passages)
+
+    def nextFramePid(self, i, framePids):
+        '''Frames are linked to a later frame, the last frame of the scenario finishes the practice'''
+        if i + 1 < self.numFrames:
+            return [framePids[self.rand.randint(i + 1, min(i + 2 + self.frameCopies, self.numFrames - 1))]]
+        return []
+
+    def frameTags(self, i):
+        '''Context tag of frame i, shared tags up to the number of tags per frame plus, for some frames, a knowledge tag'''
+        tags = ["context" + str(i)] + self.rand.sample(self.sharedTags, min(self.tagsPerFrame - 1, len(self.sharedTags)))
+        if i % 3 == 2:
+            tags.append(self.rand.choice(self.knowledgeTags))
+        return tags
+
+    def addTree(self, frameIdx, treeIdx):
+        '''Add the nodes of one dialogue tree of a frame, alternating roles between levels - the first two trees have head nodes of different roles, so both roles can open every frame'''
+        tags = self.resourceTags(frameIdx)
+        roles = [self.userRole, self.agentRole]
+        if treeIdx < 2:
+            firstRole = treeIdx
+        else:
+            firstRole = 0 if self.rand.random() < self.roleMix else 1
+        level = [None]
+        for d in range(self.depth):
+            nextLevel = []
+            width = 1 if d == 0 else self.branching
+            for parent in level:
+                children = []
+                for b in range(width):
+                    pid = str(len(self.passages) + 1)
+                    name = "Frame %d tree %d node %s" % (frameIdx, treeIdx, pid)
+                    props = None
+                    if self.rand.random() < 0.1:
+                        props = {"addKnowledge": self.rand.choice(self.knowledgeTags)}
+                    self.addPassage(name, tags + [roles[(firstRole + d) % 2]], props = props)
+                    if props is not None:
+                        self.passages[-1]["text"] = "{{addKnowledge}}\n" + props["addKnowledge"] + "\n{{/addKnowledge}}\n\n"
+                    children.append(self.passages[-1])
+                if parent is not None:
+                    self.setLinks(parent, children)
+                nextLevel += children
+            level = nextLevel
+
+    def addTimeoutFrame(self):
+        '''Add the timeout frame and its dialogue trees without roles, as in the example scenarios: the agent asks if the user is still there and the user answers'''
+        self.addPassage("Timeout", ["frame", "timeout"], props = {"timer": str(self.timer)})
+        self.passages[-1]["text"] = "{{timer}}\n" + str(self.timer) + "\n{{/timer}}"
+        questions = []
+        for name in ("Are you still there?", "Is everything okay? You are not replying..."):
+            self.addPassage(name, ["timeout"])
+            questions.append(self.passages[-1])
+        answers = []
+        for name in ("Sorry, something came up! Where were we?", "Yes, can you repeat what you said before, please?"):
+            self.addPassage(name, ["timeout"])
+            answers.append(self.passages[-1])
+        for q in questions:
+            self.setLinks(q, answers)
+
+    def resourceTags(self, frameIdx):
+        '''Tags shared by the resources of a frame - the frame passage tags without "frame"'''
+        return [t for t in self.passages[frameIdx + 1]["tags"] if t != "frame"]
+
+    def addPassage(self, name, tags, nextPid = None, props = None, pid = None):
+        '''Append passage in the Twison format to the scenario
+        :param nextPid: list with the identifiers of the passages linked from this passage (None if it has no links)
+        :param pid: identifier of the passage (the next free identifier by default)
+        '''
+        passage = {"text": "", "name": name, "pid": pid if pid is not None else str(len(self.passages) + 1),
+                   "position": {"x": str(self.rand.randint(0, 5000)), "y": str(self.rand.randint(0, 5000))}, "tags": tags}
+        if nextPid:
+            passage["links"] = [{"name": p, "link": p, "pid": p} for p in nextPid]
+        if props is not None:
+            passage["props"] = props
+        self.passages.append(passage)
+
+    def setLinks(self, passage, children):
+        '''Link a passage to the passages that follow it, writing the links in its text as Twine does'''
+        passage["links"] = [{"name": c["name"], "link": c["name"], "pid": c["pid"]} for c in children]
+        passage["text"] += "".join("[[" + c["name"] + "]]\n" for c in children)
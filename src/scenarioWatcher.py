@@ -0,0 +1,649 @@
+import json
+import os
+import re
+import threading
+import time
+import readFile
+import treeNode
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+def commonPrefix(a, b):
+    '''Length of the common prefix of two strings - compared in blocks, then character by character'''
+    n = min(len(a), len(b))
+    i = 0
+    for step in (1 << 16, 1 << 10, 1 << 4, 1):
+        while i + step <= n and a[i:i + step] == b[i:i + step]:
+            i += step
+    return i
+
+def commonSuffix(a, b, limit):
+    '''Length of the common suffix of two strings, up to limit characters'''
+    la = len(a)
+    lb = len(b)
+    i = 0
+    for step in (1 << 16, 1 << 10, 1 << 4, 1):
+        while i + step <= limit and a[la - i - step:la - i] == b[lb - i - step:lb - i]:
+            i += step
+    return i
+
+class TwisonText:
+    '''Text of a Twison file with the position of each passage, so that an edited file is decoded only where it changed
+    The positions of the passages that follow an edit are shifted lazily (see end), so an edit costs the size of the edit and not the
+    number of passages of the file
+    '''
+    decoder = json.JSONDecoder()
+    #number of pending shifts of the positions before they are added to the whole list
+    MAX_SHIFTS = 16
+
+    def __init__(self, text, passages, ends, arrayStart, arrayEnd):
+        '''Initialize Twison text
+        :param text: text of the file
+        :param passages: list with the decoded passages in file order
+        :param ends: list with the position after the last character of each passage
+        :param arrayStart, arrayEnd: positions after the "[" that opens the passages array and of the "]" that closes it
+        :var shifts: list with the pending shifts [index, delta] of the positions - delta is added to the ends of the passages from index on
+        '''
+        self.text = text
+        self.passages = passages
+        self.ends = ends
+        self.arrayStart = arrayStart
+        self.arrayEnd = arrayEnd
+        self.shifts = []
+
+    @classmethod
+    def decode(cls, text):
+        '''Decode the whole text of a file'''
+        decoder = cls.decoder
+        pos = cls.expect(text, 0, "{")
+        while True:
+            key, pos = decoder.raw_decode(text, WHITESPACE.match(text, pos).end())
+            pos = cls.expect(text, pos, ":")
+            if key == "passages":
+                pos = cls.expect(text, pos, "[")
+                passages, ends, arrayEnd = cls.decodePassages(text, pos)
+                return cls(text, passages, ends, pos, arrayEnd)
+            value, pos = decoder.raw_decode(text, WHITESPACE.match(text, pos).end()) #story attributes are not used
+            pos = cls.expect(text, pos, ",")
+
+    @staticmethod
+    def expect(text, pos, character):
+        '''Position after the next character that is not white space, which must be the given one'''
+        pos = WHITESPACE.match(text, pos).end()
+        if text[pos:pos + 1] != character:
+            raise ValueError("expected '%s' at '%s'" % (character, text[pos:pos + 20]))
+        return pos + 1
+
+    @classmethod
+    def decodePassages(cls, text, pos, stop = None):
+        '''Decode passages of the passages array from a position before a passage (or before the "]")
+        :param stop: function of the end of a decoded passage - decoding stops after the passage if it returns True
+        :return: passages, their end positions, and the position of the "]" (None if stopped before it)
+        '''
+        decoder = cls.decoder
+        passages = []
+        ends = []
+        while True:
+            pos = WHITESPACE.match(text, pos).end()
+            if text[pos:pos + 1] == ",":
+                pos = WHITESPACE.match(text, pos + 1).end()
+            if text[pos:pos + 1] == "]":
+                return passages, ends, pos
+            passage, end = decoder.raw_decode(text, pos)
+            passages.append(passage)
+            ends.append(end)
+            pos = end
+            if stop is not None and stop(end):
+                return passages, ends, None
+
+    def end(self, i):
+        '''Position after the last character of passage i'''
+        position = self.ends[i]
+        for index, delta in self.shifts:
+            if index <= i:
+                position += delta
+        return position
+
+    def countEnds(self, position):
+        '''Number of passages that end at or before a position'''
+        lo = 0
+        hi = len(self.ends)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.end(mid) <= position:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def update(self, text):
+        '''Decode the passages of an edited version of the text that are not in its common prefix and suffix with this text - this text
+        is not changed until the edit is applied (see replace)
+        :return: edit - range [first, last) of the passages of this text that are replaced, the passages decoded from the edited text that
+        replace them, their end positions, and the positions after the "[" and of the "]" in the edited text
+        '''
+        old = self.text
+        prefix = commonPrefix(old, text)
+        if prefix == len(old) == len(text) or prefix > self.arrayEnd:
+            #the text did not change, or only the story attributes after the passages did
+            return len(self.passages), len(self.passages), [], [], self.arrayStart, self.arrayEnd
+        if prefix < self.arrayStart:
+            #the edit starts before the passages array - decode everything again
+            new = TwisonText.decode(text)
+            return 0, len(self.passages), new.passages, new.ends, new.arrayStart, new.arrayEnd
+        suffix = commonSuffix(old, text, min(len(old), len(text)) - prefix)
+        delta = len(text) - len(old)
+        oldChangeEnd = len(old) - suffix
+        first = self.countEnds(prefix)
+        last = [len(self.passages)]
+        def stop(end):
+            #the rest of the array is unchanged once a passage ends in the common suffix where an old passage ended
+            if end - delta < oldChangeEnd:
+                return False
+            k = self.countEnds(end - delta - 1)
+            if first <= k < len(self.passages) and self.end(k) == end - delta:
+                last[0] = k + 1
+                return True
+            return False
+        passages, ends, arrayEnd = TwisonText.decodePassages(text, self.end(first - 1) if first > 0 else self.arrayStart, stop)
+        if arrayEnd is None:
+            arrayEnd = self.arrayEnd + delta
+        return first, last[0], passages, ends, self.arrayStart, arrayEnd
+
+    def replace(self, text, edit):
+        '''Apply an edit of the text (see update) - the passages are replaced in place and the positions that follow them are shifted lazily'''
+        first, last, passages, ends, arrayStart, arrayEnd = edit
+        delta = len(text) - len(self.text)
+        newLast = first + len(passages)
+        #shifts of the replaced passages move to the passages that follow them
+        shifts = [[index if index <= first else max(index, last) + newLast - last, d] for index, d in self.shifts]
+        base = sum(d for index, d in shifts if index <= first)
+        self.passages[first:last] = passages
+        self.ends[first:last] = [e - base for e in ends]
+        if delta != 0:
+            shifts.append([newLast, delta])
+        self.shifts = [s for s in shifts if s[0] < len(self.passages)]
+        if len(self.shifts) > self.MAX_SHIFTS:
+            self.applyShifts()
+        self.text = text
+        self.arrayStart = arrayStart
+        self.arrayEnd = arrayEnd
+
+    def applyShifts(self):
+        '''Add the pending shifts to the positions of the passages'''
+        ends = self.ends
+        bounds = sorted(self.shifts) + [[len(ends), 0]]
+        total = 0
+        for (index, delta), (nextIndex, d) in zip(bounds, bounds[1:]):
+            total += delta
+            ends[index:nextIndex] = [e + total for e in ends[index:nextIndex]]
+        self.shifts = []
+
+class PassageRecords:
+    '''Fields read by ReadFile of the passages of a scenario file - (kind, name, tags, props, linked pids) - made the first time they are needed'''
+    def __init__(self, passages):
+        '''Initialize passage records
+        :param passages: dictionary with the decoded passage of each pid
+        :var records: dictionary with the records made so far, by pid
+        '''
+        self.passages = passages
+        self.records = {}
+
+    @staticmethod
+    def record(passage):
+        '''Record of a passage - the properties read by ReadFile are checked (KeyError or ValueError if they are missing)'''
+        tags = list(passage['tags'])
+        props = passage.get('props')
+        links = passage.get('links')
+        if 'frame' in tags:
+            kind = "frame"
+            tags.remove('frame')
+            if "timeout" in tags:
+                int(props['timer'])
+        elif 'roles' in tags:
+            kind = "roles"
+        else:
+            kind = "node"
+            if props is not None:
+                props['addKnowledge']
+        return (kind, passage.get('name'), tuple(tags), tuple(sorted(props.items())) if props is not None else None,
+                tuple(l['pid'] for l in links) if links is not None else ())
+
+    def __getitem__(self, pid):
+        record = self.records.get(pid)
+        if record is None:
+            record = self.records[pid] = self.record(self.passages[pid])
+        return record
+
+    def replace(self, removed, passages, records):
+        '''Replace passages in place
+        :param removed: pids of the passages that are replaced
+        :param passages, records: dictionaries with the passages that replace them and their records, by pid
+        '''
+        for pid in removed:
+            del self.passages[pid]
+            self.records.pop(pid, None)
+        self.passages.update(passages)
+        self.records.update(records)
+
+class ScenarioWatcher:
+    '''Hot reload of a scenario file edited while it is in use - the passages are compared by pid and only the affected objects are patched
+    The scenario object is patched in place, so engines and sessions that use it see the edit at their next turn. Objects of removed passages
+    are detached but not modified: a session in the middle of a removed dialogue tree finishes it and then continues in the new graph.
+    Edits that change frames (tags, added or removed frames), the roles or the order of the passages rebuild the whole scenario in place.
+    Stories published by Twine (HTML) are not decoded as Twison text: every edit of such a file rebuilds the whole scenario.
+    The file is decoded in a background thread when the watcher is created, so watching does not slow down the start of the scenario and
+    the first edit is already patched (see readBaseline for scenarios loaded from their compiled cache).
+    '''
+    def __init__(self, scenario, interval = 1.0):
+        '''Initialize scenario watcher
+        :param scenario: loaded scenario (ReadFile or CompiledScenario) - its file is watched
+        :param interval: minimum time in seconds between checks of the file
+        :var source: text and decoded passages of the file as last read (TwisonText) - None until the background thread decoded it
+        :var records: passages of the file as last read by pid (PassageRecords) - None until the background thread decoded it
+        :var framePids: list with the pids of the frame passages in file order
+        :var nodeInbound: dictionary with the number of tree nodes linked to each pid - nodes without inbound links are head nodes
+        :var linkedFrom: dictionary with the pids of the tree nodes linked to each pid
+        :var headsByTagSet: dictionary with the head nodes of each set of tags in file order (the cognitive resources of the frame with those tags)
+        :var frameInbound: dictionary with the number of frame links to each frame - frames without inbound links are start frames
+        :var html: bool that indicates if the file is a story published by Twine - it is always rebuilt (see rebuild)
+        :var baseline: thread that decodes the file as it was when the scenario was loaded (None for stories published by Twine)
+        :var pending: scenario read by the background thread that replaces the contents of a compiled scenario at the first edit (see readBaseline)
+        :var engines: dialogue engines refreshed after each reload
+        :var lastError: exception of the last reload that failed (the scenario is kept as it was)
+        '''
+        self.scenario = scenario
+        self.filename = scenario.filename
+        self.interval = interval
+        self.engines = []
+        self.lastError = None
+        self.lastCheck = 0.0
+        self.stat = self.fileStat()
+        self.html = self.filename.lower().endswith((".html", ".htm"))
+        self.source = self.records = self.nodeInbound = None
+        self.framePids = []
+        self.baseline = self.pending = None
+        if not self.html:
+            self.baseline = threading.Thread(target = self.readBaseline, args = (self.stat,), daemon = True)
+            self.baseline.start()
+
+    def attach(self, engine):
+        '''Refresh a dialogue engine of the scenario after every reload'''
+        self.engines.append(engine)
+
+    def fileStat(self):
+        st = os.stat(self.filename)
+        return (st.st_mtime_ns, st.st_size)
+
+    def readText(self):
+        '''Text of the file - line endings are kept, so the text encoded is the content of the file'''
+        with open(self.filename, encoding = "utf-8", newline = "") as f:
+            return f.read()
+
+    def passageLists(self, passages):
+        '''Decoded passages of a file by pid, and the pids of the tree node and frame passages in file order'''
+        byPid = {}
+        nodePids = []
+        framePids = []
+        for passage in passages:
+            tags = passage.get('tags')
+            if tags is None:
+                continue
+            pid = passage.get('pid')
+            if pid in byPid:
+                raise ValueError("duplicate passage pid " + str(pid))
+            byPid[pid] = passage
+            if 'frame' in tags:
+                framePids.append(pid)
+            elif 'roles' not in tags:
+                nodePids.append(pid)
+        return byPid, nodePids, framePids
+
+    def readBaseline(self, stat):
+        '''Decode the file as it was when the scenario was loaded (background thread started by __init__) and build the link indexes
+        The tree nodes of a scenario loaded from its compiled cache are created when first used, and creating them all from the cache is
+        slower than reading the file: the file is read into a new scenario, which replaces the contents of the watched one at the first edit
+        :param stat: modification time and size of the file when the scenario was loaded - if the file changed since, nothing is kept and
+        the first edit rebuilds the scenario
+        '''
+        try:
+            text = self.readText()
+            if self.fileStat() != stat:
+                return
+            source = TwisonText.decode(text)
+            passages, nodePids, framePids = self.passageLists(source.passages)
+            graph = self.scenario
+            if not isinstance(graph.treeNodes, list):
+                graph = readFile.ReadFile(self.filename, graph.streaming)
+                if self.fileStat() != stat:
+                    return
+            self.buildLinkIndexes(graph)
+        except (OSError, ValueError, KeyError, TypeError): #the scenario is rebuilt at the first edit
+            return
+        if graph is not self.scenario:
+            self.pending = graph
+        self.source, self.records, self.framePids = source, PassageRecords(passages), framePids
+
+    def buildLinkIndexes(self, sc):
+        '''Build the indexes used to patch the links, head nodes and start frames of a scenario - the watched one, or the one that replaces
+        its contents (see replaceGraph)'''
+        self.nodeInbound = {}
+        self.linkedFrom = {}
+        self.headsByTagSet = {}
+        for n in sc.treeNodes:
+            self.addNodeLinks(n)
+            if n.headNode:
+                self.headsByTagSet.setdefault(n.tagSetId, []).append(n)
+        self.frameInbound = {}
+        for f in sc.frames:
+            self.addFrameLinks(f, 1, sc)
+
+    def addNodeLinks(self, n, sign = 1):
+        '''Count (or uncount, with sign -1) the links of a tree node'''
+        for pid in set(n.nextPassageId):
+            self.nodeInbound[pid] = self.nodeInbound.get(pid, 0) + sign
+            sources = self.linkedFrom.setdefault(pid, set())
+            if sign > 0:
+                sources.add(n.passageId)
+            else:
+                sources.discard(n.passageId)
+
+    def addFrameLinks(self, f, sign = 1, sc = None):
+        '''Count (or uncount, with sign -1) the links of a frame of a scenario (the watched one by default) - once per linked pid, as in its
+        next frame frequencies'''
+        framesByPid = (sc or self.scenario).framesByPid
+        for pid in set(f.nextPassageId):
+            nf = framesByPid.get(pid)
+            if nf is not None:
+                self.frameInbound[nf] = self.frameInbound.get(nf, 0) + sign
+
+    def poll(self):
+        '''Reload the scenario if its file changed since the last check
+        :return: True if the scenario was reloaded
+        '''
+        now = time.monotonic()
+        if now - self.lastCheck < self.interval:
+            return False
+        self.lastCheck = now
+        try:
+            stat = self.fileStat()
+        except OSError: #the file is being replaced - check again later
+            return False
+        if stat == self.stat:
+            return False
+        self.stat = stat
+        return self.reload()
+
+    def reload(self):
+        '''Patch the scenario with the changes of its file - only the passages of the edited part of the file are compared
+        :return: True if the scenario changed, False if nothing relevant changed or if the file could not be read (see lastError)
+        '''
+        if self.baseline is not None:
+            self.baseline.join()
+            self.baseline = None
+        if self.html or self.source is None:
+            return self.reloadAll()
+        try:
+            text = self.readText()
+            edit = self.source.update(text)
+            first, last, newPassages = edit[:3]
+            oldWindow, oldNodes, oldFrames = self.passageLists(self.source.passages[first:last])
+            newWindow, newNodes, newFrames = self.passageLists(newPassages)
+            records = self.records
+            for pid in newWindow:
+                if pid not in oldWindow and pid in records.passages:
+                    raise ValueError("duplicate passage pid " + str(pid))
+            oldRecords = {pid: records[pid] for pid in oldWindow}
+            newRecords = {pid: PassageRecords.record(p) for pid, p in newWindow.items()}
+        except (OSError, ValueError, KeyError, TypeError) as e: #the file is not valid (e.g. saved while being written) - keep the current scenario
+            self.lastError = e
+            return False
+        self.lastError = None
+        self.source.replace(text, edit)
+        records.replace(oldWindow, newWindow, newRecords)
+        changed = [pid for pid in newWindow if pid in oldWindow and oldRecords[pid] != newRecords[pid]]
+        added = [pid for pid in newWindow if pid not in oldWindow]
+        removed = [pid for pid in oldWindow if pid not in newWindow]
+        if not changed and not added and not removed and oldNodes == newNodes and oldFrames == newFrames:
+            return False
+        if self.needsRebuild(oldRecords, newRecords, oldNodes, newNodes, oldFrames, newFrames, changed, added, removed, first + len(newPassages)):
+            self.rebuild()
+            byPid, nodePids, self.framePids = self.passageLists(self.source.passages)
+        else:
+            if self.pending is not None:
+                self.replaceGraph(self.pending)
+            self.patch(records, oldRecords, changed, added, removed)
+        self.reloaded(text)
+        return True
+
+    def reloadAll(self):
+        '''Rebuild the scenario of a story published by Twine, or of a Twison file that could not be decoded when the watcher was created -
+        its decoded text is kept to patch the next edits
+        :return: True if the scenario was rebuilt, False if the file could not be read (see lastError)
+        '''
+        text = None
+        try:
+            if not self.html:
+                text = self.readText()
+                source = TwisonText.decode(text)
+                passages, nodePids, framePids = self.passageLists(source.passages)
+            self.rebuild()
+        except (OSError, ValueError, KeyError, TypeError) as e: #the file is not valid (e.g. saved while being written) - keep the current scenario
+            self.lastError = e
+            return False
+        self.lastError = None
+        if not self.html:
+            self.source, self.records, self.framePids = source, PassageRecords(passages), framePids
+        self.reloaded(text)
+        return True
+
+    def reloaded(self, text):
+        '''Give the scenario a new version and refresh the engines that use it
+        :param text: text of the file that was read (None if it was not read as text)
+        '''
+        sc = self.scenario
+        sc.version += 1
+        if hasattr(sc, "sourceHash"): #compiled scenario - traces recorded from now on refer to the new file, hashed when they start
+            sc.sourceHash = None
+            sc.sourceText = text
+        for engine in self.engines:
+            engine.refresh()
+
+    def needsRebuild(self, oldRecords, newRecords, oldNodes, newNodes, oldFrames, newFrames, changed, added, removed, windowEnd):
+        '''Check if the changes of the edited part of the file can be patched - frames, roles and the order of the passages are only changed
+        by a rebuild
+        :param oldRecords, newRecords: dictionaries with the records of the passages of the edited part of the file before and after the edit
+        :param oldNodes, newNodes, oldFrames, newFrames: pids of the tree node and frame passages of the edited part before and after the edit
+        :param windowEnd: position after the edited part in the passages of the new file
+        '''
+        if oldFrames != newFrames:
+            return True
+        for pid in changed:
+            old = oldRecords[pid]
+            new = newRecords[pid]
+            if old[0] != new[0] or new[0] == "roles":
+                return True
+            if new[0] == "frame" and old[2] != new[2]: #tags of the frame
+                return True
+        if any(oldRecords[pid][0] != "node" for pid in removed) or any(newRecords[pid][0] != "node" for pid in added):
+            return True
+        #the tree nodes that are kept must keep their order, and new tree nodes must be added after them
+        kept = [pid for pid in newNodes if pid in oldRecords]
+        if kept != [pid for pid in oldNodes if pid in newRecords] or newNodes[:len(kept)] != kept:
+            return True
+        if added and self.nodeAfter(windowEnd):
+            return True
+        #an edit of most of the scenario is patched faster by reading it again
+        return len(changed) + len(added) + len(removed) > len(self.records.passages) // 2
+
+    def nodeAfter(self, start):
+        '''Check if a tree node passage follows a position in the passages of the file'''
+        passages = self.source.passages
+        for i in range(start, len(passages)):
+            tags = passages[i].get('tags')
+            if tags is not None and 'frame' not in tags and 'roles' not in tags:
+                return True
+        return False
+
+    def rebuild(self):
+        '''Read the whole scenario file again, replacing the contents of the scenario object in place'''
+        new = readFile.ReadFile(self.filename, self.scenario.streaming)
+        self.buildLinkIndexes(new)
+        self.replaceGraph(new)
+
+    def replaceGraph(self, new):
+        '''Replace the contents of the scenario object in place with those of another scenario read from the file'''
+        sc = self.scenario
+        self.pending = None
+        if not isinstance(sc.treeNodes, list): #compiled scenario with lazily created nodes - it takes the node list of the new scenario
+            sc.treeNodes, sc.nodesByPid = [], {}
+        sc.userRole = new.userRole
+        sc.agentRole = new.agentRole
+        sc.timeoutCondition = new.timeoutCondition
+        sc.tagTable = new.tagTable
+        sc.frames[:] = new.frames
+        sc.treeNodes[:] = new.treeNodes
+        for name in ("nodesByPid", "framesByPid", "framesByTags"):
+            index = getattr(sc, name)
+            index.clear()
+            index.update(getattr(new, name))
+        sc.frameIndex = new.frameIndex
+        sc.loadSeconds = new.loadSeconds
+
+    def patch(self, records, oldRecords, changed, added, removed):
+        '''Patch the tree nodes and frames of the changed, added and removed passages (frames only change their links or timer)
+        :param records: passages of the edited file (PassageRecords)
+        :param oldRecords: dictionary with the records of the changed and removed passages before the edit
+        :param added: pids of the added tree nodes in file order - they follow the existing tree nodes
+        '''
+        sc = self.scenario
+        dirtyLinks = set() #pids of the nodes whose next nodes must be linked again
+        touched = {} #tree nodes whose head node status or tags may have changed, with their previous set of tags and head node status
+        dirtyTagSets = set() #sets of tags of the frames whose cognitive resources changed
+        def touch(pid):
+            n = sc.nodesByPid.get(pid)
+            if n is not None and n not in touched:
+                touched[n] = (n.tagSetId, n.headNode)
+        #removed tree nodes
+        if removed:
+            removedSet = set(removed)
+            first = None
+            for pid in removed:
+                n = sc.nodesByPid[pid]
+                touch(pid)
+                first = n.index if first is None else min(first, n.index)
+                self.addNodeLinks(n, -1)
+                for t in set(n.nextPassageId):
+                    touch(t)
+                dirtyLinks.update(self.linkedFrom.get(pid, ()))
+            for pid in removed:
+                n = sc.nodesByPid.pop(pid)
+                tagSet, head = touched.pop(n)
+                if head:
+                    self.headsByTagSet[tagSet].remove(n)
+                    dirtyTagSets.add(tagSet)
+            sc.treeNodes[first:] = [n for n in sc.treeNodes[first:] if n.passageId not in removedSet]
+            for i in range(first, len(sc.treeNodes)):
+                sc.treeNodes[i].index = i
+        #added tree nodes - created after the existing nodes
+        for pid in added:
+            kind, name, tags, props, links = records[pid]
+            if props is not None:
+                n = treeNode.TreeNode(pid, links, name, tags, sc.tagTable, dict(props)['addKnowledge'])
+            else:
+                n = treeNode.TreeNode(pid, links, name, tags, sc.tagTable)
+            self.setRole(n, tags)
+            n.index = len(sc.treeNodes)
+            n.headNode = False #not filed in headsByTagSet yet
+            sc.treeNodes.append(n)
+            sc.nodesByPid[pid] = n
+            touched[n] = (n.tagSetId, False)
+            self.addNodeLinks(n)
+            for t in set(n.nextPassageId):
+                touch(t)
+            dirtyLinks.add(pid)
+            dirtyLinks.update(self.linkedFrom.get(pid, ()))
+        #changed passages
+        timerChanged = False
+        for pid in changed:
+            kind, name, tags, props, links = records[pid]
+            if kind == "frame":
+                self.patchFrameLinks(sc.framesByPid[pid], records)
+                timerChanged = True
+                continue
+            n = sc.nodesByPid[pid]
+            touch(pid)
+            n.sentence = name
+            n.addKnowledge = dict(props)['addKnowledge'] if props is not None else ""
+            if tags != oldRecords[pid][2]:
+                self.setRole(n, tags)
+            if links != oldRecords[pid][4]:
+                self.addNodeLinks(n, -1)
+                for t in set(n.nextPassageId):
+                    touch(t)
+                n.nextPassageId = links
+                self.addNodeLinks(n)
+                for t in set(n.nextPassageId):
+                    touch(t)
+                dirtyLinks.add(pid)
+        #next nodes, in file order
+        for pid in dirtyLinks:
+            n = sc.nodesByPid.get(pid)
+            if n is not None:
+                nextNodes = [sc.nodesByPid[t] for t in set(n.nextPassageId) if t in sc.nodesByPid]
+                nextNodes.sort(key = lambda nn: nn.index)
+                n.nextNodes = tuple(nextNodes)
+        #head nodes and the cognitive resources of their frames
+        for n, (oldTagSet, oldHead) in touched.items():
+            n.headNode = self.nodeInbound.get(n.passageId, 0) == 0
+            if oldHead == n.headNode and oldTagSet == n.tagSetId:
+                continue
+            if oldHead:
+                self.headsByTagSet[oldTagSet].remove(n)
+                dirtyTagSets.add(oldTagSet)
+            if n.headNode:
+                heads = self.headsByTagSet.setdefault(n.tagSetId, [])
+                heads.append(n)
+                heads.sort(key = lambda h: h.index)
+                dirtyTagSets.add(n.tagSetId)
+        for n in touched: #roles of head nodes may have changed as well
+            if n.headNode:
+                dirtyTagSets.add(n.tagSetId)
+        roles = (sc.userRole, sc.agentRole, "")
+        for tagSet in dirtyTagSets:
+            f = sc.framesByTags.get(tagSet)
+            if f is not None:
+                f.cognitiveResources = tuple(self.headsByTagSet.get(tagSet, ()))
+                f.buildRoleTables(roles)
+        if timerChanged:
+            sc.timeoutCondition = 0
+            for pid in self.framePids:
+                kind, name, tags, props, links = records[pid]
+                if "timeout" in tags:
+                    sc.timeoutCondition = int(dict(props)['timer'])
+
+    def setRole(self, n, tags):
+        '''Set the tags of a tree node, extracting its role as ReadFile does'''
+        sc = self.scenario
+        tags = list(tags)
+        n.role = ""
+        if sc.userRole in tags:
+            n.role = sc.userRole
+            tags.remove(sc.userRole)
+        elif sc.agentRole in tags:
+            n.role = sc.agentRole
+            tags.remove(sc.agentRole)
+        n.setTags(tags, sc.tagTable)
+
+    def patchFrameLinks(self, f, records):
+        '''Link a frame again after the links of one of its passages changed - its next frames, their frequency and the start frames'''
+        sc = self.scenario
+        self.addFrameLinks(f, -1)
+        oldNext = list(f.nextFrames)
+        f.nextPassageId = [records[pid][4][-1] for pid in f.passageId if records[pid][4]]
+        self.addFrameLinks(f)
+        nextFrames = [sc.framesByPid[pid] for pid in set(f.nextPassageId) if pid in sc.framesByPid]
+        nextFrames.sort(key = lambda nf: nf.index)
+        f.nextFrames = sc.countFrequency(nextFrames)
+        for nf in set(oldNext) | set(f.nextFrames):
+            nf.startFrame = "timeout" not in nf.tags and self.frameInbound.get(nf, 0) == 0
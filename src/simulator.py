@@ -0,0 +1,199 @@
+import collections
+import concurrent.futures
+import os
+import random
+import sys
+import time
+import dialogueEngine
+import scenarioCache
+
+class RandomPolicy:
+    '''User policy that chooses uniformly between the user options'''
+    def choose(self, options, turn, rand):
+        return rand.choice(options)
+
+class ScriptedPolicy:
+    '''User policy that follows a script of sentences (or passage identifiers) and then chooses randomly'''
+    def __init__(self, script):
+        '''Initialize scripted policy
+        :param script: list with the sentence or passage identifier to choose at each turn
+        '''
+        self.script = script
+
+    def choose(self, options, turn, rand):
+        '''Scripted option of the turn - None if the script is not among the options (the dialogue diverged from the script)'''
+        if turn >= len(self.script):
+            return rand.choice(options)
+        for o in options:
+            if o.sentence == self.script[turn] or o.passageId == self.script[turn]:
+                return o
+        return None
+
+class DialogueStats:
+    '''Results of simulated dialogues - workers return one object each and they are merged'''
+    def __init__(self):
+        '''Initialize dialogue stats
+        :var frameVisits, nodeVisits: counters of the frames and nodes of the utterances of the user and the agent
+        :var deadEnds: counter of the places where dialogues could not continue ("user" without options or "agent" without a response)
+        :var knowledgeSum, knowledgeCount: sum and number of the knowledge base sizes after each turn, by turn
+        '''
+        self.dialogues = 0
+        self.turns = 0
+        self.timeouts = 0
+        self.diverged = 0
+        self.frameVisits = collections.Counter()
+        self.nodeVisits = collections.Counter()
+        self.deadEnds = collections.Counter()
+        self.knowledgeSum = []
+        self.knowledgeCount = []
+
+    def merge(self, other):
+        '''Add the results of other stats object'''
+        self.dialogues += other.dialogues
+        self.turns += other.turns
+        self.timeouts += other.timeouts
+        self.diverged += other.diverged
+        self.frameVisits.update(other.frameVisits)
+        self.nodeVisits.update(other.nodeVisits)
+        self.deadEnds.update(other.deadEnds)
+        for t in range(len(other.knowledgeSum)):
+            self.recordKnowledge(t, other.knowledgeSum[t], other.knowledgeCount[t])
+
+    def recordKnowledge(self, turn, size, count = 1):
+        '''Add knowledge base sizes after a turn'''
+        while len(self.knowledgeSum) <= turn:
+            self.knowledgeSum.append(0)
+            self.knowledgeCount.append(0)
+        self.knowledgeSum[turn] += size
+        self.knowledgeCount[turn] += count
+
+    def knowledgeGrowth(self):
+        '''Mean knowledge base size after each turn'''
+        return [s / c for s, c in zip(self.knowledgeSum, self.knowledgeCount)]
+
+def frameKey(frame):
+    '''Readable identifier of a frame - its first passage identifier and its tags'''
+    if frame is None:
+        return "none"
+    return frame.passageId[0] + ":" + "+".join(frame.tags)
+
+#scenario loaded by each worker process, reused by the following chunks
+workerEngines = {}
+
+def simulate(scenarioFile, numDialogues, maxTurns, seed, policy, timeoutRate):
+    '''Run dialogues in the current process
+    :param scenarioFile: name of the scenario file
+    :param numDialogues: number of dialogues
+    :param maxTurns: maximum number of user turns of each dialogue
+    :param seed: seed of the worker's random generator (user choices and session seeds)
+    :param policy: user policy object (RandomPolicy or ScriptedPolicy)
+    :param timeoutRate: probability of the user not replying in time at each turn
+    '''
+    engine = workerEngines.get(scenarioFile)
+    if engine is None:
+        engine = workerEngines[scenarioFile] = dialogueEngine.DialogueEngine(scenarioCache.CompiledScenario(scenarioFile))
+    timeoutCondition = engine.scenario.timeoutCondition
+    rand = random.Random(seed)
+    stats = DialogueStats()
+    for d in range(numDialogues):
+        session = engine.start_session(seed = rand.getrandbits(64))
+        stats.dialogues += 1
+        for turn in range(maxTurns):
+            options = engine.user_options(session)
+            if len(options) == 0:
+                stats.deadEnds["user at " + frameKey(engine.getCurrentFrame(session.currSocialCtx))] += 1
+                break
+            if timeoutCondition > 0 and turn > 0 and not session.timeoutActive and rand.random() < timeoutRate:
+                try:
+                    engine.timeout_expired(session)
+                except dialogueEngine.DeadEndError: #no frame or no node for the agent to acknowledge the timeout
+                    stats.deadEnds["agent after timeout"] += 1
+                    break
+                stats.timeouts += 1
+                stats.nodeVisits[session.currNode.passageId] += 1
+                stats.frameVisits[frameKey(engine.getCurrentFrame(session.currSocialCtx))] += 1
+                continue
+            node = policy.choose(options, turn, rand)
+            if node is None:
+                stats.diverged += 1
+                break
+            stats.nodeVisits[node.passageId] += 1
+            stats.frameVisits[frameKey(engine.getCurrentFrame(node.tags))] += 1
+            try:
+                engine.respond(session, node.passageId)
+            except dialogueEngine.DeadEndError: #no frame or no node for the agent to respond
+                stats.deadEnds["agent after " + node.passageId] += 1
+                break
+            stats.turns += 1
+            stats.nodeVisits[session.currNode.passageId] += 1
+            stats.frameVisits[frameKey(engine.getCurrentFrame(session.currSocialCtx))] += 1
+            stats.recordKnowledge(turn, len(session.knowledgeBase))
+    return stats
+
+def runSimulation(scenarioFile, numDialogues, maxTurns = 50, workers = None, seed = 0, policy = None, timeoutRate = 0.0, chunkSize = 1000):
+    '''Run dialogues across a process pool and merge their results
+    :param workers: number of worker processes (number of cores by default, 1 runs in the current process)
+    :param chunkSize: number of dialogues of each task sent to a worker
+    :return: merged DialogueStats and elapsed time in seconds
+    '''
+    if policy is None:
+        policy = RandomPolicy()
+    workers = workers or os.cpu_count() or 1
+    chunks = [min(chunkSize, numDialogues - start) for start in range(0, numDialogues, chunkSize)]
+    seeds = [seed * 1000003 + i for i in range(len(chunks))]
+    stats = DialogueStats()
+    #compile the scenario once before the workers load it
+    scenarioCache.CompiledScenario(scenarioFile)
+    start = time.perf_counter()
+    if workers == 1:
+        for n, s in zip(chunks, seeds):
+            stats.merge(simulate(scenarioFile, n, maxTurns, s, policy, timeoutRate))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            futures = [pool.submit(simulate, scenarioFile, n, maxTurns, s, policy, timeoutRate) for n, s in zip(chunks, seeds)]
+            for f in futures:
+                stats.merge(f.result())
+    return stats, time.perf_counter() - start
+
+def report(scenarioFile, stats, elapsed):
+    '''Dictionary with the simulation results, including the passages that no dialogue reached'''
+    scenario = scenarioCache.CompiledScenario(scenarioFile)
+    unreachableNodes = [n.passageId for n in scenario.treeNodes if n.passageId not in stats.nodeVisits]
+    unreachableFrames = [frameKey(f) for f in scenario.frames if frameKey(f) not in stats.frameVisits]
+    return {
+        "scenario": scenarioFile,
+        "dialogues": stats.dialogues,
+        "turns": stats.turns,
+        "timeouts": stats.timeouts,
+        "diverged": stats.diverged,
+        "seconds": elapsed,
+        "dialoguesPerSecond": stats.dialogues / elapsed if elapsed > 0 else 0.0,
+        "turnsPerSecond": stats.turns / elapsed if elapsed > 0 else 0.0,
+        "frameVisits": dict(stats.frameVisits.most_common()),
+        "nodeVisits": dict(stats.nodeVisits.most_common()),
+        "deadEnds": dict(stats.deadEnds.most_common()),
+        "unreachableNodes": unreachableNodes,
+        "unreachableFrames": unreachableFrames,
+        "knowledgeGrowth": stats.knowledgeGrowth(),
+    }
+
+def printReport(result, top = 10):
+    '''Print a summary of the simulation results'''
+    print("%d dialogues, %d turns in %.2fs: %.0f dialogues/s, %.0f turns/s" % (result["dialogues"], result["turns"], result["seconds"],
+                                                                             result["dialoguesPerSecond"], result["turnsPerSecond"]))
+    print("timeouts: %d, diverged from script: %d" % (result["timeouts"], result["diverged"]))
+    print("most visited frames:")
+    for key, count in list(result["frameVisits"].items())[:top]:
+        print("  %8d %s" % (count, key))
+    print("dead ends:")
+    for key, count in list(result["deadEnds"].items())[:top]:
+        print("  %8d %s" % (count, key))
+    print("unreachable nodes (%d): %s" % (len(result["unreachableNodes"]), " ".join(result["unreachableNodes"][:50])))
+    print("unreachable frames (%d): %s" % (len(result["unreachableFrames"]), " ".join(result["unreachableFrames"][:50])))
+    growth = result["knowledgeGrowth"]
+    print("mean knowledge base size after turns 1, 10, last: %s" % ", ".join("%.2f" % growth[t] for t in (0, 9, len(growth) - 1) if t < len(growth)))
+
+if __name__ == '__main__':
+    #same options as "cli.py simulate"
+    import cli
+    sys.exit(cli.main(["simulate"] + sys.argv[1:]))
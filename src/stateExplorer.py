@@ -0,0 +1,302 @@
+import collections
+import gc
+import time
+import dialogueEngine
+import knowledgeBase
+
+#user turns and timeouts are run by the engine once for every sequence of its random choices, so the explorer follows the deliberation exactly
+
+class ScriptedChoices:
+    '''Random generator of the explored sessions - its choices follow a script and the number of options of every choice is recorded'''
+    def __init__(self, script):
+        '''Initialize scripted choices
+        :param script: list with the index of the option taken by each choice of a turn (the first option once the script ends)
+        :var arities: list with the number of options of each choice made
+        '''
+        self.script = script
+        self.arities = []
+
+    def choice(self, seq):
+        if len(seq) == 0:
+            raise IndexError("cannot choose from an empty sequence")
+        pos = len(self.arities)
+        self.arities.append(len(seq))
+        return seq[self.script[pos]] if pos < len(self.script) else seq[0]
+
+class ExploredKnowledge(knowledgeBase.KnowledgeBase):
+    '''Knowledge base of an explored session - its match counts are those of the explorer's knowledge base with the same tags, counted once'''
+    def __init__(self, explorer, tags):
+        super().__init__(explorer.scenario, explorer.knowledgeCapacity)
+        self.explorer = explorer
+        self.tags.update((tag, None) for tag in tags)
+
+    def count(self, tag, sign):
+        pass
+
+    def frameMatches(self):
+        return self.explorer.knowledgeBase(tuple(self.tags)).frameMatches()
+
+class State:
+    '''Dialogue state reached by the explorer, with the turn that reached it first (the states form a tree of shortest paths)'''
+    __slots__ = ('currSocialCtx', 'currNode', 'prevSocialCtx', 'prevNode', 'knowledge', 'timeoutActive', 'parent', 'userNode')
+
+    def __init__(self, currSocialCtx, currNode, prevSocialCtx, prevNode, knowledge, timeoutActive, parent = None, userNode = None):
+        '''Initialize state
+        :param knowledge: tuple with the knowledge base tags, from the least to the most recently added
+        :param parent: state before the turn that reached this state (None for the start of the conversation)
+        :param userNode: user input of that turn (None for a timeout) - the agent's response is the current node
+        '''
+        self.currSocialCtx = currSocialCtx
+        self.currNode = currNode
+        self.prevSocialCtx = prevSocialCtx
+        self.prevNode = prevNode
+        self.knowledge = knowledge
+        self.timeoutActive = timeoutActive
+        self.parent = parent
+        self.userNode = userNode
+
+class StateExplorer:
+    '''Breadth-first enumeration of every dialogue state a scenario can reach - every user option, timeout and agent choice is followed
+    States are identified by what changes the rest of the conversation: the frame of the context (not its tags), the current node, the
+    knowledge base tags that some frame has and, while the timeout error is active, the frame and node to return to. Equivalent states are
+    expanded once.
+    '''
+    def __init__(self, scenario, timeouts = True, knowledgeCapacity = None, maxStates = None):
+        '''Initialize state explorer
+        :param scenario: loaded scenario
+        :param timeouts: bool that indicates if the timeout error is activated from every state where the user can let it expire
+        :param knowledgeCapacity: capacity of the knowledge base of the sessions (see KnowledgeBase) - the order of its tags matters when bounded
+        :param maxStates: maximum number of states to explore (None for no limit)
+        :var states: list with the reached states, in the order they were found
+        :var visited: dictionary with the index of the state of each canonical state key
+        :var frameReach: list with the number of states whose context is each frame, plus the number of user inputs with the frame's tags
+        :var nodeReach: list with the number of times each tree node was a user option or an agent response
+        :var deadEnds: list with the state and user input (None for a timeout) of each turn the agent could not respond to
+        :var endStates: list with the states without user options (end of the conversation)
+        :var timeouts, timeoutAcks, recoveries: number of timeout errors activated, of them acknowledged by the agent and of the agent's repetitions after the user replied
+        '''
+        self.scenario = scenario
+        self.engine = dialogueEngine.DialogueEngine(scenario, knowledgeCapacity)
+        self.timeoutsEnabled = timeouts and scenario.timeoutCondition > 0
+        self.knowledgeCapacity = knowledgeCapacity
+        self.maxStates = maxStates
+        self.states = []
+        self.visited = {}
+        self.frameReach = [0] * len(scenario.frames)
+        self.nodeReach = [0] * len(scenario.treeNodes)
+        self.deadEnds = []
+        self.endStates = []
+        self.timeouts = 0
+        self.timeoutAcks = 0
+        self.recoveries = 0
+        self.transitions = 0
+        self.truncated = False
+        self.seconds = 0.0
+        #frame of each context and knowledge base tags that can change the salience of a frame
+        self.frameOf = {}
+        #knowledge base and canonical tags of each tuple of knowledge base tags
+        self.knowledgeBases = {}
+        self.knowledgeKeys = {}
+        self.relevantTags = set(tag for f in scenario.frames for tag in f.tags)
+        #user options of each frame and current node, agent responses of each user input and knowledge base, and timeout
+        #acknowledgements of each knowledge base
+        self.options = {}
+        self.turnResponses = {}
+        self.timeoutAcknowledgements = {}
+
+    def frameIndex(self, ctx):
+        '''Index of the frame of a context (-1 if none)'''
+        if ctx is None:
+            return -1
+        key = tuple(ctx)
+        index = self.frameOf.get(key)
+        if index is None:
+            f = self.engine.getCurrentFrame(ctx)
+            index = self.frameOf[key] = f.index if f is not None else -1
+        return index
+
+    def knowledgeKey(self, knowledge):
+        '''Canonical knowledge base tags - only the tags of frames change the salience, and the order only matters for a bounded knowledge base'''
+        key = self.knowledgeKeys.get(knowledge)
+        if key is None:
+            key = self.knowledgeKeys[knowledge] = frozenset(t for t in knowledge if t in self.relevantTags) if self.knowledgeCapacity is None else knowledge
+        return key
+
+    def key(self, currSocialCtx, currNode, knowledge, timeoutActive, prevSocialCtx, prevNode):
+        '''Canonical key of a state - the previous context and node only matter while the timeout error is active'''
+        if timeoutActive:
+            previous = (self.frameIndex(prevSocialCtx), -1 if prevNode is None else prevNode.index)
+        else:
+            previous = None
+        return (self.frameIndex(currSocialCtx), -1 if currNode is None else currNode.index, self.knowledgeKey(knowledge), timeoutActive, previous)
+
+    def knowledgeBase(self, knowledge):
+        '''Knowledge base with a tuple of tags'''
+        kb = self.knowledgeBases.get(knowledge)
+        if kb is None:
+            kb = self.knowledgeBases[knowledge] = knowledgeBase.KnowledgeBase(self.scenario, self.knowledgeCapacity)
+            for tag in knowledge:
+                kb.add(tag)
+        return kb
+
+    def session(self, state, rand):
+        '''Session in a state'''
+        session = dialogueEngine.Session(None, rand, ExploredKnowledge(self, state.knowledge if state is not None else ()))
+        if state is not None:
+            session.currSocialCtx = state.currSocialCtx
+            session.currNode = state.currNode
+            session.prevSocialCtx = state.prevSocialCtx
+            session.prevNode = state.prevNode
+            session.timeoutActive = state.timeoutActive
+        return session
+
+    def visit(self, queue, currSocialCtx, currNode, prevSocialCtx, prevNode, knowledge, timeoutActive, parent = None, userNode = None):
+        '''Record a reached state and queue it to be expanded, unless an equivalent state was already reached'''
+        key = self.key(currSocialCtx, currNode, knowledge, timeoutActive, prevSocialCtx, prevNode)
+        if key in self.visited or self.truncated:
+            return
+        self.visited[key] = len(self.states)
+        self.states.append(State(currSocialCtx, currNode, prevSocialCtx, prevNode, knowledge, timeoutActive, parent, userNode))
+        frame = self.frameIndex(currSocialCtx)
+        if frame >= 0:
+            self.frameReach[frame] += 1
+        queue.append(len(self.states) - 1)
+        if self.maxStates is not None and len(self.states) >= self.maxStates:
+            self.truncated = True
+
+    def turns(self, state, userNode):
+        '''Sessions after every possible agent response to a user input (None for a timeout) - None for each response that fails'''
+        script = []
+        while True:
+            rand = ScriptedChoices(script)
+            session = self.session(state, rand)
+            try:
+                if userNode is None:
+                    self.engine.timeout_expired(session)
+                else:
+                    self.engine.respondNode(session, userNode)
+                yield session
+            except dialogueEngine.DeadEndError: #the agent has no frame or no resource to respond with
+                yield None
+            #next sequence of choices - the last choice that still has options left is advanced, the choices after it start again
+            taken = script + [0] * (len(rand.arities) - len(script))
+            k = len(rand.arities) - 1
+            while k >= 0 and taken[k] + 1 >= rand.arities[k]:
+                k -= 1
+            if k < 0:
+                return
+            script = taken[:k] + [taken[k] + 1]
+
+    def userOptions(self, state):
+        '''User options of a state - they only depend on its frame and current node'''
+        key = (self.frameIndex(state.currSocialCtx), -1 if state.currNode is None else state.currNode.index)
+        options = self.options.get(key)
+        if options is None:
+            options = self.options[key] = list(self.engine.user_options(self.session(state, ScriptedChoices([]))))
+        return options
+
+    def userTurn(self, state, userNode, queue):
+        '''Follow every agent response to a user input
+        Without an active timeout error the responses only depend on the input and the knowledge base, so they are computed once for both
+        :return: list with the agent's tree node of each response (None when the agent could not respond)
+        '''
+        turnKey = (userNode.index, self.knowledgeKey(state.knowledge))
+        responses = self.turnResponses.get(turnKey)
+        if responses is None:
+            responses = self.turnResponses[turnKey] = []
+            for session in self.turns(state, userNode):
+                if session is None:
+                    self.deadEnds.append((state, userNode))
+                    responses.append(None)
+                    continue
+                responses.append(session.currNode)
+                self.visit(queue, session.currSocialCtx, session.currNode, session.prevSocialCtx, session.prevNode,
+                           tuple(session.knowledgeBase), session.timeoutActive, state, userNode)
+        return responses
+
+    def timeoutTurn(self, state, queue):
+        '''Follow every acknowledgement of a timeout error
+        The acknowledgement only depends on the knowledge base (the context becomes the timeout frame), so it is computed once for each
+        knowledge base - the previous context and node of the new states are the state's (see activateErrorContext)
+        :return: list with the agent's tree node of each acknowledgement (None when the agent could not acknowledge it)
+        '''
+        knowledgeKey = self.knowledgeKey(state.knowledge)
+        acks = self.timeoutAcknowledgements.get(knowledgeKey)
+        if acks is None:
+            acks = self.timeoutAcknowledgements[knowledgeKey] = []
+            for session in self.turns(state, None):
+                if session is None:
+                    self.deadEnds.append((state, None))
+                    acks.append(None)
+                else:
+                    acks.append((session.currSocialCtx, session.currNode, tuple(session.knowledgeBase)))
+        for ack in acks:
+            if ack is not None:
+                currSocialCtx, currNode, knowledge = ack
+                self.visit(queue, currSocialCtx, currNode, state.currSocialCtx, state.currNode, knowledge, True, state, None)
+        return [ack[1] if ack is not None else None for ack in acks]
+
+    def explore(self):
+        '''Explore the scenario from the start of a conversation
+        :return: the explorer, with its results
+        '''
+        start = time.perf_counter()
+        #the states are kept until the end - the collector would only scan them again and again
+        gcEnabled = gc.isenabled()
+        gc.disable()
+        try:
+            queue = collections.deque()
+            self.visit(queue, [], None, None, None, (), False)
+            while queue and not self.truncated:
+                state = self.states[queue.popleft()]
+                options = self.userOptions(state)
+                if len(options) == 0:
+                    self.endStates.append(state)
+                for userNode in options:
+                    self.nodeReach[userNode.index] += 1
+                    frame = self.frameIndex(userNode.tags)
+                    if frame >= 0:
+                        self.frameReach[frame] += 1
+                    if state.timeoutActive:
+                        #the agent repeats its sentence before the timeout error - back to the previous context and node (see repetitionSentence)
+                        self.recoveries += 1
+                        responses = [state.prevNode]
+                        self.visit(queue, state.prevSocialCtx, state.prevNode, state.prevSocialCtx, state.prevNode, state.knowledge, False, state, userNode)
+                    else:
+                        responses = self.userTurn(state, userNode, queue)
+                    self.countResponses(responses)
+                if self.timeoutsEnabled and state.currNode is not None and not state.timeoutActive:
+                    self.timeouts += 1
+                    responses = self.timeoutTurn(state, queue)
+                    self.timeoutAcks += sum(1 for n in responses if n is not None)
+                    self.countResponses(responses)
+        finally:
+            if gcEnabled:
+                gc.enable()
+        self.seconds = time.perf_counter() - start
+        return self
+
+    def countResponses(self, responses):
+        self.transitions += len(responses)
+        for n in responses:
+            if n is not None:
+                self.nodeReach[n.index] += 1
+
+    def path(self, state):
+        '''Sentences of the shortest conversation found that reaches a state - user inputs are marked with "<<<", agent responses with ">>>"'''
+        turns = []
+        while state is not None and state.parent is not None:
+            agent = ">>> " + state.currNode.sentence
+            user = state.userNode.sentence + " <<<" if state.userNode is not None else "(timeout)"
+            turns.append((user, agent))
+            state = state.parent
+        turns.reverse()
+        return [s for turn in turns for s in turn]
+
+    def unreachableFrames(self):
+        '''Frames that are never the context of a reachable state or of a user input'''
+        return [f for f, count in zip(self.scenario.frames, self.frameReach) if count == 0]
+
+    def unreachableNodes(self):
+        '''Tree nodes that are never said'''
+        return [n for n, count in zip(self.scenario.treeNodes, self.nodeReach) if count == 0]
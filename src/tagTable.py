@@ -0,0 +1,53 @@
+import sys
+
+class TagTable:
+    '''Class to intern the tags of a scenario - each tag and each distinct set of tags gets a small integer id
+    Every scenario has its own table, so the ids stay small however many scenarios are loaded in the process
+    '''
+    def __init__(self):
+        '''Initialize tag table
+        :var ids: dictionary with the id of each tag
+        :var tags: list with the tags, indexed by id
+        :var setIds: dictionary with the id of each set of tags (frozenset of tag ids)
+        :var sets: list with the sets of tags (frozensets of tag ids), indexed by id
+        '''
+        self.ids = {}
+        self.tags = []
+        self.setIds = {}
+        self.sets = []
+
+    def tagId(self, tag):
+        '''Id of a tag, creating it if the tag is new'''
+        tid = self.ids.get(tag)
+        if tid is None:
+            tid = self.ids[tag] = len(self.tags)
+            self.tags.append(sys.intern(tag))
+        return tid
+
+    def intern(self, tags):
+        '''Tuple with the interned tags and the id of their set
+        :param tags: iterable with tags
+        '''
+        interned = []
+        tids = []
+        for t in tags:
+            tid = self.tagId(t)
+            interned.append(self.tags[tid])
+            tids.append(tid)
+        return tuple(interned), self.idOfSet(frozenset(tids))
+
+    def setId(self, tags):
+        '''Id of a set of tags - the order and repetitions of the tags do not matter, and sets that were never interned are given an id as well'''
+        return self.idOfSet(frozenset(self.tagId(t) for t in tags))
+
+    def idOfSet(self, tids):
+        '''Id of a set of tag ids, creating it if the set is new'''
+        sid = self.setIds.get(tids)
+        if sid is None:
+            sid = self.setIds[tids] = len(self.sets)
+            self.sets.append(tids)
+        return sid
+
+    def tagsOf(self, sid):
+        '''List with the tags of a set, in the order of their ids'''
+        return [self.tags[tid] for tid in sorted(self.sets[sid])]
@@ -0,0 +1,149 @@
+import math
+import re
+import time
+import numpy as np
+
+#characters that are not letters or digits separate words
+SEPARATORS = re.compile(r"[\W_]+")
+
+class TextMatcher:
+    '''Match free text typed by the user to the user options - the sentence of each tree node is indexed by its character n-grams
+    The sentences are TF-IDF vectors of their n-grams, normalized and stored in compressed sparse rows, so scoring a text is one
+    dot product with the rows of the current options only, however many sentences the scenario has
+    '''
+    def __init__(self, scenario, n = 3, threshold = 0.4):
+        '''Initialize text matcher
+        :param scenario: loaded scenario (ReadFile or CompiledScenario)
+        :param n: length of the character n-grams
+        :param threshold: minimum cosine similarity (0 to 1) of a text and the sentence of the option it is matched to
+        :var vocabulary: dictionary with the column of each n-gram of the sentences
+        :var idf: array with the inverse document frequency of each n-gram
+        :var unknownIdf: inverse document frequency of the n-grams of a text that no sentence has
+        :var rows: dictionary with the row of each tree node the index was built from - node positions change when a reload patches the scenario
+        :var indptr, indices, data: sentence vectors in compressed sparse rows - the n-gram columns and weights of row i are at indptr[i]:indptr[i + 1]
+        :var query: dense vector of the text being matched (zero outside of match)
+        :var version: version of the scenario when the index was built (it is built again after a reload)
+        :var buildSeconds: duration in seconds of the last build of the index
+        '''
+        self.scenario = scenario
+        self.n = n
+        self.threshold = threshold
+        self.build()
+
+    def ngrams(self, text):
+        '''Dictionary with the number of times each n-gram appears in a text - words are lowercased and padded with a space on each side'''
+        counts = {}
+        n = self.n
+        for word in SEPARATORS.split(text.lower()):
+            if word == "":
+                continue
+            word = " " + word + " "
+            for i in range(max(len(word) - n + 1, 1)):
+                gram = word[i:i + n]
+                counts[gram] = counts.get(gram, 0) + 1
+        return counts
+
+    def build(self):
+        '''Build the index of the sentences of the scenario'''
+        start = time.perf_counter()
+        self.version = self.scenario.version
+        vocabulary = {}
+        documentFreq = []
+        rows = []
+        self.rows = {}
+        for node in self.scenario.treeNodes:
+            self.rows[node] = len(rows)
+            row = []
+            for gram, count in self.ngrams(node.sentence).items():
+                j = vocabulary.get(gram)
+                if j is None:
+                    j = vocabulary[gram] = len(documentFreq)
+                    documentFreq.append(0)
+                documentFreq[j] += 1
+                row.append((j, count))
+            rows.append(row)
+        self.vocabulary = vocabulary
+        #smoothed idf - n-grams that are in every sentence still have some weight
+        self.idf = np.log((1 + len(rows)) / (1 + np.array(documentFreq, dtype = np.float64))) + 1
+        #n-grams that no sentence has get the idf of an n-gram of one sentence
+        self.unknownIdf = math.log((1 + len(rows)) / 2) + 1
+        indptr = np.zeros(len(rows) + 1, dtype = np.int64)
+        indptr[1:] = np.cumsum([len(row) for row in rows])
+        indices = np.fromiter((j for row in rows for j, count in row), dtype = np.int64, count = indptr[-1])
+        counts = np.fromiter((count for row in rows for j, count in row), dtype = np.float64, count = indptr[-1])
+        #sublinear term frequency, then each row is normalized to unit length
+        data = (1 + np.log(counts)) * self.idf[indices]
+        lengths = np.diff(indptr)
+        norms = np.sqrt(np.bincount(np.repeat(np.arange(len(rows)), lengths), weights = data * data, minlength = len(rows)))
+        norms[lengths == 0] = 1
+        data /= np.repeat(norms, lengths)
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.query = np.zeros(len(vocabulary), dtype = np.float64)
+        self.buildSeconds = time.perf_counter() - start
+
+    def vectorize(self, text):
+        '''Columns and weights of the normalized vector of a text - n-grams that no sentence has only count for its length'''
+        columns = []
+        weights = []
+        norm = 0.0
+        for gram, count in self.ngrams(text).items():
+            j = self.vocabulary.get(gram)
+            weight = (1 + math.log(count)) * (self.idf[j] if j is not None else self.unknownIdf)
+            norm += weight * weight
+            if j is not None:
+                columns.append(j)
+                weights.append(weight)
+        if norm == 0:
+            return [], []
+        norm = math.sqrt(norm)
+        return columns, [w / norm for w in weights]
+
+    def scores(self, nodes, text):
+        '''Array with the cosine similarity of a text and the sentence of each node - nodes the index was not built from (e.g. options of
+        a dialogue tree that a reload replaced or removed, which the session can still finish) are vectorized from their sentence
+        '''
+        if self.version != self.scenario.version:
+            self.build()
+        indexed = []
+        rows = []
+        missing = []
+        for k, node in enumerate(nodes):
+            row = self.rows.get(node)
+            if row is None:
+                missing.append(k)
+            else:
+                indexed.append(k)
+                rows.append(row)
+        scores = np.zeros(len(nodes), dtype = np.float64)
+        columns, weights = self.vectorize(text)
+        query = self.query
+        query[columns] = weights
+        if rows:
+            rows = np.array(rows, dtype = np.int64)
+            starts = self.indptr[rows]
+            lengths = self.indptr[rows + 1] - starts
+            #one entry per (node, n-gram of its sentence) pair
+            firstEntry = np.cumsum(lengths) - lengths
+            entries = np.arange(lengths.sum()) - np.repeat(firstEntry - starts, lengths)
+            products = self.data[entries] * query[self.indices[entries]]
+            scores[indexed] = np.bincount(np.repeat(np.arange(len(rows)), lengths), weights = products, minlength = len(rows))
+        for k in missing:
+            sentenceColumns, sentenceWeights = self.vectorize(nodes[k].sentence)
+            scores[k] = sum(w * query[j] for j, w in zip(sentenceColumns, sentenceWeights))
+        query[columns] = 0
+        return scores
+
+    def match(self, nodes, text):
+        '''Node whose sentence is the most similar to a text (the first one if there is a tie) and its similarity
+        :param nodes: candidate tree nodes (e.g. the user options)
+        :return: tuple with the node, or None if no similarity reaches the threshold, and the highest similarity
+        '''
+        if len(nodes) == 0:
+            return None, 0.0
+        scores = self.scores(nodes, text)
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None, float(scores[best])
+        return nodes[best], float(scores[best])
@@ -1,43 +1,34 @@
-from PyQt5.QtCore import QTimer
-
 class TimeoutErrorApp:
-    ''' Class of timeout error - error detection and recovery'''
+    ''' Class of timeout error - error detection (the recovery is done by the deliberation mechanism's session)'''
     def __init__(self, app):
         '''Initialize timeout error
         :param app: dialogue system's application to get readFile object to obtain variable from scenario file and call app function
         :var timeoutCondition: maximum time in seconds to wait for user input (obtained from scenario file)
-        :var timeoutActive: bool that indicates if the timeout error was activated or not
+        :var timer: single-shot timer, restarted after every agent response instead of creating a new one
         '''
         
         self.app = app
         self.inputFile = app.inputFile
         
         self.timeoutCondition = self.inputFile.timeoutCondition
-        self.timeoutActive = False
+        self.timer = None
     
     def identifyTimeoutError(self):
         '''Detect timeout error'''
-        if self.timeoutCondition > 0 and not self.timeoutActive:              
-            self.timer = QTimer()
-            self.timer.timeout.connect(self.activateTimeoutFunction)
+        if self.timeoutCondition > 0 and not self.app.deliberation.session.timeoutActive:              
+            if self.timer is None:
+                #Qt is only imported by the graphical application (see timeoutScheduler for sessions without Qt)
+                from PyQt5.QtCore import QTimer
+                self.timer = QTimer()
+                self.timer.setSingleShot(True)
+                self.timer.timeout.connect(self.activateTimeoutFunction)
+            #restarting the timer cancels the previous deadline
             self.timer.start(self.timeoutCondition*1000)
         
     def activateTimeoutFunction(self):
         '''Activate timeout error for the agent to acknowledge the timeout error'''
-        if not self.timeoutActive:
-            self.timeoutActive = True
+        session = self.app.deliberation.session
+        if not session.timeoutActive:
+            session.timeoutActive = True
             #for agent to enter timeout frame
             self.app.printAgentResponse(None)
-        
-    def timeoutRecoveryRepetition(self, inputNode):
-        '''After entering timeout frame'''
-        if inputNode is not None and self.timeoutActive:
-            self.timeoutActive = False
-            return True
-        return False
-        
-    def timeoutRecoveryAcknowledge(self, inputNode):
-        '''Before entering timeout frame'''
-        if inputNode is None and self.timeoutActive:
-            return True
-        return False
@@ -0,0 +1,121 @@
+import math
+import time
+import dialogueEngine
+
+class TimeoutScheduler:
+    '''Timeout error detection for many sessions without Qt - a hashed timer wheel where arming, re-arming and cancelling a deadline are O(1)'''
+    def __init__(self, engine, onTimeout = None, tick = 0.1, wheelSize = 1024, clock = time.monotonic, onError = None):
+        '''Initialize timeout scheduler
+        :param engine: dialogue engine of the sessions - its scenario gives the timeout condition
+        :param onTimeout: function called with the session and the agent's acknowledgement when a timeout error is activated
+        :param onError: function called with the session and the exception when its timeout error cannot be activated (e.g. DeadEndError,
+        the agent cannot acknowledge it) - the session has no deadline anymore and the other sessions are still activated
+        :param tick: resolution of the deadlines in seconds
+        :param wheelSize: number of slots of the wheel - deadlines further than wheelSize ticks wait for more turns of the wheel
+        :param clock: function returning the current time in seconds
+        :var slots: list with a dictionary per slot with the deadline tick and session of each session identifier
+        :var pending: dictionary with the slot of each session with an armed deadline
+        :var lastError: tuple with the session and the exception of the last timeout that could not be activated (None if there was none)
+        '''
+        self.engine = engine
+        self.onTimeout = onTimeout
+        self.onError = onError
+        self.lastError = None
+        self.tick = tick
+        self.wheelSize = wheelSize
+        self.clock = clock
+        self.timeoutCondition = engine.scenario.timeoutCondition
+        self.slots = [{} for i in range(wheelSize)]
+        self.pending = {}
+        self.currentTick = self.tickOf(clock())
+
+    def __len__(self):
+        '''Number of armed deadlines'''
+        return len(self.pending)
+
+    def tickOf(self, t):
+        '''Tick of the wheel that contains time t'''
+        return int(t / self.tick)
+
+    def arm(self, session, delay = None):
+        '''Arm (or re-arm) the timeout deadline of a session after it receives the agent's response - the same condition as the Qt timer
+        :param delay: seconds to wait for user input (the scenario's timeout condition by default)
+        '''
+        self.cancel(session)
+        if delay is None:
+            delay = self.timeoutCondition
+        if delay <= 0 or session.timeoutActive:
+            return False
+        deadline = self.tickOf(self.clock()) + max(1, math.ceil(delay / self.tick))
+        slot = deadline % self.wheelSize
+        self.slots[slot][session.sessionId] = (deadline, session)
+        self.pending[session.sessionId] = slot
+        return True
+
+    def cancel(self, session):
+        '''Cancel the deadline of a session, if it has one'''
+        slot = self.pending.pop(session.sessionId, None)
+        if slot is not None:
+            del self.slots[slot][session.sessionId]
+
+    def respond(self, session, node_id):
+        '''Send a user input to the engine: the deadline is cancelled while the agent deliberates and armed again for the next user turn
+        If the engine raises an exception the deadline is restored, except for DeadEndError (the conversation ended)
+        '''
+        slot = self.pending.get(session.sessionId)
+        entry = self.slots[slot][session.sessionId] if slot is not None else None
+        self.cancel(session)
+        try:
+            sentence = self.engine.respond(session, node_id)
+        except dialogueEngine.DeadEndError:
+            raise
+        except Exception:
+            #the input was not accepted (e.g. it is not a user option) - the user still has to reply before the same deadline
+            if entry is not None:
+                self.slots[slot][session.sessionId] = entry
+                self.pending[session.sessionId] = slot
+            raise
+        self.arm(session)
+        return sentence
+
+    def advance(self, now = None):
+        '''Activate the timeout error of every session whose deadline has passed, in the order of the deadlines
+        :param now: current time in seconds (read from the clock by default)
+        :return: list with the session and the agent's acknowledgement of each activated timeout
+        '''
+        target = self.tickOf(self.clock() if now is None else now)
+        if target - self.currentTick > self.wheelSize:
+            #the wheel would turn more than once - one turn visits every slot, the deadlines of the skipped turns are due in it
+            self.currentTick = target - self.wheelSize
+        activated = []
+        while self.currentTick < target:
+            if not self.pending:
+                self.currentTick = target
+                break
+            self.currentTick += 1
+            entries = self.slots[self.currentTick % self.wheelSize]
+            if not entries:
+                continue
+            due = [sid for sid, (deadline, session) in entries.items() if deadline <= self.currentTick]
+            for sid in due:
+                deadline, session = entries.pop(sid)
+                del self.pending[sid]
+                try:
+                    sentence = self.engine.timeout_expired(session)
+                    if sentence is not None:
+                        activated.append((session, sentence))
+                        if self.onTimeout is not None:
+                            self.onTimeout(session, sentence)
+                except Exception as e:
+                    #one session that cannot continue does not stop the timeouts of the others
+                    self.lastError = (session, e)
+                    if self.onError is not None:
+                        self.onError(session, e)
+        return activated
+
+    async def run(self):
+        '''Advance the wheel every tick in an asyncio event loop'''
+        import asyncio
+        while True:
+            await asyncio.sleep(self.tick)
+            self.advance()
@@ -0,0 +1,42 @@
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
+
+USER = 0
+AGENT = 1
+
+class TranscriptModel(QAbstractListModel):
+    '''Model of the conversation history - one row per utterance, drawn by a view only when the row is visible'''
+    def __init__(self, parent = None):
+        '''Initialize transcript model
+        :var rows: list with the speaker (USER or AGENT) and sentence of each utterance
+        '''
+        super().__init__(parent)
+        self.rows = []
+
+    def rowCount(self, parent = QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def data(self, index, role = Qt.DisplayRole):
+        '''Text and alignment of an utterance - user inputs are shown on the right, as in the original labels'''
+        if not index.isValid():
+            return None
+        speaker, sentence = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return sentence + " <<<" if speaker == USER else ">>> " + sentence
+        if role == Qt.TextAlignmentRole:
+            return int((Qt.AlignRight if speaker == USER else Qt.AlignLeft) | Qt.AlignVCenter)
+        return None
+
+    def append(self, speaker, sentence):
+        '''Add an utterance at the end of the conversation'''
+        row = len(self.rows)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.rows.append((speaker, sentence))
+        self.endInsertRows()
+
+    def clear(self):
+        '''Remove every utterance'''
+        self.beginResetModel()
+        self.rows = []
+        self.endResetModel()
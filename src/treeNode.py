@@ -1,20 +1,30 @@
 class TreeNode:
-    def __init__(self, passageId, nextPassageId, sentence, tags, addKnowledge = "", nextNodes = [], role = "", headNode = True):
+    __slots__ = ('passageId', 'nextPassageId', 'sentence', 'tags', 'tagSetId', 'addKnowledge', 'nextNodes', 'role', 'headNode', 'index')
+
+    def __init__(self, passageId, nextPassageId, sentence, tags, tagTable, addKnowledge = "", nextNodes = (), role = "", headNode = True):
         '''Initialize nodes of small dialogue trees (we can say cognitive resources as well)
         :param passageId: node identifier (aux)
         :param nextPassageId: list containing the identifiers of the nodes that follow the current node (aux)
         :param sentence: utterance associated with current node
-        :param tags: list with the context and knowledge base tags of the node
+        :param tags: list with the context and knowledge base tags of the node (stored as a tuple of interned tags)
+        :param tagTable: tag table of the scenario (see tagTable)
         :param addKnowledge: knowledge to be added to the knowledge base given the node
         :param nextNodes: list with node objects that follow current node
         :param role: role associated with current node - can be kept empty if no role found
         :param headNode: bool that indicates if current node is head node of the tree
+        :var tagSetId: id of the set of tags in the scenario's tag table
+        :var index: position of the node in the scenario's list of tree nodes
         '''
         self.passageId = passageId
-        self.nextPassageId = nextPassageId
+        self.nextPassageId = tuple(nextPassageId)
         self.sentence = sentence
-        self.tags = tags
+        self.setTags(tags, tagTable)
         self.addKnowledge = addKnowledge
-        self.nextNodes = nextNodes
+        self.nextNodes = tuple(nextNodes)
         self.role = role
         self.headNode = headNode
+        self.index = -1
+
+    def setTags(self, tags, tagTable):
+        '''Set the tags of the node and the id of their set'''
+        self.tags, self.tagSetId = tagTable.intern(tags)
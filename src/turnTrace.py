@@ -0,0 +1,191 @@
+import argparse
+import struct
+import sys
+import time
+import dialogueEngine
+import metrics
+import scenarioCache
+
+MAGIC = b"SAIT"
+FORMAT_VERSION = 2
+#magic, format version, content hash of the scenario file
+HEADER = struct.Struct("=4sI32s")
+#record type, trace session number, seed, length of the session identifier (followed by the identifier in UTF-8)
+SESSION = struct.Struct("=BIQH")
+#record type, trace session number, user node index, index of the frame the agent chose, agent node index
+TURN = struct.Struct("=BIiii")
+SESSION_RECORD = 1
+TURN_RECORD = 2
+#user node index of a turn where the timeout error was acknowledged, frame index of a turn where the agent chose no frame (it continued
+#a dialogue tree or repeated its sentence), or node index when there is none
+NONE = -1
+
+class TraceFormatError(Exception):
+    '''The file is not a turn trace, or it was recorded with another scenario'''
+
+def scenarioHash(scenario):
+    '''Content hash of the scenario file of a loaded scenario'''
+    sourceHash = getattr(scenario, "sourceHash", None)
+    if sourceHash is None:
+        #a compiled scenario that was reloaded keeps the text it was reloaded from
+        if getattr(scenario, "sourceText", None) is not None:
+            scenario.sourceHash = sourceHash = scenarioCache.hashText(scenario.sourceText)
+            scenario.sourceText = None
+        else:
+            sourceHash = scenarioCache.hashFile(scenario.filename)
+    return sourceHash
+
+class TraceWriter:
+    '''Binary record of the sessions and turns of a dialogue engine - set it as the engine's trace to record them'''
+    def __init__(self, filename, scenario):
+        '''Initialize trace writer
+        :param filename: name of the trace file (overwritten)
+        :param scenario: loaded scenario of the engine - its content hash is written in the header
+        :var sessionNumbers: dictionary with the trace session number of each session identifier
+        '''
+        self.file = open(filename, "wb")
+        self.file.write(HEADER.pack(MAGIC, FORMAT_VERSION, scenarioHash(scenario)))
+        self.sessionNumbers = {}
+
+    def startSession(self, session):
+        '''Record a new session with the seed of its random generator'''
+        if session.seed is None or not isinstance(session.seed, int) or not 0 <= session.seed < 1 << 64:
+            raise ValueError("only sessions with an integer seed between 0 and 2^64 can be recorded")
+        number = self.sessionNumbers[session.sessionId] = len(self.sessionNumbers)
+        sessionId = str(session.sessionId).encode("utf-8")
+        self.file.write(SESSION.pack(SESSION_RECORD, number, session.seed, len(sessionId)))
+        self.file.write(sessionId)
+
+    def recordTurn(self, engine, session, userInputNode, frame):
+        '''Record the user input of a turn and the frame and node of the agent's response
+        :param frame: salient frame the engine chose for the response (None if it chose none)
+        '''
+        self.file.write(TURN.pack(TURN_RECORD, self.sessionNumbers[session.sessionId],
+                                  NONE if userInputNode is None else userInputNode.index,
+                                  NONE if frame is None else frame.index,
+                                  NONE if session.currNode is None else session.currNode.index))
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class ChosenFrame:
+    '''Trace of a replaying engine - it keeps the frame chosen in the last turn instead of writing it'''
+    def __init__(self):
+        self.frame = None
+
+    def startSession(self, session):
+        pass
+
+    def recordTurn(self, engine, session, userInputNode, frame):
+        self.frame = frame
+
+def readTrace(filename):
+    '''Read a trace file
+    :return: scenario content hash and list with the records - ("session", number, seed, session identifier) or ("turn", number, user node, agent frame, agent node)
+    '''
+    with open(filename, "rb") as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        raise TraceFormatError("%s is too short to be a turn trace" % filename)
+    magic, version, sourceHash = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise TraceFormatError("%s is not a turn trace of format version %d" % (filename, FORMAT_VERSION))
+    records = []
+    offset = HEADER.size
+    while offset < len(data):
+        kind = data[offset]
+        if kind == SESSION_RECORD and offset + SESSION.size <= len(data):
+            kind, number, seed, idLength = SESSION.unpack_from(data, offset)
+            offset += SESSION.size
+            records.append(("session", number, seed, data[offset:offset + idLength].decode("utf-8")))
+            offset += idLength
+        elif kind == TURN_RECORD and offset + TURN.size <= len(data):
+            records.append(("turn",) + TURN.unpack_from(data, offset)[1:])
+            offset += TURN.size
+        else:
+            #a trace cut while it was being written ends with an incomplete record
+            break
+    return sourceHash, records
+
+def replayTrace(traceFile, scenario, repeats = 1, turnMetrics = None):
+    '''Re-execute the recorded turns with the recorded seeds and check that the agent gives the same responses
+    :param scenario: loaded scenario - it must be the scenario file the trace was recorded with
+    :param repeats: number of times the trace is re-executed (to time it)
+    :param turnMetrics: Metrics object that records the replayed turns (None to replay without instrumentation)
+    :return: dictionary with the number of sessions and turns, the mismatches (session identifier, turn, recorded and replayed frame and node) and the turns per second
+    A turn that reaches a dead end in the replay is a mismatch with no replayed frame and node - turns that reached a dead end are not recorded,
+    so the replay of the session diverged
+    '''
+    sourceHash, records = readTrace(traceFile)
+    if sourceHash != scenarioHash(scenario):
+        raise TraceFormatError("%s was recorded with another version of %s" % (traceFile, scenario.filename))
+    engine = dialogueEngine.DialogueEngine(scenario)
+    if turnMetrics is not None:
+        turnMetrics.instrument(engine)
+    treeNodes = scenario.treeNodes
+    chosen = ChosenFrame()
+    mismatches = []
+    numTurns = 0
+    start = time.perf_counter()
+    for r in range(repeats):
+        #the chosen frames are only compared in the first execution
+        engine.trace = chosen if r == 0 else None
+        sessions = {}
+        turns = {}
+        for record in records:
+            if record[0] == "session":
+                kind, number, seed, sessionId = record
+                sessions[number] = engine.start_session(sessionId, seed)
+                turns[number] = 0
+                continue
+            kind, number, userNode, agentFrame, agentNode = record
+            session = sessions[number]
+            chosen.frame = None
+            try:
+                if userNode == NONE:
+                    session.timeoutActive = True
+                    engine.respondNode(session, None)
+                else:
+                    engine.respondNode(session, treeNodes[userNode])
+                deadEnd = False
+            except dialogueEngine.DeadEndError:
+                deadEnd = True
+            numTurns += 1
+            if r == 0:
+                if deadEnd:
+                    replayed = (NONE, NONE)
+                else:
+                    replayed = (NONE if chosen.frame is None else chosen.frame.index, NONE if session.currNode is None else session.currNode.index)
+                if replayed != (agentFrame, agentNode):
+                    mismatches.append((session.sessionId, turns[number], (agentFrame, agentNode), replayed))
+            turns[number] += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "sessions": sum(1 for record in records if record[0] == "session"),
+        "turns": numTurns // repeats,
+        "mismatches": mismatches,
+        "seconds": elapsed,
+        "turnsPerSecond": numTurns / elapsed if elapsed > 0 else 0.0,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Replay a turn trace without the user interface and check the agent's responses")
+    parser.add_argument("trace", help = "turn trace file")
+    parser.add_argument("scenario", help = "scenario JSON file the trace was recorded with")
+    parser.add_argument("-r", "--repeats", type = int, default = 1, help = "number of times the trace is re-executed")
+    parser.add_argument("--metrics", help = "write the per-stage metrics of the replay to this file (Prometheus text format)")
+    args = parser.parse_args()
+    scenario = scenarioCache.CompiledScenario(args.scenario)
+    turnMetrics = metrics.Metrics() if args.metrics else None
+    result = replayTrace(args.trace, scenario, args.repeats, turnMetrics)
+    if turnMetrics is not None:
+        turnMetrics.recordLoad(scenario)
+        turnMetrics.writeFile(args.metrics)
+    print("%d sessions, %d turns, %.0f turns/s" % (result["sessions"], result["turns"], result["turnsPerSecond"]))
+    for sessionId, turn, recorded, replayed in result["mismatches"][:20]:
+        print("mismatch in session %s turn %d: recorded frame %d node %d, replayed frame %d node %d" % ((sessionId, turn) + recorded + replayed))
+    print("mismatches: %d" % len(result["mismatches"]))
+    sys.exit(0 if len(result["mismatches"]) == 0 else 1)
@@ -0,0 +1,156 @@
+import html
+import json
+import multiprocessing
+import os
+import re
+import time
+import scenarioCache
+
+#elements and attributes of a story published by Twine 2
+STORY = re.compile(r"<tw-storydata\b([^>]*)>(.*?)</tw-storydata>", re.S)
+PASSAGE = re.compile(r"<tw-passagedata\b([^>]*)>(.*?)</tw-passagedata>", re.S)
+ATTRIBUTE = re.compile(r"([\w-]+)\s*=\s*(?:\"([^\"]*)\"|'([^']*)')")
+#Twison's rules - links and props are found in the passage text as the browser gives it (innerHTML, so "->" is "-&gt;")
+LINK = re.compile(r"\[\[.+?\]\]")
+ARROW_LINK = re.compile(r"\[\[(.*?)-&gt;(.*?)\]\]")
+PROP = re.compile(r"\{\{([\s\S]+?)\}\}([\s\S]+?)\{\{/\1\}\}")
+NEWLINES = re.compile(r"\r\n|\n|\r")
+STORY_ATTRIBUTES = ("name", "startnode", "creator", "creator-version", "ifid")
+PASSAGE_ATTRIBUTES = ("name", "pid", "position", "tags")
+MANIFEST = ".twine-manifest.json"
+
+def attributes(text):
+    '''Dictionary with the (unescaped) attributes of an element'''
+    return {m.group(1): html.unescape(m.group(2) if m.group(2) is not None else m.group(3)) for m in ATTRIBUTE.finditer(text)}
+
+def innerHtml(text):
+    '''Text of a passage as serialized by the browser - Twine escapes it in the file, the browser escapes only &, < and >'''
+    return html.escape(html.unescape(text), quote = False).replace("\xa0", "&nbsp;")
+
+def extractLinks(text):
+    '''Links of a passage text ([[name]] or [[name->link]]) - None if it has none'''
+    links = []
+    for l in LINK.findall(text):
+        m = ARROW_LINK.match(l)
+        if m is not None:
+            links.append({"name": m.group(1), "link": m.group(2)})
+        else:
+            links.append({"name": l[2:-2], "link": l[2:-2]})
+    return links if links else None
+
+def extractProps(text):
+    '''Props of a passage text ({{key}}value{{/key}}, values without line breaks and possibly nested) - None if it has none'''
+    props = {}
+    for m in PROP.finditer(text):
+        value = NEWLINES.sub("", m.group(2))
+        nested = extractProps(value)
+        props[m.group(1)] = nested if nested is not None else value
+    return props if props else None
+
+def convertPassage(attrs, text):
+    '''Twison passage of a tw-passagedata element'''
+    passage = {"text": text}
+    links = extractLinks(text)
+    if links is not None:
+        passage["links"] = links
+    props = extractProps(text)
+    if props is not None:
+        passage["props"] = props
+    for name in PASSAGE_ATTRIBUTES:
+        if attrs.get(name):
+            passage[name] = attrs[name]
+    if "position" in passage:
+        x, y = (passage["position"].split(",") + [""])[:2]
+        passage["position"] = {"x": x, "y": y}
+    if "tags" in passage:
+        passage["tags"] = passage["tags"].split(" ")
+    return passage
+
+def readStory(filename):
+    '''Read a story published by Twine 2 (HTML) as the JSON given by Twison - the dictionary read by ReadFile from a scenario JSON file'''
+    with open(filename, encoding = "utf-8") as f:
+        content = f.read()
+    m = STORY.search(content)
+    if m is None:
+        raise ValueError("%s has no tw-storydata element" % filename)
+    storyAttrs = attributes(m.group(1))
+    passages = [convertPassage(attributes(p.group(1)), innerHtml(p.group(2))) for p in PASSAGE.finditer(m.group(2))]
+    story = {"passages": passages}
+    for name in STORY_ATTRIBUTES:
+        if storyAttrs.get(name):
+            story[name] = storyAttrs[name]
+    #links refer to passages by name - broken links have no pid
+    pids = {}
+    for p in passages:
+        pids[p.get("name")] = p.get("pid")
+    for p in passages:
+        for l in p.get("links", ()):
+            pid = pids.get(l["link"])
+            if pid is not None:
+                l["pid"] = pid
+            else:
+                l["broken"] = True
+    return story
+
+def compileStory(filename, output):
+    '''Convert a Twine story to a scenario JSON file and compile its cache (one task of compileDirectory)
+    :return: dictionary with the number of passages and the duration, or with the error if the story could not be compiled
+    '''
+    start = time.perf_counter()
+    try:
+        story = readStory(filename)
+        tmp = "%s.%d.tmp" % (output, os.getpid())
+        with open(tmp, "w", encoding = "utf-8") as f:
+            json.dump(story, f, indent = 2, ensure_ascii = False)
+        os.replace(tmp, output)
+        scenario = scenarioCache.CompiledScenario(output)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        return {"error": "%s: %s" % (type(e).__name__, e)}
+    return {"passages": len(story["passages"]), "frames": len(scenario.frames), "resources": len(scenario.treeNodes),
+            "seconds": time.perf_counter() - start}
+
+def compileDirectory(directory, outputDir = None, workers = None, force = False):
+    '''Convert the Twine stories (.html) of a directory to scenario JSON files, in parallel - stories that did not change since the last run are skipped
+    The content hash of each converted story is kept in a manifest file in the output directory
+    :param outputDir: directory of the scenario JSON files (the story's directory by default)
+    :param workers: number of processes (one per CPU by default)
+    :param force: bool that indicates if unchanged stories are converted too
+    :return: dictionary with the result of each story file name - "skipped" for unchanged stories (see compileStory)
+    '''
+    outputDir = outputDir if outputDir is not None else directory
+    os.makedirs(outputDir, exist_ok = True)
+    manifestFile = os.path.join(outputDir, MANIFEST)
+    try:
+        with open(manifestFile, encoding = "utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    results = {}
+    tasks = []
+    hashes = {}
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith((".html", ".htm")):
+            continue
+        filename = os.path.join(directory, name)
+        output = os.path.join(outputDir, os.path.splitext(name)[0] + ".json")
+        hashes[name] = scenarioCache.hashFile(filename).hex()
+        if not force and manifest.get(name) == hashes[name] and os.path.exists(output):
+            results[name] = "skipped"
+        else:
+            tasks.append((name, filename, output))
+    if len(tasks) > 1 and (workers is None or workers > 1):
+        with multiprocessing.Pool(min(workers or os.cpu_count() or 1, len(tasks))) as pool:
+            compiled = pool.starmap(compileStory, [(filename, output) for name, filename, output in tasks])
+    else:
+        compiled = [compileStory(filename, output) for name, filename, output in tasks]
+    for (name, filename, output), result in zip(tasks, compiled):
+        results[name] = result
+        if "error" in result:
+            manifest.pop(name, None)
+        else:
+            manifest[name] = hashes[name]
+    tmp = manifestFile + ".tmp"
+    with open(tmp, "w", encoding = "utf-8") as f:
+        json.dump(manifest, f, indent = 2, sort_keys = True)
+    os.replace(tmp, manifestFile)
+    return results
@@ -0,0 +1,101 @@
+import json
+
+#passage fields used by ReadFile - text, position and the names of the links are dropped while streaming
+PASSAGE_FIELDS = ('name', 'pid', 'tags', 'props')
+
+class TwisonStream:
+    '''Class to walk the passages of a Twison JSON file one at a time, without loading the whole file'''
+    def __init__(self, filename, chunkSize = 1 << 16):
+        '''Initialize Twison stream
+        :param filename: name of the scenario file
+        :param chunkSize: number of characters read from the file at a time
+        :var buffer: characters read from the file that were not yet decoded, starting at index pos
+        '''
+        self.filename = filename
+        self.chunkSize = chunkSize
+        self.decoder = json.JSONDecoder()
+        self.file = None
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def passages(self):
+        '''Generator of the passages of the scenario, keeping only the fields used by ReadFile'''
+        with open(self.filename, encoding = "utf-8") as self.file:
+            self.buffer = ""
+            self.pos = 0
+            self.eof = False
+            self.expect("{")
+            while self.peek() != "}":
+                key = self.value()
+                self.expect(":")
+                if key == "passages":
+                    yield from self.passageArray()
+                else:
+                    self.value() #story attributes (name, ifid, ...) are not used
+                if self.peek() == ",":
+                    self.pos += 1
+            self.expect("}")
+
+    def passageArray(self):
+        '''Decode the passages array one passage at a time'''
+        self.expect("[")
+        while self.peek() != "]":
+            passage = self.value()
+            yield self.trimPassage(passage)
+            del passage
+            if self.peek() == ",":
+                self.pos += 1
+        self.expect("]")
+
+    def trimPassage(self, passage):
+        '''Copy of the passage with only the fields used by ReadFile'''
+        trimmed = {}
+        for field in PASSAGE_FIELDS:
+            if field in passage:
+                trimmed[field] = passage[field]
+        if 'links' in passage:
+            #a link without pid raises KeyError, as when ReadFile reads the whole file
+            trimmed['links'] = [{'pid': l['pid']} for l in passage['links']]
+        return trimmed
+
+    def fill(self):
+        '''Read more characters from the file, discarding the characters already decoded - reads grow with the buffer so that a large value is decoded a bounded number of times'''
+        chunk = self.file.read(max(self.chunkSize, len(self.buffer) - self.pos))
+        if chunk == "":
+            self.eof = True
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+
+    def peek(self):
+        '''Next character that is not white space (empty string at the end of the file)'''
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\n\r":
+                self.pos += 1
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos + 1]
+            self.fill()
+
+    def expect(self, character):
+        '''Consume the next character that is not white space, which must be the given one'''
+        if self.peek() != character:
+            raise ValueError("%s: expected '%s' at '%s'" % (self.filename, character, self.buffer[self.pos:self.pos + 20]))
+        self.pos += 1
+
+    def value(self):
+        '''Decode the JSON value that starts at the current position, reading more of the file while it is incomplete'''
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self.fill()
+                continue
+            #a number could continue in the next chunk ("1" of "12", or "1" of "1.25" when the buffer ends with "1.")
+            if not self.eof and (end == len(self.buffer) or isinstance(obj, (int, float)) and self.buffer[end] in ".eE"):
+                self.fill()
+                continue
+            self.pos = end
+            return obj
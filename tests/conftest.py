@@ -0,0 +1,26 @@
+import os
+import sys
+
+#the modules of the application are imported as they are from the "src" folder
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+SCENARIOS = os.path.join(os.path.dirname(SRC), "scenarios")
+sys.path.insert(0, SRC)
+
+def graph(scenario):
+    '''Comparable description of a loaded scenario - objects are referred to by their position, so a patched scenario and a scenario
+    read again from the same file give the same description'''
+    frames = {f: i for i, f in enumerate(scenario.frames)}
+    nodes = {n: i for i, n in enumerate(scenario.treeNodes)}
+    description = [scenario.userRole, scenario.agentRole, scenario.timeoutCondition]
+    for i, n in enumerate(scenario.treeNodes):
+        assert n.index == i and scenario.nodesByPid[n.passageId] is n
+        description.append((n.passageId, n.sentence, list(n.tags), n.role, n.addKnowledge, n.headNode, [nodes[x] for x in n.nextNodes]))
+    for i, f in enumerate(scenario.frames):
+        assert f.index == i
+        description.append((list(f.passageId), list(f.nextPassageId), list(f.tags), f.startFrame,
+                            [(frames[nf], freq) for nf, freq in f.nextFrames.items()], [nodes[n] for n in f.cognitiveResources],
+                            {role: [nodes[n] for n in resources] for role, resources in f.roleResources.items()}))
+    for ctx in [f.tags for f in scenario.frames] + [["timeout"], []]:
+        current = scenario.frameIndex.currentFrame(ctx)
+        description.append(None if current is None else frames[current])
+    return description
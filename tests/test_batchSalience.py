@@ -0,0 +1,77 @@
+import json
+import os
+import random
+import pytest
+pytest.importorskip("numpy")
+import batchSalience
+import benchmarkSalience
+import dialogueEngine
+import readFile
+import scenarioGenerator
+import scenarioWatcher
+
+@pytest.fixture
+def scenarioFile(tmp_path):
+    '''Generated scenario whose frames have many next frames, so sessions often tie between frames'''
+    filename = str(tmp_path / "scenario.json")
+    scenarioGenerator.ScenarioGenerator(200, knowledgeTags = 8, frameCopies = 8, seed = 1).write(filename)
+    return filename
+
+def assertSameTies(engine, batch, sessions, currFrames):
+    scalar = [engine.salienceFrames(s, f) for s, f in zip(sessions, currFrames)]
+    assert batch.salienceFrames([s.knowledgeBase for s in sessions], currFrames) == scalar
+
+def test_tie_sets_match_scalar(scenarioFile):
+    engine = dialogueEngine.DialogueEngine(readFile.ReadFile(scenarioFile))
+    sessions, currFrames = benchmarkSalience.sessionStates(engine, 300, random.Random(0))
+    assertSameTies(engine, batchSalience.BatchSalience(engine.scenario), sessions, currFrames)
+
+def test_respond_batch_matches_respond(scenarioFile):
+    scenario = readFile.ReadFile(scenarioFile)
+    scalarEngine = dialogueEngine.DialogueEngine(scenario)
+    batchEngine = dialogueEngine.DialogueEngine(scenario)
+    batch = batchSalience.BatchSalience(scenario)
+    scalarSessions = [scalarEngine.start_session(seed = i) for i in range(50)]
+    batchSessions = [batchEngine.start_session(seed = i) for i in range(50)]
+    rand = random.Random(0)
+    for turn in range(20):
+        active = [i for i, s in enumerate(scalarSessions) if scalarEngine.user_options(s)]
+        if not active:
+            break
+        choices = [rand.choice(scalarEngine.user_options(scalarSessions[i])).passageId for i in active]
+        expected = []
+        for i, pid in zip(active, choices):
+            try:
+                expected.append(scalarEngine.respond(scalarSessions[i], pid))
+            except dialogueEngine.DeadEndError:
+                expected.append(None)
+        assert batchEngine.respond_batch([batchSessions[i] for i in active], choices, batch) == expected
+        for i in active:
+            assert batchSessions[i].currNode is scalarSessions[i].currNode
+            assert list(batchSessions[i].currSocialCtx) == list(scalarSessions[i].currSocialCtx)
+
+def test_tables_follow_reload(scenarioFile):
+    scenario = readFile.ReadFile(scenarioFile)
+    engine = dialogueEngine.DialogueEngine(scenario)
+    watcher = scenarioWatcher.ScenarioWatcher(scenario, interval = 0)
+    watcher.attach(engine)
+    batch = batchSalience.BatchSalience(scenario)
+    rand = random.Random(0)
+    sessions, currFrames = benchmarkSalience.sessionStates(engine, 100, rand)
+    assertSameTies(engine, batch, sessions, currFrames)
+    #every frame passage is linked to other frames
+    with open(scenarioFile, encoding = "utf-8") as f:
+        data = json.load(f)
+    framePids = [p["pid"] for p in data["passages"] if "frame" in p["tags"]]
+    for p in data["passages"]:
+        if "frame" in p["tags"]:
+            p["links"] = [{"pid": pid} for pid in rand.sample(framePids, 3)]
+    with open(scenarioFile, "w", encoding = "utf-8") as f:
+        json.dump(data, f)
+    st = os.stat(scenarioFile)
+    os.utime(scenarioFile, ns = (st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert watcher.poll()
+    currFrames = [engine.getCurrentFrame(s.currSocialCtx) for s in sessions]
+    assert all(f is not None for f in currFrames)
+    assertSameTies(engine, batch, sessions, currFrames)
+    assert batch.version == scenario.version
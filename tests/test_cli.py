@@ -0,0 +1,56 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import pytest
+from conftest import SRC, SCENARIOS
+
+@pytest.fixture
+def scenarioFile(tmp_path):
+    #a copy of the example scenario - its compiled cache is written next to it
+    filename = str(tmp_path / "anamnesis_agentDoctor.json")
+    shutil.copy(os.path.join(SCENARIOS, "JSON", "anamnesis_agentDoctor.json"), filename)
+    return filename
+
+def run(tmp_path, *args, stdin = ""):
+    '''Run the command line in a new process, as a user does'''
+    return subprocess.run([sys.executable, os.path.join(SRC, "cli.py")] + list(args), input = stdin, capture_output = True, text = True,
+                          cwd = str(tmp_path), timeout = 120)
+
+def test_play(tmp_path, scenarioFile):
+    result = run(tmp_path, "play", scenarioFile, "--seed", "1", stdin = "1\n1\n1\nq\n")
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.count(">>> ") >= 1 and "1) " in result.stdout
+
+def test_play_ends_at_end_of_input(tmp_path, scenarioFile):
+    result = run(tmp_path, "play", scenarioFile, "--seed", "1", stdin = "1\n")
+    assert result.returncode == 0, result.stderr
+
+def test_bench(tmp_path, scenarioFile):
+    result = run(tmp_path, "bench", scenarioFile, "--turns", "200", "--dialogues", "20", "--json", "bench.json")
+    assert result.returncode == 0, result.stderr
+    with open(str(tmp_path / "bench.json")) as f:
+        bench = json.load(f)
+    assert bench["latencyUs"]["respond"]["count"] > 0 and bench["dialoguesPerSecond"] > 0
+
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_simulate(tmp_path, scenarioFile, workers):
+    result = run(tmp_path, "simulate", scenarioFile, "-n", "200", "-t", "20", "-w", workers, "--timeout-rate", "0.1", "--json", "simulation.json")
+    assert result.returncode == 0, result.stderr
+    with open(str(tmp_path / "simulation.json")) as f:
+        simulation = json.load(f)
+    assert simulation["dialogues"] == 200 and simulation["turns"] > 0
+    assert "unreachable frames" in result.stdout
+
+def test_engine_does_not_import_qt(tmp_path):
+    code = "import sys; sys.path.insert(0, %r); import cli, dialogueEngine, scenarioCache; assert 'PyQt5' not in sys.modules" % SRC
+    result = subprocess.run([sys.executable, "-c", code], capture_output = True, text = True, cwd = str(tmp_path), timeout = 60)
+    assert result.returncode == 0, result.stderr
+
+def test_simulator_script_runs_the_simulate_command(tmp_path, scenarioFile):
+    result = subprocess.run([sys.executable, os.path.join(SRC, "simulator.py"), scenarioFile, "-n", "50", "-w", "1", "--json", "simulation.json"],
+                            capture_output = True, text = True, cwd = str(tmp_path), timeout = 120)
+    assert result.returncode == 0, result.stderr
+    with open(str(tmp_path / "simulation.json")) as f:
+        assert json.load(f)["dialogues"] == 50
@@ -0,0 +1,98 @@
+import json
+import os
+import random
+import shutil
+import pytest
+from conftest import SCENARIOS
+import deliberationCache
+import dialogueEngine
+import readFile
+import scenarioGenerator
+import scenarioWatcher
+
+DOCTOR = os.path.join(SCENARIOS, "JSON", "anamnesis_agentDoctor.json")
+
+@pytest.fixture(params = ["doctor", "generated"])
+def scenario(request, tmp_path):
+    if request.param == "doctor":
+        return readFile.ReadFile(DOCTOR)
+    filename = str(tmp_path / "scenario.json")
+    scenarioGenerator.ScenarioGenerator(100, tagsPerFrame = 2, frameCopies = 3, timeoutFrame = True, seed = 4).write(filename)
+    return readFile.ReadFile(filename)
+
+def conversations(engine, numSessions, seed):
+    '''Random conversations, with some timeouts - the user's choices are made by a generator of their own'''
+    rand = random.Random(seed)
+    transcripts = []
+    for i in range(numSessions):
+        session = engine.start_session(seed = i)
+        transcript = []
+        for turn in range(30):
+            options = engine.user_options(session)
+            if len(options) == 0:
+                break
+            try:
+                if session.currNode is not None and engine.scenario.timeoutCondition > 0 and rand.random() < 0.1:
+                    transcript.append(("timeout", engine.timeout_expired(session)))
+                else:
+                    node = rand.choice(options)
+                    transcript.append((node.passageId, engine.respond(session, node.passageId)))
+            except dialogueEngine.DeadEndError:
+                transcript.append("dead end")
+                break
+        transcripts.append(transcript)
+    return transcripts
+
+def test_seeded_conversations_do_not_change(scenario):
+    engine = dialogueEngine.DialogueEngine(scenario)
+    expected = conversations(engine, 50, 0)
+    engine.cache = deliberationCache.DeliberationCache()
+    assert conversations(engine, 50, 0) == expected
+    assert engine.cache.hits > 0
+    #a cache too small for the conversations evicts results and computes them again
+    engine.cache = deliberationCache.DeliberationCache(capacity = 2)
+    assert conversations(engine, 50, 0) == expected
+
+def test_least_recently_used_is_evicted(scenario):
+    engine = dialogueEngine.DialogueEngine(scenario)
+    cache = engine.cache = deliberationCache.DeliberationCache(capacity = 8)
+    conversations(engine, 50, 1)
+    assert len(cache) == 8 and cache.evictions > 0
+    assert cache.misses == len(cache) + cache.evictions
+    computed = []
+    cache.lookup(engine, "a", lambda: computed.append("a") or "a")
+    cache.lookup(engine, "b", lambda: computed.append("b") or "b")
+    for i in range(6):
+        cache.lookup(engine, i, lambda: i)
+    #"a" is used again, so "b" is the least recently used result
+    assert cache.lookup(engine, "a", lambda: computed.append("a") or "a") == "a"
+    cache.lookup(engine, "c", lambda: "c")
+    assert len(cache) == 8 and "b" not in cache.entries and "a" in cache.entries
+    assert computed == ["a", "b"]
+
+def test_reload_discards_results(tmp_path):
+    filename = str(tmp_path / "scenario.json")
+    shutil.copy(DOCTOR, filename)
+    scenario = readFile.ReadFile(filename)
+    engine = dialogueEngine.DialogueEngine(scenario)
+    watcher = scenarioWatcher.ScenarioWatcher(scenario, interval = 0)
+    watcher.attach(engine)
+    cache = engine.cache = deliberationCache.DeliberationCache()
+    conversations(engine, 20, 2)
+    assert len(cache) > 0 and cache.version == 0
+    #the start options are said differently
+    with open(filename, encoding = "utf-8") as f:
+        data = json.load(f)
+    session = engine.start_session(seed = 0)
+    starts = set(n.passageId for n in engine.user_options(session))
+    for p in data["passages"]:
+        if p.get("pid") in starts:
+            p["name"] += " (edited)"
+    with open(filename, "w", encoding = "utf-8") as f:
+        json.dump(data, f)
+    st = os.stat(filename)
+    os.utime(filename, ns = (st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert watcher.poll() and scenario.version == 1
+    options = engine.user_options(session)
+    assert cache.version == 1 and len(cache) == 1
+    assert options and all(n.sentence.endswith(" (edited)") and scenario.nodesByPid[n.passageId] is n for n in options)
@@ -0,0 +1,51 @@
+import os
+import shutil
+from conftest import SCENARIOS, graph
+import dialogueEngine
+import dialogueServer
+import readFile
+import scenarioCache
+
+DOCTOR = os.path.join(SCENARIOS, "JSON", "anamnesis_agentDoctor.json")
+
+def test_workers_map_the_compiled_cache(tmp_path, monkeypatch):
+    filename = str(tmp_path / "scenario.json")
+    shutil.copy(DOCTOR, filename) #not compiled yet - the server compiles it and maps the cache it wrote
+    forked = []
+    monkeypatch.setattr(dialogueServer.DialogueServer, "spawn", lambda server: forked.append(server.workerEngine()))
+    server = dialogueServer.DialogueServer(filename, numWorkers = 2)
+    server.start()
+    scenario = server.scenario
+    assert scenario.fromCache and isinstance(scenario.treeNodes, scenarioCache.LazyNodes)
+    assert len(forked) == 2
+    for engine in forked:
+        #each worker reads the same map, with its own frames and lazily created tree nodes
+        workerScenario = engine.scenario
+        assert workerScenario.treeNodes.mm is scenario.treeNodes.mm
+        assert not set(workerScenario.frames) & set(scenario.frames)
+        assert all(n is None for n in workerScenario.treeNodes.nodes)
+        assert graph(workerScenario) == graph(readFile.ReadFile(filename))
+    assert all(n is None for n in scenario.treeNodes.nodes)
+
+def test_scaling_test_serves_each_worker_count(tmp_path):
+    filename = str(tmp_path / "scenario.json")
+    shutil.copy(DOCTOR, filename)
+    results = dialogueServer.scalingTest(filename, [1, 2], numSessions = 20, concurrency = 2, maxTurns = 10)
+    assert [r["workers"] for r in results] == [1, 2]
+    for r in results:
+        assert r["errors"] == 0 and r["requests"] > 0 and len(r["stats"]) == r["workers"]
+
+def test_reply_builds_options_once(monkeypatch):
+    engine = dialogueEngine.DialogueEngine(readFile.ReadFile(DOCTOR))
+    worker = dialogueServer.DialogueWorker(engine, maxSessions = 10)
+    built = []
+    userOptions = engine.user_options
+    monkeypatch.setattr(engine, "user_options", lambda session: built.append(session) or userOptions(session))
+    status, payload = worker.handle("POST", "/sessions/a?seed=0", b"")
+    assert status == 201 and len(built) == 1
+    for turn in range(5):
+        status, payload = worker.handle("POST", "/sessions/a/respond?option=%s" % payload["options"][0]["id"], b"")
+        assert status == 200 and payload["response"] is not None
+        assert len(built) == turn + 2
+    status, payload = worker.handle("POST", "/sessions/a/respond?option=nothing", b"")
+    assert status == 400 and len(built) == 6
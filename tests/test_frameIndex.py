@@ -0,0 +1,43 @@
+import array
+import random
+import pytest
+import benchmarkFrameIndex
+import knowledgeBase
+import readFile
+import scenarioGenerator
+
+@pytest.fixture(params = [(300, 1), (300, 3), (1000, 2)])
+def scenario(request, tmp_path):
+    '''Generated scenario - each frame has its own rare tag, and shared tags that many frames have'''
+    filename = str(tmp_path / "scenario.json")
+    numFrames, tagsPerFrame = request.param
+    scenarioGenerator.ScenarioGenerator(numFrames, treesPerFrame = 1, frameCopies = 2, tagsPerFrame = tagsPerFrame, knowledgeTags = 6, seed = 5).write(filename)
+    return readFile.ReadFile(filename)
+
+def test_current_frame_matches_scan(scenario):
+    postings = scenario.frameIndex.postings.values()
+    #common tags are bitsets and rare tags sorted arrays - both are looked up
+    assert any(isinstance(p, int) for p in postings) and any(isinstance(p, array.array) for p in postings)
+    ctxs = set(tuple(ctx) for ctx in benchmarkFrameIndex.contexts(scenario, random.Random(0), 500))
+    for ctx in ctxs:
+        expected = benchmarkFrameIndex.scanCurrentFrame(scenario.frames, ctx)
+        assert scenario.frameIndex.currentFrame(ctx) is expected
+        #a second lookup is answered by the cache
+        assert scenario.frameIndex.currentFrame(ctx) is expected
+
+def test_knowledge_matches_after_removals(scenario):
+    rand = random.Random(1)
+    tags = sorted(set(t for f in scenario.frames for t in f.tags)) + ["unknownTag"]
+    kb = knowledgeBase.KnowledgeBase(scenario, capacity = 8)
+    for i in range(300):
+        if len(kb) and rand.random() < 0.4:
+            kb.discard(rand.choice(list(kb)))
+        else:
+            kb.add(rand.choice(tags))
+        expected = {}
+        for f in scenario.frames:
+            n = sum(1 for t in kb if t in f.tags)
+            if n:
+                expected[f] = n
+        assert kb.frameMatches() == expected
+        assert kb.key() == frozenset(t for t in kb if any(t in f.tags for f in scenario.frames))
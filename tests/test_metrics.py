@@ -0,0 +1,141 @@
+import collections
+import json
+import os
+import random
+import re
+import pytest
+from conftest import SCENARIOS
+import dialogueEngine
+import metrics
+import readFile
+import scenarioGenerator
+
+NAME = r"[a-zA-Z_:][a-zA-Z0-9_:]*"
+SAMPLE = re.compile(r"(%s)(?:\{(.*)\})? (\S+)$" % NAME)
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"(,|$)')
+TYPES = ("counter", "gauge", "histogram", "summary", "untyped")
+
+def parseExposition(text):
+    '''Check a Prometheus text exposition and parse it
+    :return: dictionary with the type and the samples (name, labels, value) of each metric family
+    '''
+    assert text.endswith("\n")
+    families = {}
+    current = currentName = None
+    for line in text[:-1].split("\n"):
+        if line.startswith("# HELP "):
+            name, help = line[7:].split(" ", 1)
+            assert re.fullmatch(NAME, name) and help
+            continue
+        if line.startswith("# TYPE "):
+            name, kind = line[7:].split(" ")
+            assert re.fullmatch(NAME, name) and kind in TYPES and name not in families
+            current = families[name] = {"type": kind, "samples": []}
+            currentName = name
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        name, labelText, value = match.groups()
+        labels = {}
+        position = 0
+        while labelText and position < len(labelText):
+            label = LABEL.match(labelText, position)
+            assert label and label.group(1) not in labels, labelText
+            labels[label.group(1)] = re.sub(r"\\(.)", lambda m: "\n" if m.group(1) == "n" else m.group(1), label.group(2))
+            position = label.end()
+        #the samples of a family follow its TYPE line
+        assert current is not None, line
+        suffixes = ("_bucket", "_sum", "_count") if current["type"] == "histogram" else ("",)
+        assert name in [currentName + s for s in suffixes], line
+        current["samples"].append((name, labels, float(value)))
+    for name, family in families.items():
+        if family["type"] == "histogram":
+            checkHistogram(name, family["samples"])
+    return families
+
+def checkHistogram(name, samples):
+    '''Buckets of each series are cumulative, end with +Inf and agree with the count'''
+    series = collections.defaultdict(dict)
+    for sampleName, labels, value in samples:
+        key = tuple(sorted((k, v) for k, v in labels.items() if k != "le"))
+        if sampleName == name + "_bucket":
+            series[key].setdefault("buckets", []).append((float(labels["le"]), value))
+        else:
+            assert "le" not in labels
+            series[key][sampleName[len(name):]] = value
+    for key, s in series.items():
+        bounds = [b for b, c in s["buckets"]]
+        counts = [c for b, c in s["buckets"]]
+        assert bounds == sorted(bounds) and bounds[-1] == float("inf")
+        assert counts == sorted(counts) and counts[-1] == s["_count"]
+        assert "_sum" in s
+
+def play(engine, rand, numDialogues = 20, maxTurns = 20):
+    '''Random dialogues with some timeouts'''
+    for d in range(numDialogues):
+        session = engine.start_session(seed = rand.getrandbits(32))
+        for turn in range(maxTurns):
+            options = engine.user_options(session)
+            if not options:
+                break
+            try:
+                if session.currNode is not None and engine.scenario.timeoutCondition > 0 and rand.random() < 0.2:
+                    engine.timeout_expired(session)
+                else:
+                    engine.respond(session, rand.choice(options).passageId)
+            except dialogueEngine.DeadEndError:
+                break
+
+@pytest.fixture(params = ["doctor", "generated"])
+def scenario(request, tmp_path):
+    if request.param == "doctor":
+        return readFile.ReadFile(os.path.join(SCENARIOS, "JSON", "anamnesis_agentDoctor.json"))
+    filename = str(tmp_path / "scenario.json")
+    scenarioGenerator.ScenarioGenerator(50, tagsPerFrame = 2, timeoutFrame = True, seed = 4).write(filename)
+    return readFile.ReadFile(filename)
+
+def test_exposition_is_prometheus_text(scenario):
+    recorded = metrics.Metrics()
+    recorded.recordLoad(scenario)
+    engine = dialogueEngine.DialogueEngine(scenario)
+    recorded.instrument(engine)
+    play(engine, random.Random(0))
+    #label values are escaped
+    recorded.frameSwitches['a "quoted"\\frame\n'] = 1
+    families = parseExposition(recorded.exposition())
+    assert families["dialogue_turns_total"]["samples"] == [("dialogue_turns_total", {}, recorded.turns)]
+    assert ("dialogue_frame_switches_total", {"frame": 'a "quoted"\\frame\n'}, 1.0) in families["dialogue_frame_switches_total"]["samples"]
+    stages = {labels["stage"]: value for name, labels, value in families["dialogue_stage_seconds"]["samples"] if name == "dialogue_stage_seconds_count"}
+    assert recorded.turns > 0 and stages["respondNode"] == recorded.turns
+    assert set(stages) == set(metrics.STAGES + ("respondNode",))
+    sizes = [value for name, labels, value in families["dialogue_knowledge_base_size"]["samples"] if name == "dialogue_knowledge_base_size_count"]
+    assert sizes == [recorded.turns]
+    assert {labels["phase"] for name, labels, value in families["scenario_load_phase_seconds"]["samples"]} == set(scenario.loadSeconds)
+
+def test_empty_metrics_are_prometheus_text():
+    families = parseExposition(metrics.Metrics().exposition())
+    assert families["dialogue_turns_total"]["samples"] == [("dialogue_turns_total", {}, 0.0)]
+
+def test_merge_adds_counts(scenario):
+    workers = [metrics.Metrics(), metrics.Metrics()]
+    for seed, recorded in enumerate(workers):
+        engine = dialogueEngine.DialogueEngine(scenario)
+        recorded.instrument(engine)
+        play(engine, random.Random(seed))
+    total = metrics.Metrics()
+    for recorded in workers:
+        #the server sends the states of the workers as JSON
+        total.merge(json.loads(json.dumps(recorded.state())))
+    for name in ("switches", "frameChoices", "turns", "continuations", "timeouts", "repetitions"):
+        assert getattr(total, name) == sum(getattr(w, name) for w in workers)
+    assert total.turns > 0 and total.timeouts > 0
+    assert collections.Counter(total.frameSwitches) == sum((collections.Counter(w.frameSwitches) for w in workers), collections.Counter())
+    for name, histogram in total.stages.items():
+        assert histogram.counts == [sum(c) for c in zip(*(w.stages[name].counts for w in workers))]
+        assert histogram.count == sum(w.stages[name].count for w in workers)
+        assert histogram.sum == pytest.approx(sum(w.stages[name].sum for w in workers))
+    assert total.knowledgeBaseSize.counts == [sum(c) for c in zip(*(w.knowledgeBaseSize.counts for w in workers))]
+    #merging into metrics that recorded turns themselves
+    workers[0].merge(workers[1].state())
+    assert workers[0].state() == total.state()
+    parseExposition(total.exposition())
@@ -0,0 +1,76 @@
+import os
+import shutil
+import pytest
+from conftest import SCENARIOS, graph
+import dialogueEngine
+import readFile
+import scenarioCache
+
+DOCTOR = os.path.join(SCENARIOS, "JSON", "anamnesis_agentDoctor.json")
+PATIENT = os.path.join(SCENARIOS, "JSON", "anamnesis_agentPatient.json")
+
+@pytest.fixture
+def scenarioFile(tmp_path):
+    '''Copy of the doctor scenario, modified a few seconds ago (a cache written now is not in the same clock tick)'''
+    filename = str(tmp_path / "scenario.json")
+    shutil.copy(DOCTOR, filename)
+    past = os.stat(filename).st_mtime_ns - 5 * 10 ** 9
+    os.utime(filename, ns = (past, past))
+    return filename
+
+def touch(filename, seconds = 1):
+    st = os.stat(filename)
+    os.utime(filename, ns = (st.st_atime_ns, st.st_mtime_ns + seconds * 10 ** 9))
+
+def test_cache_reads_like_json(scenarioFile):
+    compiled = scenarioCache.CompiledScenario(scenarioFile)
+    assert not compiled.fromCache
+    cached = scenarioCache.CompiledScenario(scenarioFile)
+    assert cached.fromCache and not cached.hashed
+    assert cached.sourceHash == compiled.sourceHash == scenarioCache.hashFile(scenarioFile)
+    assert graph(cached) == graph(readFile.ReadFile(scenarioFile))
+
+def test_nodes_are_created_when_used(scenarioFile):
+    scenarioCache.CompiledScenario(scenarioFile)
+    cached = scenarioCache.CompiledScenario(scenarioFile)
+    created = lambda: sum(1 for n in cached.treeNodes.nodes if n is not None)
+    assert created() == 0
+    engine = dialogueEngine.DialogueEngine(cached)
+    session = engine.start_session(seed = 0)
+    option = engine.user_options(session)[0]
+    assert 0 < created() < len(cached.treeNodes)
+    #a node is always the same object, however it is reached
+    assert cached.treeNodes[option.index] is option and cached.nodesByPid[option.passageId] is option
+    engine.respond(session, option.passageId)
+
+def test_touched_file_is_hashed_once(scenarioFile):
+    scenarioCache.CompiledScenario(scenarioFile)
+    touch(scenarioFile)
+    cached = scenarioCache.CompiledScenario(scenarioFile)
+    assert cached.fromCache and cached.hashed
+    cached = scenarioCache.CompiledScenario(scenarioFile)
+    assert cached.fromCache and not cached.hashed
+
+def test_edited_file_is_compiled_again(scenarioFile):
+    scenarioCache.CompiledScenario(scenarioFile)
+    with open(scenarioFile, encoding = "utf-8") as f:
+        text = f.read()
+    with open(scenarioFile, "w", encoding = "utf-8") as f:
+        f.write(text.replace("Good morning.", "Good afternoon."))
+    touch(scenarioFile)
+    compiled = scenarioCache.CompiledScenario(scenarioFile)
+    assert not compiled.fromCache
+    assert "Good afternoon." in [n.sentence for n in compiled.treeNodes]
+
+def test_cache_of_another_file_is_not_used(tmp_path):
+    #the example scenarios have the same size, and copies can have the same modification time
+    doctor, patient = str(tmp_path / "doctor.json"), str(tmp_path / "patient.json")
+    shutil.copy(DOCTOR, doctor)
+    shutil.copy(PATIENT, patient)
+    st = os.stat(doctor)
+    os.utime(patient, ns = (st.st_atime_ns, st.st_mtime_ns))
+    cacheFile = str(tmp_path / "shared.cache")
+    scenarioCache.CompiledScenario(doctor, cacheFile)
+    compiled = scenarioCache.CompiledScenario(patient, cacheFile)
+    assert not compiled.fromCache
+    assert graph(compiled) == graph(readFile.ReadFile(patient))
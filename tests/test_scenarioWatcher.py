@@ -0,0 +1,257 @@
+import json
+import os
+import random
+import shutil
+import pytest
+from conftest import SCENARIOS, graph
+import dialogueEngine
+import readFile
+import scenarioCache
+import scenarioGenerator
+import scenarioWatcher
+import turnTrace
+
+DOCTOR = os.path.join(SCENARIOS, "JSON", "anamnesis_agentDoctor.json")
+
+class Scenario:
+    '''Scenario file being edited, with its loaded scenario, a watcher and an engine that plays sessions while it changes'''
+    def __init__(self, filename, compiled):
+        self.filename = filename
+        self.scenario = scenarioCache.CompiledScenario(filename) if compiled else readFile.ReadFile(filename)
+        self.watcher = scenarioWatcher.ScenarioWatcher(self.scenario, interval = 0)
+        #the file is decoded in the background - an edit saved before it is read would be rebuilt
+        self.watcher.baseline.join()
+        self.engine = dialogueEngine.DialogueEngine(self.scenario)
+        self.watcher.attach(self.engine)
+        self.patches = self.rebuilds = 0
+        patch, rebuild = self.watcher.patch, self.watcher.rebuild
+        def countPatch(*args):
+            self.patches += 1
+            return patch(*args)
+        def countRebuild():
+            self.rebuilds += 1
+            return rebuild()
+        self.watcher.patch, self.watcher.rebuild = countPatch, countRebuild
+
+    def read(self):
+        with open(self.filename, encoding = "utf-8") as f:
+            return json.load(f)
+
+    def write(self, data):
+        '''Save the edited scenario and reload it - the modification time is moved forward, so the watcher sees every save'''
+        with open(self.filename, "w", encoding = "utf-8") as f:
+            json.dump(data, f, indent = 2)
+        return self.touch()
+
+    def touch(self):
+        '''Move the modification time of the file forward and reload it'''
+        st = os.stat(self.filename)
+        os.utime(self.filename, ns = (st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        return self.watcher.poll()
+
+    def assertReloaded(self):
+        assert self.watcher.lastError is None
+        assert graph(self.scenario) == graph(readFile.ReadFile(self.filename))
+
+def passagesOf(data):
+    '''Tree node and frame passages of a scenario'''
+    passages = data["passages"]
+    nodes = [p for p in passages if p.get("tags") is not None and "frame" not in p["tags"] and "roles" not in p["tags"]]
+    frames = [p for p in passages if p.get("tags") and "frame" in p["tags"]]
+    return passages, nodes, frames
+
+def randomEdit(data, rand, i):
+    '''Edit a scenario as an author would in Twine - sentences, links, knowledge, tags, added and removed passages'''
+    passages, nodes, frames = passagesOf(data)
+    op = rand.randrange(8)
+    if op == 0:
+        rand.choice(nodes)["name"] += " (edited)"
+    elif op == 1:
+        p = rand.choice(nodes)
+        p["links"] = (p.get("links") or []) + [{"pid": rand.choice(nodes)["pid"]}]
+    elif op == 2:
+        p = rand.choice(nodes)
+        if p.get("links"):
+            p["links"].pop(rand.randrange(len(p["links"])))
+    elif op == 3 and len(nodes) > 5:
+        passages.remove(rand.choice(nodes))
+    elif op == 4:
+        other = rand.choice(nodes)
+        pid = str(100000 + i)
+        passages.append({"name": "new %d" % i, "pid": pid, "tags": list(other["tags"]), "links": [{"pid": rand.choice(nodes)["pid"]}]})
+        if rand.random() < 0.5:
+            other["links"] = (other.get("links") or []) + [{"pid": pid}]
+    elif op == 5:
+        rand.choice(nodes)["tags"] = list(rand.choice(nodes)["tags"])
+    elif op == 6:
+        rand.choice(frames)["links"] = [{"pid": rand.choice(frames)["pid"]}]
+    elif op == 7:
+        p = rand.choice(nodes)
+        if rand.random() < 0.7:
+            p["props"] = {"addKnowledge": "k%d" % rand.randrange(3)}
+        else:
+            p.pop("props", None)
+    if rand.random() < 0.05:
+        rand.choice(frames)["tags"].append("added%d" % i)
+
+@pytest.fixture(params = ["doctor", "generated"])
+def scenarioFile(request, tmp_path):
+    filename = str(tmp_path / "scenario.json")
+    if request.param == "doctor":
+        shutil.copy(DOCTOR, filename)
+    else:
+        scenarioGenerator.ScenarioGenerator(60, tagsPerFrame = 2, timeoutFrame = True, seed = 3).write(filename)
+    return filename
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_patch_matches_full_reload(scenarioFile, compiled):
+    edited = Scenario(scenarioFile, compiled)
+    rand = random.Random(7)
+    sessions = [edited.engine.start_session(seed = i) for i in range(10)]
+    for i in range(150):
+        data = edited.read()
+        randomEdit(data, rand, i)
+        edited.write(data)
+        edited.assertReloaded()
+        #sessions keep playing on the patched graph
+        for session in sessions:
+            options = edited.engine.user_options(session)
+            if options:
+                try:
+                    edited.engine.respond(session, rand.choice(options).passageId)
+                except dialogueEngine.DeadEndError:
+                    pass
+    assert edited.patches > 0 and edited.rebuilds > 0
+    assert edited.scenario.version == edited.patches + edited.rebuilds
+
+def test_node_pid_rename(tmp_path):
+    filename = str(tmp_path / "scenario.json")
+    shutil.copy(DOCTOR, filename)
+    edited = Scenario(filename, False)
+    data = edited.read()
+    passages, nodes, frames = passagesOf(data)
+    #a linked node gets a new pid, and the links to it are changed as well
+    target = next(n for p in nodes for n in nodes if any(l["pid"] == n["pid"] for l in p.get("links") or ()))
+    old, new = target["pid"], "9000"
+    target["pid"] = new
+    for p in passages:
+        for l in p.get("links") or ():
+            if l["pid"] == old:
+                l["pid"] = new
+    assert edited.write(data)
+    edited.assertReloaded()
+    assert old not in edited.scenario.nodesByPid and edited.scenario.nodesByPid[new].sentence == target["name"]
+
+def test_frame_pid_rename(tmp_path):
+    filename = str(tmp_path / "scenario.json")
+    shutil.copy(DOCTOR, filename)
+    edited = Scenario(filename, False)
+    data = edited.read()
+    passages, nodes, frames = passagesOf(data)
+    frame = frames[len(frames) // 2]
+    old, new = frame["pid"], "9001"
+    frame["pid"] = new
+    for p in frames:
+        for l in p.get("links") or ():
+            if l["pid"] == old:
+                l["pid"] = new
+    assert edited.write(data)
+    edited.assertReloaded()
+    assert new in edited.scenario.framesByPid and old not in edited.scenario.framesByPid
+
+def test_frame_link_edit_is_patched(tmp_path):
+    filename = str(tmp_path / "scenario.json")
+    shutil.copy(DOCTOR, filename)
+    edited = Scenario(filename, False)
+    data = edited.read()
+    passages, nodes, frames = passagesOf(data)
+    source, target = frames[0], frames[-2]
+    source["links"] = [{"name": target["name"], "link": target["name"], "pid": target["pid"]}]
+    assert edited.write(data)
+    edited.assertReloaded()
+    assert (edited.patches, edited.rebuilds) == (1, 0)
+    sourceFrame = edited.scenario.framesByPid[source["pid"]]
+    assert edited.scenario.framesByPid[target["pid"]] in sourceFrame.nextFrames
+    assert source["pid"] in sourceFrame.passageId and target["pid"] in sourceFrame.nextPassageId
+
+def test_session_finishes_removed_tree(tmp_path):
+    filename = str(tmp_path / "scenario.json")
+    shutil.copy(DOCTOR, filename)
+    edited = Scenario(filename, False)
+    engine = edited.engine
+    session = engine.start_session(seed = 0)
+    #play until the user is in the middle of a dialogue tree
+    while session.currNode is None or not session.currNode.nextNodes:
+        engine.respond(session, engine.user_options(session)[0].passageId)
+    options = engine.user_options(session)
+    data = edited.read()
+    #the current node is removed with the options that follow it
+    removed = set([session.currNode.passageId] + [n.passageId for n in options])
+    data["passages"] = [p for p in data["passages"] if p.get("pid") not in removed]
+    assert edited.write(data)
+    edited.assertReloaded()
+    assert all(pid not in edited.scenario.nodesByPid for pid in removed)
+    #the removed options are still answered, then the session continues in the new graph
+    engine.respond(session, options[0].passageId)
+    for n in engine.user_options(session):
+        assert edited.scenario.nodesByPid.get(n.passageId) is n
+
+def test_invalid_save_keeps_scenario(tmp_path):
+    filename = str(tmp_path / "scenario.json")
+    shutil.copy(DOCTOR, filename)
+    edited = Scenario(filename, False)
+    before = graph(edited.scenario)
+    with open(filename, "r+", encoding = "utf-8") as f:
+        text = f.read()
+        f.seek(0)
+        f.write(text[:len(text) // 2])
+        f.truncate()
+    st = os.stat(filename)
+    os.utime(filename, ns = (st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert not edited.watcher.poll()
+    assert edited.watcher.lastError is not None
+    assert graph(edited.scenario) == before and edited.scenario.version == 0
+
+def test_first_edit_is_patched(tmp_path):
+    filename = str(tmp_path / "scenario.json")
+    shutil.copy(DOCTOR, filename)
+    scenarioCache.CompiledScenario(filename)
+    edited = Scenario(filename, True)
+    #the nodes of the compiled scenario are not created until the file changes
+    assert edited.scenario.fromCache and edited.watcher.source is not None
+    assert isinstance(edited.scenario.treeNodes, scenarioCache.LazyNodes) and edited.scenario.treeNodes.nodes.count(None) > 0
+    session = edited.engine.start_session(seed = 0)
+    options = edited.engine.user_options(session)
+    data = edited.read()
+    passagesOf(data)[1][0]["name"] += " (edited)"
+    assert edited.write(data)
+    edited.assertReloaded()
+    assert (edited.patches, edited.rebuilds) == (1, 0)
+    #the session started before the edit continues in the new graph
+    edited.engine.respond(session, options[0].passageId)
+    assert all(edited.scenario.nodesByPid[n.passageId] is n for n in edited.engine.user_options(session))
+    #traces recorded after the edit refer to the edited file
+    assert turnTrace.scenarioHash(edited.scenario) == scenarioCache.hashFile(filename)
+
+def test_edited_text_gives_decoded_passages():
+    data = {"name": "Story", "passages": [{"name": "p%d" % i, "pid": str(i), "tags": ["t"], "text": "x" * (i % 7)} for i in range(60)], "startnode": "1"}
+    text = json.dumps(data, indent = 2)
+    source = scenarioWatcher.TwisonText.decode(text)
+    rand = random.Random(3)
+    for i in range(200):
+        #edits of a passage, passages added or removed, and edits of the story attributes
+        op = rand.randrange(4)
+        passages = data["passages"]
+        if op == 0:
+            rand.choice(passages)["text"] += "y" * rand.randrange(5)
+        elif op == 1:
+            passages.insert(rand.randrange(len(passages) + 1), {"name": "new", "pid": "n%d" % i, "tags": ["t"], "text": ""})
+        elif op == 2 and len(passages) > 10:
+            del passages[rand.randrange(len(passages))]
+        else:
+            data["startnode" if rand.random() < 0.8 else "name"] += "z"
+        text = json.dumps(data, indent = 2)
+        source.replace(text, source.update(text))
+        decoded = scenarioWatcher.TwisonText.decode(text)
+        assert source.passages == decoded.passages == passages
+        assert [source.end(k) for k in range(len(source.passages))] == decoded.ends and source.arrayEnd == decoded.arrayEnd
@@ -0,0 +1,44 @@
+import json
+import pytest
+import readFile
+import simulator
+import stateExplorer
+
+def writeScenario(tmp_path, passages):
+    filename = str(tmp_path / "scenario.json")
+    with open(filename, "w") as f:
+        json.dump({"passages": passages}, f)
+    return filename
+
+@pytest.fixture
+def scenarioFile(tmp_path):
+    #the farewell frame is not linked and no user resource has its tags - no dialogue reaches it
+    return writeScenario(tmp_path, [
+        {"name": "Roles", "pid": "1", "tags": ["roles"], "props": {"user": "user", "agent": "agent"}},
+        {"name": "Introduction", "pid": "2", "tags": ["frame", "intro"], "links": [{"pid": "3"}]},
+        {"name": "Questions", "pid": "3", "tags": ["frame", "questions"]},
+        {"name": "Farewell", "pid": "4", "tags": ["frame", "farewell"]},
+        {"name": "Hello", "pid": "5", "tags": ["intro", "user"], "links": [{"pid": "6"}]},
+        {"name": "Hello, how can I help?", "pid": "6", "tags": ["intro", "agent"], "links": [{"pid": "7"}, {"pid": "8"}]},
+        {"name": "I have a question", "pid": "7", "tags": ["intro", "user"]},
+        {"name": "Nothing, thanks", "pid": "8", "tags": ["intro", "user"]},
+        {"name": "What is your question?", "pid": "9", "tags": ["questions", "agent"]},
+        {"name": "Goodbye", "pid": "10", "tags": ["farewell", "agent"]},
+    ])
+
+def test_report_lists_unreached_frames(scenarioFile):
+    stats, elapsed = simulator.runSimulation(scenarioFile, 200, maxTurns = 10, workers = 1)
+    result = simulator.report(scenarioFile, stats, elapsed)
+    assert result["dialogues"] == 200 and result["turns"] > 0
+    assert result["unreachableFrames"] == ["4:farewell"]
+    assert result["unreachableNodes"] == ["10"]
+    assert set(result["frameVisits"]) == {"2:intro", "3:questions"}
+    #the states explorer finds the same frame unreachable
+    explorer = stateExplorer.StateExplorer(readFile.ReadFile(scenarioFile)).explore()
+    assert [simulator.frameKey(f) for f in explorer.unreachableFrames()] == result["unreachableFrames"]
+
+def test_workers_give_the_same_results(scenarioFile):
+    single, elapsed = simulator.runSimulation(scenarioFile, 300, maxTurns = 10, workers = 1, seed = 7, timeoutRate = 0.2, chunkSize = 50)
+    pooled, elapsed = simulator.runSimulation(scenarioFile, 300, maxTurns = 10, workers = 2, seed = 7, timeoutRate = 0.2, chunkSize = 50)
+    for name in ("dialogues", "turns", "timeouts", "frameVisits", "nodeVisits", "deadEnds", "knowledgeSum", "knowledgeCount"):
+        assert getattr(pooled, name) == getattr(single, name)
@@ -0,0 +1,89 @@
+import json
+import os
+import random
+import pytest
+from conftest import SCENARIOS
+import dialogueEngine
+import readFile
+import scenarioGenerator
+import stateExplorer
+
+DOCTOR = os.path.join(SCENARIOS, "JSON", "anamnesis_agentDoctor.json")
+
+@pytest.fixture(params = ["doctor", "generated"])
+def scenario(request, tmp_path):
+    if request.param == "doctor":
+        return readFile.ReadFile(DOCTOR)
+    filename = str(tmp_path / "scenario.json")
+    scenarioGenerator.ScenarioGenerator(30, knowledgeTags = 3, tagsPerFrame = 2, frameCopies = 2, timeoutFrame = True, seed = 5).write(filename)
+    return readFile.ReadFile(filename)
+
+def writeScenario(tmp_path, passages):
+    filename = str(tmp_path / "scenario.json")
+    with open(filename, "w") as f:
+        json.dump({"passages": passages}, f)
+    return readFile.ReadFile(filename)
+
+def test_simulated_states_are_explored(scenario):
+    explorer = stateExplorer.StateExplorer(scenario).explore()
+    assert not explorer.truncated
+    engine = dialogueEngine.DialogueEngine(scenario)
+    rand = random.Random(0)
+    said = set()
+    for i in range(300):
+        session = engine.start_session(seed = i)
+        for turn in range(40):
+            options = engine.user_options(session)
+            if len(options) == 0:
+                break
+            try:
+                if session.currNode is not None and not session.timeoutActive and rand.random() < 0.15:
+                    engine.timeout_expired(session)
+                else:
+                    engine.respond(session, rand.choice(options).passageId)
+            except dialogueEngine.DeadEndError:
+                break
+            said.add(session.currNode)
+            key = explorer.key(session.currSocialCtx, session.currNode, tuple(session.knowledgeBase), session.timeoutActive,
+                               session.prevSocialCtx, session.prevNode)
+            assert key in explorer.visited
+    unreachable = set(explorer.unreachableNodes())
+    assert said and not said & unreachable
+
+def test_dead_ends_are_reported(tmp_path):
+    #the agent has nothing to say in the only frame, and the timeout frame has no resource
+    scenario = writeScenario(tmp_path, [
+        {"name": "Roles", "pid": "1", "tags": ["roles"], "props": {"user": "user", "agent": "agent"}},
+        {"name": "Introduction", "pid": "2", "tags": ["frame", "intro"], "links": [{"pid": "3"}]},
+        {"name": "Questions", "pid": "3", "tags": ["frame", "questions"]},
+        {"name": "Timeout", "pid": "4", "tags": ["frame", "timeout"], "props": {"timer": "10"}},
+        {"name": "Hello", "pid": "5", "tags": ["intro", "user"], "links": [{"pid": "6"}]},
+        {"name": "Hi, how are you?", "pid": "6", "tags": ["intro", "agent"], "links": [{"pid": "7"}]},
+        {"name": "Fine", "pid": "7", "tags": ["intro", "user"]},
+    ])
+    explorer = stateExplorer.StateExplorer(scenario).explore()
+    deadEnds = [(state.currNode.passageId if state.currNode is not None else None, userNode.passageId if userNode is not None else None)
+                for state, userNode in explorer.deadEnds]
+    #after "Fine" no frame has a resource of the agent, and the timeout after "Hi, how are you?" cannot be acknowledged
+    assert ("6", "7") in deadEnds and ("6", None) in deadEnds
+    assert explorer.path(explorer.deadEnds[0][0]) == ["Hello <<<", ">>> Hi, how are you?"]
+    #no state is ever in the frame without resources, nor in the timeout frame that is never entered
+    assert [f.passageId[0] for f in explorer.unreachableFrames()] == ["3", "4"]
+
+def test_timeout_path_is_explored():
+    scenario = readFile.ReadFile(DOCTOR)
+    assert scenario.timeoutCondition > 0
+    timeoutFrame = next(f for f in scenario.frames if "timeout" in f.tags)
+    explorer = stateExplorer.StateExplorer(scenario).explore()
+    assert explorer.timeouts > 0 and explorer.timeoutAcks > 0 and explorer.recoveries > 0
+    timeoutStates = [s for s in explorer.states if s.timeoutActive]
+    assert timeoutStates and all(explorer.frameIndex(s.currSocialCtx) == timeoutFrame.index for s in timeoutStates)
+    #after the user replies, the agent is back where the timeout interrupted it
+    for state in explorer.states:
+        if state.parent is not None and state.parent.timeoutActive and state.userNode is not None:
+            assert state.currNode is state.parent.prevNode and not state.timeoutActive
+    assert explorer.frameReach[timeoutFrame.index] > 0
+    withoutTimeouts = stateExplorer.StateExplorer(scenario, timeouts = False).explore()
+    assert withoutTimeouts.timeouts == 0 and not any(s.timeoutActive for s in withoutTimeouts.states)
+    assert withoutTimeouts.frameReach[timeoutFrame.index] == 0
+    assert len(withoutTimeouts.states) < len(explorer.states)
@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+import pytest
+from conftest import SCENARIOS
+pytest.importorskip("numpy")
+import dialogueEngine
+import readFile
+import scenarioWatcher
+import textMatcher
+
+DOCTOR = os.path.join(SCENARIOS, "JSON", "anamnesis_agentDoctor.json")
+
+@pytest.fixture
+def engine():
+    return dialogueEngine.DialogueEngine(readFile.ReadFile(DOCTOR))
+
+def inTree(engine, session):
+    '''Play until the user is in the middle of a dialogue tree'''
+    while session.currNode is None or not session.currNode.nextNodes:
+        engine.respond(session, engine.user_options(session)[0].passageId)
+
+def test_exact_and_fuzzy_match(engine):
+    matcher = textMatcher.TextMatcher(engine.scenario)
+    session = engine.start_session(seed = 0)
+    inTree(engine, session)
+    options = engine.user_options(session)
+    for option in options:
+        node, similarity = matcher.match(options, option.sentence)
+        assert node is option and similarity == pytest.approx(1.0)
+    #a typo and a different case still match the option
+    option = max(options, key = lambda n: len(n.sentence))
+    word = max(option.sentence.split(), key = len)
+    typed = option.sentence.upper().replace(word.upper(), word[:len(word) // 2] + word[len(word) // 2 + 1:])
+    node, similarity = matcher.match(options, typed)
+    assert node is option and matcher.threshold <= similarity < 1.0
+
+def test_text_below_threshold_matches_nothing(engine):
+    matcher = textMatcher.TextMatcher(engine.scenario)
+    session = engine.start_session(seed = 0)
+    options = engine.user_options(session)
+    node, similarity = matcher.match(options, "xyzzy qwfp")
+    assert node is None and similarity < matcher.threshold
+    assert matcher.match([], "hello") == (None, 0.0)
+
+def test_unmatched_text_expires_timeout(engine):
+    matcher = textMatcher.TextMatcher(engine.scenario)
+    session = engine.start_session(seed = 0)
+    #the agent did not speak yet, there is nothing to acknowledge
+    assert engine.respond_text(session, "xyzzy qwfp", matcher) == (None, None)
+    inTree(engine, session)
+    currNode = session.currNode
+    assert engine.respond_text(session, "xyzzy qwfp", matcher, timeoutFallback = False) == (None, None)
+    assert session.currNode is currNode and not session.timeoutActive
+    node, response = engine.respond_text(session, "xyzzy qwfp", matcher)
+    assert node is None and response is not None and session.timeoutActive
+
+def reload(filename, watcher, data):
+    with open(filename, "w", encoding = "utf-8") as f:
+        json.dump(data, f)
+    st = os.stat(filename)
+    os.utime(filename, ns = (st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert watcher.poll()
+
+@pytest.mark.parametrize("removed", [False, True])
+def test_text_after_reload(tmp_path, removed):
+    filename = str(tmp_path / "scenario.json")
+    shutil.copy(DOCTOR, filename)
+    scenario = readFile.ReadFile(filename)
+    engine = dialogueEngine.DialogueEngine(scenario)
+    watcher = scenarioWatcher.ScenarioWatcher(scenario, interval = 0)
+    watcher.attach(engine)
+    matcher = textMatcher.TextMatcher(scenario)
+    session = engine.start_session(seed = 0)
+    inTree(engine, session)
+    options = engine.user_options(session)
+    with open(filename, encoding = "utf-8") as f:
+        data = json.load(f)
+    if removed:
+        #the current node and its options are removed, the session finishes the tree with the nodes it has
+        pids = set([session.currNode.passageId] + [n.passageId for n in options])
+        data["passages"] = [p for p in data["passages"] if p.get("pid") not in pids]
+    else:
+        #a new frame tag builds the whole graph again
+        next(p for p in data["passages"] if "frame" in (p.get("tags") or ()))["tags"].append("added")
+    reload(filename, watcher, data)
+    option = options[-1]
+    node, response = engine.respond_text(session, option.sentence, matcher)
+    assert node is option and response is not None
+    #the index was built from the new graph, which does not have the options
+    assert matcher.version == scenario.version
+    assert all(n not in matcher.rows for n in options)
@@ -0,0 +1,68 @@
+import os
+import pytest
+from conftest import SCENARIOS
+import benchmarkTimeouts
+import dialogueEngine
+import readFile
+import timeoutScheduler
+
+DOCTOR = os.path.join(SCENARIOS, "JSON", "anamnesis_agentDoctor.json")
+
+@pytest.fixture
+def engine():
+    return dialogueEngine.DialogueEngine(readFile.ReadFile(DOCTOR))
+
+def started(engine, seed):
+    '''Session after its first user turn - the agent spoke, so a timeout can be acknowledged'''
+    session = engine.start_session(seed = seed)
+    engine.respond(session, engine.user_options(session)[0].passageId)
+    return session
+
+def test_timeouts_in_deadline_order(engine):
+    clock = benchmarkTimeouts.FakeClock()
+    activated = []
+    scheduler = timeoutScheduler.TimeoutScheduler(engine, onTimeout = lambda s, sentence: activated.append(s), wheelSize = 8, clock = clock)
+    sessions = [started(engine, i) for i in range(4)]
+    for delay, session in zip([0.5, 0.3, 0.2, 2.0], sessions):
+        scheduler.arm(session, delay)
+    clock.now = 0.6
+    assert [s for s, sentence in scheduler.advance()] == activated == [sessions[2], sessions[1], sessions[0]]
+    assert scheduler.currentTick == scheduler.tickOf(clock.now) and len(scheduler) == 1
+    #more than one turn of the wheel - the deadline of the last session is neither missed nor activated early
+    clock.now = 1.9
+    assert scheduler.advance() == []
+    clock.now = 60
+    assert [s for s, sentence in scheduler.advance()] == [sessions[3]] and len(scheduler) == 0
+
+def test_failed_timeout_does_not_stop_others(engine, monkeypatch):
+    clock = benchmarkTimeouts.FakeClock()
+    errors = []
+    scheduler = timeoutScheduler.TimeoutScheduler(engine, clock = clock, onError = lambda s, e: errors.append((s, e)))
+    sessions = [started(engine, i) for i in range(3)]
+    for session in sessions:
+        scheduler.arm(session, 1)
+    timeoutExpired = engine.timeout_expired
+    def deadEnd(session):
+        if session is sessions[1]:
+            raise dialogueEngine.DeadEndError("no timeout frame")
+        return timeoutExpired(session)
+    monkeypatch.setattr(engine, "timeout_expired", deadEnd)
+    clock.now = 2
+    assert [s for s, sentence in scheduler.advance()] == [sessions[0], sessions[2]]
+    assert len(errors) == 1 and errors[0][0] is sessions[1] and isinstance(errors[0][1], dialogueEngine.DeadEndError)
+    assert scheduler.lastError == errors[0] and len(scheduler) == 0
+
+def test_rejected_input_keeps_deadline(engine):
+    clock = benchmarkTimeouts.FakeClock()
+    scheduler = timeoutScheduler.TimeoutScheduler(engine, clock = clock)
+    session = started(engine, 0)
+    scheduler.arm(session, 1)
+    clock.now = 0.5
+    with pytest.raises(ValueError):
+        scheduler.respond(session, "not an option")
+    assert len(scheduler) == 1
+    clock.now = 1.05
+    assert [s for s, sentence in scheduler.advance()] == [session]
+    #an accepted input arms the deadline of the next turn
+    scheduler.respond(session, engine.user_options(session)[0].passageId)
+    assert len(scheduler) == 1
@@ -0,0 +1,90 @@
+import json
+import os
+import random
+import pytest
+from conftest import SCENARIOS
+import dialogueEngine
+import readFile
+import scenarioGenerator
+import turnTrace
+
+@pytest.fixture(params = ["doctor", "generated"])
+def scenario(request, tmp_path):
+    if request.param == "doctor":
+        return readFile.ReadFile(os.path.join(SCENARIOS, "JSON", "anamnesis_agentDoctor.json"))
+    filename = str(tmp_path / "scenario.json")
+    #shared tags - a context can be matched by a frame other than the one chosen
+    scenarioGenerator.ScenarioGenerator(100, tagsPerFrame = 3, frameCopies = 3, timeoutFrame = True, seed = 2).write(filename)
+    return readFile.ReadFile(filename)
+
+def play(engine, sessions, rand, batch = None):
+    '''Play random turns, with some timeouts, until the sessions end'''
+    for turn in range(30):
+        active = [s for s in sessions if engine.user_options(s)]
+        if batch is not None and active:
+            engine.respond_batch(active, [rand.choice(engine.user_options(s)).passageId for s in active], batch)
+            continue
+        for s in active:
+            try:
+                if s.currNode is not None and engine.scenario.timeoutCondition > 0 and rand.random() < 0.1:
+                    engine.timeout_expired(s)
+                else:
+                    engine.respond(s, rand.choice(engine.user_options(s)).passageId)
+            except dialogueEngine.DeadEndError:
+                sessions.remove(s)
+
+@pytest.mark.parametrize("batched", [False, True])
+def test_trace_records_chosen_frame(scenario, tmp_path, batched):
+    batch = None
+    if batched:
+        pytest.importorskip("numpy")
+        import batchSalience
+        batch = batchSalience.BatchSalience(scenario)
+    traceFile = str(tmp_path / "turns.trace")
+    engine = dialogueEngine.DialogueEngine(scenario)
+    engine.trace = turnTrace.TraceWriter(traceFile, scenario)
+    sessions = [engine.start_session(seed = i) for i in range(20)]
+    play(engine, sessions, random.Random(0), batch)
+    engine.trace.close()
+    sourceHash, records = turnTrace.readTrace(traceFile)
+    turns = [r for r in records if r[0] == "turn"]
+    frameTurns = [r for r in turns if r[3] != turnTrace.NONE]
+    assert frameTurns and len(frameTurns) < len(turns)
+    #the agent said a head resource of the recorded frame
+    for kind, number, userNode, agentFrame, agentNode in frameTurns:
+        assert scenario.treeNodes[agentNode] in scenario.frames[agentFrame].headResources(scenario.agentRole)
+    result = turnTrace.replayTrace(traceFile, scenario)
+    assert result["mismatches"] == [] and result["turns"] == len(turns)
+
+def test_dead_end_turns_are_not_recorded(tmp_path):
+    pytest.importorskip("numpy")
+    import batchSalience
+    #one frame with a user resource and no agent resource - the agent cannot respond
+    filename = str(tmp_path / "scenario.json")
+    with open(filename, "w") as f:
+        json.dump({"passages": [
+            {"name": "Roles", "pid": "1", "tags": ["roles"], "props": {"user": "user", "agent": "agent"}},
+            {"name": "Introduction", "pid": "2", "tags": ["frame", "intro"]},
+            {"name": "Hello", "pid": "3", "tags": ["intro", "user"]},
+        ]}, f)
+    scenario = readFile.ReadFile(filename)
+    traceFile = str(tmp_path / "turns.trace")
+    engine = dialogueEngine.DialogueEngine(scenario)
+    engine.trace = turnTrace.TraceWriter(traceFile, scenario)
+    scalar, batched = engine.start_session(seed = 0), engine.start_session(seed = 1)
+    with pytest.raises(dialogueEngine.DeadEndError):
+        engine.respond(scalar, "3")
+    assert engine.respond_batch([batched], ["3"], batchSalience.BatchSalience(scenario)) == [None]
+    engine.trace.close()
+    sourceHash, records = turnTrace.readTrace(traceFile)
+    assert [r[0] for r in records] == ["session", "session"]
+    assert turnTrace.replayTrace(traceFile, scenario)["mismatches"] == []
+    #a replayed turn that reaches a dead end is reported as a mismatch
+    engine.trace = None
+    writer = turnTrace.TraceWriter(traceFile, scenario)
+    session = engine.start_session(seed = 2)
+    writer.startSession(session)
+    writer.recordTurn(engine, session, scenario.nodesByPid["3"], scenario.frames[0])
+    writer.close()
+    mismatches = turnTrace.replayTrace(traceFile, scenario)["mismatches"]
+    assert [replayed for sessionId, turn, recorded, replayed in mismatches] == [(turnTrace.NONE, turnTrace.NONE)]
@@ -0,0 +1,79 @@
+import os
+import shutil
+import types
+import pytest
+from conftest import SCENARIOS
+import deliberationMechanism
+import readFile
+import scenarioCache
+import scenarioWatcher
+
+STORY = os.path.join(SCENARIOS, "Twine", "AnamnesisScenario.html")
+
+@pytest.fixture
+def story(tmp_path):
+    '''Copy of the example story published by Twine'''
+    filename = str(tmp_path / "story.html")
+    shutil.copy(STORY, filename)
+    return filename
+
+def edit(filename, old, new):
+    '''Replace a text of a file and move its modification time forward, so the watcher sees the change'''
+    with open(filename, encoding = "utf-8") as f:
+        text = f.read()
+    assert old in text
+    with open(filename, "w", encoding = "utf-8") as f:
+        f.write(text.replace(old, new))
+    st = os.stat(filename)
+    os.utime(filename, ns = (st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+def sentences(scenario):
+    return sorted(n.sentence for n in scenario.treeNodes)
+
+def test_story_reads_like_its_twison_export():
+    story = readFile.ReadFile(STORY)
+    twison = readFile.ReadFile(os.path.join(SCENARIOS, "JSON", "anamnesis_agentDoctor.json"))
+    assert sentences(story) == sentences(twison)
+    assert sorted(f.tags for f in story.frames) == sorted(f.tags for f in twison.frames)
+    assert (story.userRole, story.agentRole, story.timeoutCondition) == (twison.userRole, twison.agentRole, twison.timeoutCondition)
+
+def test_watcher_rebuilds_story(story):
+    #the steps of App.startSystem, without the Qt widgets
+    app = types.SimpleNamespace(inputFile = scenarioCache.CompiledScenario(story))
+    deliberation = deliberationMechanism.DeliberationMechanism(app, seed = 1)
+    watcher = scenarioWatcher.ScenarioWatcher(app.inputFile, interval = 0)
+    watcher.attach(deliberation.engine)
+    assert "Good morning." in [n.sentence for n in deliberation.listUserOptions()]
+    assert not watcher.poll()
+    edit(story, 'name="Good morning."', 'name="Good afternoon."')
+    assert watcher.poll()
+    assert watcher.lastError is None
+    assert app.inputFile.version == 1
+    options = [n.sentence for n in deliberation.listUserOptions()]
+    assert "Good afternoon." in options and "Good morning." not in options
+    #a story saved while being written keeps the current scenario
+    edit(story, "</tw-storydata>", "")
+    assert not watcher.poll()
+    assert watcher.lastError is not None
+    assert "Good afternoon." in sentences(app.inputFile)
+
+def test_gui_starts_on_story(story, monkeypatch):
+    pytest.importorskip("PyQt5")
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication, QGridLayout, QLineEdit
+    import main
+    import transcriptModel
+    qt = QApplication.instance() or QApplication([])
+    app = main.App.__new__(main.App) #the widgets used by startSystem, without running the event loop
+    app.textScenarioFile = QLineEdit()
+    app.textScenarioFile.setText(story)
+    app.transcript = transcriptModel.TranscriptModel()
+    app.grid = QGridLayout()
+    app.optionButtons = []
+    app.startSystem()
+    assert len(app.userOptions) > 0
+    edit(story, 'name="Good morning."', 'name="Good afternoon."')
+    app.reloadScenario()
+    assert "Good afternoon." in [n.sentence for n in app.userOptions]
+    app.watchTimer.stop()
+    qt.processEvents()
@@ -0,0 +1,57 @@
+import json
+import os
+import pytest
+from conftest import SCENARIOS, graph
+import readFile
+import scenarioGenerator
+import twisonStream
+
+def trimmed(filename):
+    '''Passages of a scenario file loaded with json.load, with only the fields kept by the stream'''
+    with open(filename, encoding = "utf-8") as f:
+        passages = json.load(f)['passages']
+    result = []
+    for p in passages:
+        t = {field: p[field] for field in twisonStream.PASSAGE_FIELDS if field in p}
+        if 'links' in p:
+            t['links'] = [{'pid': l['pid']} for l in p['links']]
+        result.append(t)
+    return result
+
+@pytest.fixture(params = ["doctor", "patient", "generated"])
+def scenarioFile(request, tmp_path):
+    if request.param == "doctor":
+        return os.path.join(SCENARIOS, "JSON", "anamnesis_agentDoctor.json")
+    if request.param == "patient":
+        return os.path.join(SCENARIOS, "JSON", "anamnesis_agentPatient.json")
+    filename = str(tmp_path / "scenario.json")
+    scenarioGenerator.ScenarioGenerator(50, timeoutFrame = True, seed = 3).write(filename)
+    return filename
+
+@pytest.mark.parametrize("chunkSize", [1, 7, 64, 1 << 16])
+def test_stream_gives_json_load_passages(scenarioFile, chunkSize):
+    passages = list(twisonStream.TwisonStream(scenarioFile, chunkSize).passages())
+    assert passages == trimmed(scenarioFile)
+
+def test_story_attributes_around_passages_are_skipped(tmp_path):
+    #numbers and nested values before and after the passages, split across chunks
+    filename = str(tmp_path / "story.json")
+    passages = [{"name": "Introduction", "pid": "1", "tags": ["frame", "intro"], "text": "[[Hello]]", "position": {"x": "100", "y": "200"},
+                 "links": [{"name": "Hello", "link": "Hello", "pid": "2"}]},
+                {"name": "Hello", "pid": "2", "tags": ["intro", "user"], "props": {"addKnowledge": "true"}}]
+    with open(filename, "w", encoding = "utf-8") as f:
+        f.write('{ "name" : "Story", "zoom": 1.25, "tags": [[], {"a": [1, 2]}],\n "passages" : %s ,\n "startnode": 123456789 }\n' % json.dumps(passages, indent = 2))
+    for chunkSize in (1, 3, 1 << 16):
+        assert list(twisonStream.TwisonStream(filename, chunkSize).passages()) == trimmed(filename)
+
+def test_streaming_read_gives_same_scenario(scenarioFile):
+    assert graph(readFile.ReadFile(scenarioFile, streaming = True)) == graph(readFile.ReadFile(scenarioFile))
+
+def test_link_without_pid_fails_as_the_regular_read(tmp_path):
+    filename = str(tmp_path / "story.json")
+    with open(filename, "w", encoding = "utf-8") as f:
+        json.dump({"passages": [{"name": "Introduction", "pid": "1", "tags": ["frame", "intro"], "links": [{"name": "Hello", "link": "Hello"}]}]}, f)
+    with pytest.raises(KeyError, match = "pid"):
+        readFile.ReadFile(filename)
+    with pytest.raises(KeyError, match = "pid"):
+        readFile.ReadFile(filename, streaming = True)